@@ -1,11 +1,129 @@
-import asyncio
+import contextlib
+import json
+import time
+from dataclasses import dataclass
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
 
+import httpx
+
+from cluster_agent.settings import SETTINGS
+from cluster_agent.utils.concurrency import as_completed_bounded, iterate_async
 from cluster_agent.utils.exception import SlurmrestdError
+from cluster_agent.utils.http import list_timeout
+from cluster_agent.utils.json_stream import JSONItemStream
+from cluster_agent.utils.logging import logger
+from cluster_agent.utils.snapshot import SyncSnapshot, content_hash
 from cluster_agent.identity.cluster_api import backend_client as cluster_api_client
 from cluster_agent.identity.slurmrestd import backend_client as slurmrestd_client
 
 import hostlist
 
+CACHE_DIR = SETTINGS.CACHE_DIR / "agent"
+
+node_snapshot = SyncSnapshot(CACHE_DIR / "nodes.json")
+job_snapshot = SyncSnapshot(CACHE_DIR / "jobs.json")
+
+
+@dataclass
+class UpsertSummary:
+    """
+    Summarize the outcome of the requests issued by a collector.
+    """
+
+    collector: str
+    succeeded: int = 0
+    failed: int = 0
+
+    def __str__(self) -> str:
+        return f"{self.collector}: {self.succeeded} succeeded, {self.failed} failed"
+
+
+async def upsert_items(
+    collector: str,
+    requests: Union[Iterable[Awaitable[httpx.Response]], AsyncIterable[Awaitable[httpx.Response]]],
+) -> UpsertSummary:
+    """
+    Issue the upsert requests of a collector with bounded concurrency.
+
+    At most ``CLUSTER_API_UPSERT_CONCURRENCY`` requests are in flight at the same time.
+    Each response is accounted for as soon as it arrives and a failed request does not
+    affect the others.
+    """
+    summary = UpsertSummary(collector=collector)
+
+    async for future in as_completed_bounded(
+        requests, SETTINGS.CLUSTER_API_UPSERT_CONCURRENCY
+    ):
+        try:
+            response = future.result()
+        except Exception as err:
+            logger.warning(f"Upsert request for {collector} failed: {err!r}")
+            summary.failed += 1
+            continue
+
+        if response.is_success:
+            summary.succeeded += 1
+        else:
+            logger.warning(
+                f"Upsert request for {collector} failed: {response.request.method} "
+                f"{response.request.url} returned {response.status_code}"
+            )
+            summary.failed += 1
+
+    logger.info(f"Upsert summary for {summary}")
+    return summary
+
+
+@contextlib.asynccontextmanager
+async def fetch_items(
+    path: str, items_key: str, params: Optional[Dict[str, Any]] = None
+) -> AsyncIterator[Tuple[Dict[str, Any], Union[Iterable[Any], AsyncIterable[Any]]]]:
+    """
+    Fetch a list of items from slurmrestd.
+
+    Provide the response document (with at least its ``meta`` and ``errors``) and the
+    items of its ``items_key`` array, read with the longer list timeout.
+
+    When ``SLURMRESTD_STREAM_RESPONSES`` is enabled, the response body is parsed while
+    it's downloaded and the items are provided as an async iterable, so they can be
+    processed without holding the whole document in memory. The items must be consumed
+    within the context.
+    """
+    kwargs: Dict[str, Any] = dict(timeout=list_timeout())
+    if params is not None:
+        kwargs["params"] = params
+
+    if not SETTINGS.SLURMRESTD_STREAM_RESPONSES:
+        r = await slurmrestd_client.get(path, **kwargs)
+        SlurmrestdError.require_condition(
+            r.status_code == 200,
+            f"Slurmrestd returned {r.status_code} when calling {r.url}: {r.text}",
+        )
+        data = r.json()
+        yield (data, data[items_key])
+        return
+
+    async with slurmrestd_client.stream("GET", path, **kwargs) as r:
+        if r.status_code != 200:
+            await r.aread()
+            raise SlurmrestdError(
+                f"Slurmrestd returned {r.status_code} when calling {r.url}: {r.text}"
+            )
+        stream = JSONItemStream(r.aiter_bytes(), items_key, header_keys=("meta", "errors"))
+        yield (stream.header, stream.items())
+
 
 async def upsert_partitions():
     r = await slurmrestd_client.get("/partitions")
@@ -15,60 +133,174 @@ async def upsert_partitions():
     )
     partitions = r.json()
 
-    tasks = list()
-
     for partition in partitions["partitions"]:
         # transform nodes names string into a list
         # e.g. "juju-54c58e-[67,45]" -> ["juju-54c58e-67", "juju-54c58e-45"]
         partition["nodes"] = hostlist.expand_hostlist(partition["nodes"])
 
+    return await sync_items(
+        "partitions",
+        partitions,
+        partitions["partitions"],
+        lambda partition: partition["name"],
+        dict(),
+        full_sync=True,
+        remove_missing=False,
+    )
+
+
+async def batch_items(
+    items: AsyncIterable[Tuple[str, Dict[str, Any]]], max_items: int, max_bytes: int
+) -> AsyncIterator[List[Tuple[str, Dict[str, Any]]]]:
+    """
+    Group the items into batches with at most ``max_items`` items each.
+
+    A batch is also closed before its serialized items would exceed ``max_bytes``. An item
+    that is larger than ``max_bytes`` on its own is sent in a batch of its own.
+    """
+    batch: List[Tuple[str, Dict[str, Any]]] = []
+    batch_size = 0
+    async for (item_id, item) in items:
+        item_size = len(json.dumps(item, separators=(",", ":"), default=str).encode("utf-8"))
+        if batch and (len(batch) >= max_items or batch_size + item_size > max_bytes):
+            yield batch
+            batch = []
+            batch_size = 0
+        batch.append((item_id, item))
+        batch_size += item_size
+    if batch:
+        yield batch
+
+
+async def sync_items(
+    collector: str,
+    data: Dict[str, Any],
+    items: Union[Iterable[Dict[str, Any]], AsyncIterable[Dict[str, Any]]],
+    get_id: Callable[[Dict[str, Any]], str],
+    synced_hashes: Dict[str, str],
+    full_sync: bool,
+    remove_missing: bool,
+) -> UpsertSummary:
+    """
+    Upsert the items of a collector that changed since they were last synced.
+
+    :param: collector:      The collector name, which is also the cluster API resource.
+    :param: data:           The slurmrestd response the items were taken from.
+    :param: items:          The items to sync. They are consumed lazily, so they may be
+                            an async iterable that is still being downloaded.
+    :param: get_id:         A function that provides the id of an item.
+    :param: synced_hashes:  The content hashes of the items already synced, keyed by id.
+                            It's updated as the requests succeed.
+    :param: full_sync:      Upsert all the items, even the unchanged ones.
+    :param: remove_missing: ``items`` is the complete list, so the synced items missing
+                            from it vanished and are forgotten.
+
+    When ``CLUSTER_API_BATCH_UPSERTS`` is enabled, the items are sent in batches with a
+    single PUT to the collector resource, and the shared ``meta`` and ``errors`` are only
+    sent once per batch.
+
+    The vanished items are only removed from the cluster API (which needs its DELETE
+    endpoints) when ``CLUSTER_API_REMOVE_VANISHED_ITEMS`` is enabled. They are forgotten
+    if the endpoint doesn't support it, so they are not deleted again in every cycle.
+    """
+    item_key = collector[:-1]
+    current_hashes: Dict[str, str] = dict()
+
+    async def _upsert(item_id: str, item: Dict[str, Any]) -> httpx.Response:
         payload = {
-            "meta": partitions["meta"],
-            "errors": partitions["errors"],
-            "partition": partition,
+            "meta": data["meta"],
+            "errors": data["errors"],
+            item_key: item,
         }
 
-        tasks.append(
-            cluster_api_client.put(
-                f"/cluster/agent/partitions/{partition['name']}",
-                json=payload,
-            )
+        response = await cluster_api_client.put(
+            f"/cluster/agent/{collector}/{item_id}",
+            json=payload,
         )
+        if response.is_success:
+            synced_hashes[item_id] = current_hashes[item_id]
+        return response
 
-    responses = await asyncio.gather(*tasks)
+    async def _remove(item_id: str) -> httpx.Response:
+        response = await cluster_api_client.delete(f"/cluster/agent/{collector}/{item_id}")
+        if response.is_success or response.status_code in (404, 405, 501):
+            synced_hashes.pop(item_id, None)
+        return response
 
-    # return a list containing just the responses' status, e.g. [200, 400]
-    return [response.status_code for response in responses]
+    async def _upsert_batch(batch: List[Tuple[str, Dict[str, Any]]]) -> httpx.Response:
+        payload = {
+            "meta": data["meta"],
+            "errors": data["errors"],
+            collector: [item for (_, item) in batch],
+        }
 
+        logger.debug(f"Upserting a batch of {len(batch)} {collector}")
+        response = await cluster_api_client.put(f"/cluster/agent/{collector}", json=payload)
+        if response.is_success:
+            synced_hashes.update((item_id, current_hashes[item_id]) for (item_id, _) in batch)
+        return response
 
-async def upsert_nodes():
-    r = await slurmrestd_client.get("/nodes")
-    SlurmrestdError.require_condition(
-        r.status_code == 200,
-        f"Slurmrestd returned {r.status_code} when calling {r.url}: {r.text}",
-    )
-    nodes = r.json()
+    async def _changed_items():
+        async for item in iterate_async(items):
+            item_id = get_id(item)
+            current_hashes[item_id] = content_hash(item)
+            if full_sync or synced_hashes.get(item_id) != current_hashes[item_id]:
+                yield (item_id, item)
 
-    tasks = list()
+    async def _requests():
+        if SETTINGS.CLUSTER_API_BATCH_UPSERTS:
+            async for batch in batch_items(
+                _changed_items(),
+                SETTINGS.CLUSTER_API_BATCH_MAX_ITEMS,
+                SETTINGS.CLUSTER_API_BATCH_MAX_BYTES,
+            ):
+                yield _upsert_batch(batch)
+        else:
+            async for (item_id, item) in _changed_items():
+                yield _upsert(item_id, item)
 
-    for node in nodes["nodes"]:
-        payload = {
-            "meta": nodes["meta"],
-            "errors": nodes["errors"],
-            "node": node,
-        }
+        if remove_missing:
+            for item_id in synced_hashes.keys() - current_hashes.keys():
+                if SETTINGS.CLUSTER_API_REMOVE_VANISHED_ITEMS:
+                    yield _remove(item_id)
+                else:
+                    synced_hashes.pop(item_id)
 
-        tasks.append(
-            cluster_api_client.put(
-                f"/cluster/agent/nodes/{node['name']}",
-                json=payload,
-            )
+    if not full_sync:
+        logger.debug(f"Syncing only the {collector} that changed since the last sync")
+
+    return await upsert_items(collector, _requests())
+
+
+async def upsert_nodes():
+    """
+    Upsert the cluster nodes.
+
+    When ``NODES_DELTA_SYNC`` is enabled, only nodes that were added or changed since
+    they were last synced are sent, and nodes that vanished are removed (if
+    ``CLUSTER_API_REMOVE_VANISHED_ITEMS`` is enabled). A full resync happens every
+    ``NODES_FULL_RESYNC_SECONDS`` to heal any drift.
+    """
+    delta_sync = SETTINGS.NODES_DELTA_SYNC
+    full_sync = not delta_sync or node_snapshot.full_sync_due(SETTINGS.NODES_FULL_RESYNC_SECONDS)
+
+    async with fetch_items("/nodes", "nodes") as (nodes, node_items):
+        summary = await sync_items(
+            "nodes",
+            nodes,
+            node_items,
+            lambda node: node["name"],
+            node_snapshot.hashes if delta_sync else dict(),
+            full_sync=full_sync,
+            remove_missing=delta_sync,
         )
 
-    responses = await asyncio.gather(*tasks)
+    if delta_sync:
+        if full_sync:
+            node_snapshot.mark_full_sync()
+        node_snapshot.save()
 
-    # return a list containing just the responses' status, e.g. [200, 400]
-    return [response.status_code for response in responses]
+    return summary
 
 
 async def update_diagnostics():
@@ -87,30 +319,42 @@ async def update_diagnostics():
 
 
 async def upsert_jobs():
-    r = await slurmrestd_client.get("/jobs")
-    SlurmrestdError.require_condition(
-        r.status_code == 200,
-        f"Slurmrestd returned {r.status_code} when calling {r.url}: {r.text}",
+    """
+    Upsert the slurm jobs.
+
+    When ``JOBS_INCREMENTAL_SYNC`` is enabled, slurmrestd is only asked for the jobs
+    updated since the last completed sync and only the ones that changed are sent.
+    Jobs that vanished from the queue are removed in a full pass (if
+    ``CLUSTER_API_REMOVE_VANISHED_ITEMS`` is enabled), which happens every
+    ``JOBS_FULL_RESYNC_SECONDS``.
+    """
+    incremental = SETTINGS.JOBS_INCREMENTAL_SYNC
+    full_sync = (
+        not incremental
+        or job_snapshot.last_sync is None
+        or job_snapshot.full_sync_due(SETTINGS.JOBS_FULL_RESYNC_SECONDS)
     )
-    jobs = r.json()
 
-    tasks = list()
+    sync_time = int(time.time())
+    params = None if full_sync else dict(update_time=job_snapshot.last_sync)
 
-    for job in jobs["jobs"]:
-        payload = {
-            "meta": jobs["meta"],
-            "errors": jobs["errors"],
-            "job": job,
-        }
-
-        tasks.append(
-            cluster_api_client.put(
-                f"/cluster/agent/jobs/{job['job_id']}",
-                json=payload,
-            )
+    async with fetch_items("/jobs", "jobs", params=params) as (jobs, job_items):
+        summary = await sync_items(
+            "jobs",
+            jobs,
+            job_items,
+            lambda job: str(job["job_id"]),
+            job_snapshot.hashes if incremental else dict(),
+            full_sync=full_sync,
+            remove_missing=incremental and full_sync,
         )
 
-    responses = await asyncio.gather(*tasks)
+    if incremental:
+        # Jobs that failed to sync keep their previous hash, so they are sent again in
+        # the next full pass without holding back the incremental queries until then
+        job_snapshot.last_sync = sync_time
+        if full_sync:
+            job_snapshot.mark_full_sync()
+        job_snapshot.save()
 
-    # return a list container the status code response, e.g. [200]
-    return [response.status_code for response in responses]
+    return summary
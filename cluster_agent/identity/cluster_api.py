@@ -1,4 +1,7 @@
 """Core module for Jobbergate API identity management"""
+import asyncio
+import gzip
+import time
 import typing
 
 import httpx
@@ -6,6 +9,7 @@ import jwt
 
 from cluster_agent.settings import SETTINGS
 from cluster_agent.utils.exception import AuthTokenError
+from cluster_agent.utils.http import client_options
 from cluster_agent.utils.logging import logger
 
 CACHE_DIR = SETTINGS.CACHE_DIR / "cluster-api"
@@ -59,12 +63,17 @@ def _write_token_to_cache(token: str):
         logger.warning(f"Couldn't save token to {token_path}")
 
 
-def acquire_token() -> str:
+async def acquire_token(use_cache: bool = True) -> str:
     """
     Retrieves a token from OIDC based on the app settings.
+
+    The request to OIDC does not block the event loop. If ``use_cache`` is False, the
+    cached token is ignored and a new one is always requested.
     """
-    logger.debug("Attempting to use cached token")
-    token = _load_token_from_cache()
+    token = None
+    if use_cache:
+        logger.debug("Attempting to use cached token")
+        token = _load_token_from_cache()
 
     if token is None:
         logger.debug("Attempting to acquire token from OIDC")
@@ -76,7 +85,8 @@ def acquire_token() -> str:
         )
         oidc_url = f"https://{SETTINGS.OIDC_DOMAIN}/protocol/openid-connect/token"
         logger.debug(f"Posting OIDC request to {oidc_url}")
-        response = httpx.post(oidc_url, data=oidc_body)
+        async with httpx.AsyncClient() as client:
+            response = await client.post(oidc_url, data=oidc_body)
         AuthTokenError.require_condition(
             response.status_code == 200,
             f"Failed to get auth token from OIDC: {response.text}",
@@ -89,30 +99,159 @@ def acquire_token() -> str:
     return token
 
 
+def _get_token_expiration(token: str) -> typing.Optional[float]:
+    """
+    Get the expiration timestamp of a token (if it has one and can be decoded).
+    """
+    try:
+        claims = jwt.decode(token, options=dict(verify_signature=False, verify_exp=False))
+    except jwt.PyJWTError:
+        return None
+    return claims.get("exp")
+
+
+class TokenAuth(httpx.Auth):
+    """
+    Inject OIDC tokens into the requests, acquiring them without blocking the event loop.
+
+    * Concurrent requests share a single in-flight token acquisition.
+    * The token is refreshed in the background once it gets within
+      ``OIDC_TOKEN_REFRESH_MARGIN_SECONDS`` of its expiration.
+    * A 401 response triggers one transparent refresh and retry of the request.
+    """
+
+    requires_request_body = True
+
+    def __init__(self):
+        self.token: typing.Optional[str] = None
+        self.expires_at: typing.Optional[float] = None
+        self._lock: typing.Optional[asyncio.Lock] = None
+        self._lock_loop: typing.Optional[asyncio.AbstractEventLoop] = None
+        self._refresh_task: typing.Optional[asyncio.Task] = None
+
+    @property
+    def lock(self) -> asyncio.Lock:
+        """
+        Provide a lock bound to the running event loop.
+        """
+        loop = asyncio.get_running_loop()
+        if self._lock is None or self._lock_loop is not loop:
+            self._lock = asyncio.Lock()
+            self._lock_loop = loop
+        return self._lock
+
+    def _seconds_left(self) -> typing.Optional[float]:
+        if self.expires_at is None:
+            return None
+        return self.expires_at - time.time()
+
+    async def _acquire(self, stale_token: typing.Optional[str] = None) -> str:
+        """
+        Acquire a new token, unless another coroutine already replaced the stale one.
+        """
+        async with self.lock:
+            if self.token is not None and self.token != stale_token:
+                seconds_left = self._seconds_left()
+                if seconds_left is None or seconds_left > 10:
+                    return self.token
+            token = await acquire_token(use_cache=stale_token is None)
+            self.token = token
+            self.expires_at = _get_token_expiration(token)
+            return token
+
+    async def _refresh_in_background(self, stale_token: str):
+        try:
+            await self._acquire(stale_token=stale_token)
+        except Exception as err:
+            logger.warning(f"Background refresh of the auth token failed: {err}")
+
+    async def get_token(self) -> str:
+        """
+        Get a valid token, acquiring or refreshing it as needed.
+        """
+        token = self.token
+        seconds_left = self._seconds_left()
+        if token is None or (seconds_left is not None and seconds_left <= 10):
+            return await self._acquire(stale_token=token)
+
+        refresh_needed = (
+            seconds_left is not None
+            and seconds_left <= SETTINGS.OIDC_TOKEN_REFRESH_MARGIN_SECONDS
+        )
+        if refresh_needed and (self._refresh_task is None or self._refresh_task.done()):
+            logger.debug("Auth token is about to expire. Refreshing it in the background")
+            self._refresh_task = asyncio.create_task(self._refresh_in_background(token))
+
+        return token
+
+    async def async_auth_flow(
+        self, request: httpx.Request
+    ) -> typing.AsyncGenerator[httpx.Request, httpx.Response]:
+        token = await self.get_token()
+        request.headers["authorization"] = f"Bearer {token}"
+        response = yield request
+
+        if response.status_code == 401:
+            logger.debug("Request was not authorized. Refreshing auth token and retrying")
+            token = await self._acquire(stale_token=token)
+            request.headers["authorization"] = f"Bearer {token}"
+            yield request
+
+
+def compress_request(request: httpx.Request) -> httpx.Request:
+    """
+    Compress the body of a request with gzip if it's larger than the compression threshold.
+
+    Requests that are bodiless, small, streamed or already encoded are returned unchanged.
+    """
+    if "content-encoding" in request.headers or not isinstance(request.stream, httpx.ByteStream):
+        return request
+
+    content = request.read()
+    if not content or len(content) < SETTINGS.CLUSTER_API_COMPRESSION_THRESHOLD_BYTES:
+        return request
+
+    compressed_content = gzip.compress(content)
+    logger.debug(f"Compressed request body from {len(content)} to {len(compressed_content)} bytes")
+
+    headers = request.headers.copy()
+    del headers["content-length"]
+    headers["content-encoding"] = "gzip"
+    return httpx.Request(
+        request.method,
+        request.url,
+        headers=headers,
+        content=compressed_content,
+        extensions=request.extensions,
+    )
+
+
 class AsyncBackendClient(httpx.AsyncClient):
     """
     Extends the httpx.AsyncClient class with automatic token acquisition for requests.
     The token is acquired lazily on the first httpx request issued.
     This client should be used for most agent actions.
-    """
 
-    _token: typing.Optional[str]
+    When ``CLUSTER_API_REQUEST_COMPRESSION`` is enabled, large request bodies are sent
+    gzip compressed. Compressed responses are always accepted and decoded by httpx.
+    """
 
     def __init__(self):
-        self._token = None
+        self.token_auth = TokenAuth()
         super().__init__(
             base_url=SETTINGS.BASE_API_URL,
-            auth=self._inject_token,
+            auth=self.token_auth,
             event_hooks=dict(
                 request=[self._log_request],
                 response=[self._log_response],
             ),
+            **client_options("CLUSTER_API"),
         )
 
-    def _inject_token(self, request: httpx.Request) -> httpx.Request:
-        if self._token is None:
-            self._token = acquire_token()
-        request.headers["authorization"] = f"Bearer {self._token}"
+    def build_request(self, *args, **kwargs) -> httpx.Request:
+        request = super().build_request(*args, **kwargs)
+        if SETTINGS.CLUSTER_API_REQUEST_COMPRESSION:
+            request = compress_request(request)
         return request
 
     @staticmethod
@@ -12,6 +12,7 @@ class MapperType(str, Enum):
 
     LDAP = "LDAP"
     SINGLE_USER = "SINGLE_USER"
+    FILE = "FILE"
 
 
 class LDAPAuthType(str, Enum):
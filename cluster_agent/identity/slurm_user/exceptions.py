@@ -9,9 +9,25 @@ class MapperFactoryError(ClusterAgentError):
     """Raise exception when a local user mapper cannot be manufactured."""
 
 
+class UserNotFoundError(ClusterAgentError):
+    """Raise exception when a mapper cannot find a user for an email."""
+
+
 class LDAPError(ClusterAgentError):
     """Raise exception when LDAP communication fails."""
 
 
+class LDAPUserNotFoundError(LDAPError, UserNotFoundError):
+    """Raise exception when no LDAP entry matches an email."""
+
+
+class FileMapperError(ClusterAgentError):
+    """Raise exception when the user map file cannot be used."""
+
+
+class FileUserNotFoundError(FileMapperError, UserNotFoundError):
+    """Raise exception when an email is not in the user map file."""
+
+
 class SingleUserError(ClusterAgentError):
     """Raise exception when there is a problem with single-user submission."""
@@ -2,34 +2,136 @@
 Provide a factory method for creating slurm user mappers.
 """
 
+from typing import Optional
+
 from cluster_agent.identity.slurm_user.constants import MapperType
 from cluster_agent.identity.slurm_user.exceptions import MapperFactoryError
 from cluster_agent.identity.slurm_user.mappers import (
+    CachedMapper,
+    FileMapper,
+    LDAPIndexMapper,
     LDAPMapper,
     SingleUserMapper,
     SlurmUserMapper,
+    UsernameCache,
 )
 from cluster_agent.settings import SETTINGS
+from cluster_agent.utils.logging import log_error, logger
 
 mapper_map = {
     MapperType.LDAP: LDAPMapper,
     MapperType.SINGLE_USER: SingleUserMapper,
+    MapperType.FILE: FileMapper,
 }
 
+CACHE_DIR = SETTINGS.CACHE_DIR / "slurm-user"
 
-async def manufacture() -> SlurmUserMapper:
+_mapper_instance: Optional[SlurmUserMapper] = None
+_username_cache: Optional[UsernameCache] = None
+
+
+def get_username_cache() -> UsernameCache:
     """
-    Create an instance of a Slurm user mapper given the app configuration.
+    Retrieve the username cache, creating it from the app configuration on first use.
 
-    Map the configured mapper type from the app configuration to an instance of a
-    particular SlurmUserMapper.
+    The cache outlives the mappers, so a mapper rebuilt after losing its connection
+    starts with the usernames that were already found.
     """
-    mapper_class = mapper_map.get(SETTINGS.SLURM_USER_MAPPER)
+    global _username_cache
+    if _username_cache is None:
+        _username_cache = UsernameCache(
+            ttl=SETTINGS.USER_MAPPER_CACHE_TTL_SECONDS,
+            negative_ttl=SETTINGS.USER_MAPPER_CACHE_NEGATIVE_TTL_SECONDS,
+            max_size=SETTINGS.USER_MAPPER_CACHE_MAX_SIZE,
+            path=CACHE_DIR / "usernames.json" if SETTINGS.USER_MAPPER_CACHE_PERSIST else None,
+        )
+    return _username_cache
+
+
+def build_mapper(mapper_type: MapperType) -> SlurmUserMapper:
+    """
+    Create an unconfigured instance of the Slurm user mapper of the given type.
+
+    The LDAP mapper uses a local index of the directory if ``LDAP_INDEX_ENABLED`` is set.
+    Otherwise, unless it's a single user mapper, the instance is wrapped in a
+    CachedMapper if ``USER_MAPPER_CACHE_ENABLED`` is set. The file mapper isn't cached
+    either, but its fallback mapper (``USER_MAPPER_FILE_FALLBACK``) is built the same way.
+    """
+    mapper_class = mapper_map.get(mapper_type)
     MapperFactoryError.require_condition(
         mapper_class is not None,
-        f"Couldn't find a mapper class for {SETTINGS.SLURM_USER_MAPPER}",
+        f"Couldn't find a mapper class for {mapper_type}",
     )
     assert mapper_class is not None
+
+    if mapper_class is FileMapper:
+        fallback_type = SETTINGS.USER_MAPPER_FILE_FALLBACK
+        MapperFactoryError.require_condition(
+            fallback_type != MapperType.FILE,
+            "The file user-mapper cannot fall back to another file user-mapper",
+        )
+        return FileMapper(fallback=build_mapper(fallback_type) if fallback_type else None)
+
+    if mapper_class is LDAPMapper and SETTINGS.LDAP_INDEX_ENABLED:
+        mapper_class = LDAPIndexMapper
     mapper_instance = mapper_class()
+    if (
+        SETTINGS.USER_MAPPER_CACHE_ENABLED
+        and mapper_class not in (SingleUserMapper, LDAPIndexMapper)
+    ):
+        mapper_instance = CachedMapper(mapper_instance, get_username_cache())
+    return mapper_instance
+
+
+async def manufacture() -> SlurmUserMapper:
+    """
+    Create an instance of a Slurm user mapper given the app configuration.
+
+    Map the configured mapper type from the app configuration to an instance of a
+    particular SlurmUserMapper (see ``build_mapper()``) and configure it.
+    """
+    mapper_instance = build_mapper(SETTINGS.SLURM_USER_MAPPER)
     await mapper_instance.configure(SETTINGS)
     return mapper_instance
+
+
+async def get_mapper() -> SlurmUserMapper:
+    """
+    Retrieve the Slurm user mapper for the running agent.
+
+    The mapper is manufactured on first use and then reused, so a long-running agent
+    keeps the same mapper (and its connections) warm across cycles. It's only
+    manufactured again if it lost its connection.
+    """
+    global _mapper_instance
+
+    if _mapper_instance is not None:
+        if not _mapper_instance.needs_rebuild():
+            return _mapper_instance
+
+        logger.warning("The user mapper lost its connection. Rebuilding it")
+        (previous_instance, _mapper_instance) = (_mapper_instance, None)
+        await previous_instance.close()
+
+    _mapper_instance = await manufacture()
+    return _mapper_instance
+
+
+async def close_mapper():
+    """
+    Close the Slurm user mapper of the running agent, if it was manufactured.
+
+    This releases its connections and background tasks when the agent stops.
+    """
+    global _mapper_instance
+
+    if _mapper_instance is None:
+        return
+
+    (mapper_instance, _mapper_instance) = (_mapper_instance, None)
+    with MapperFactoryError.handle_errors(
+        "Failed to close the user mapper",
+        do_except=log_error,
+        re_raise=False,
+    ):
+        await mapper_instance.close()
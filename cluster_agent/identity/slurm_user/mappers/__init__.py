@@ -1,9 +1,16 @@
+from cluster_agent.identity.slurm_user.mappers.cached import CachedMapper, UsernameCache
+from cluster_agent.identity.slurm_user.mappers.file import FileMapper
 from cluster_agent.identity.slurm_user.mappers.ldap import LDAPMapper
+from cluster_agent.identity.slurm_user.mappers.ldap_index import LDAPIndexMapper
 from cluster_agent.identity.slurm_user.mappers.mapper_base import SlurmUserMapper
 from cluster_agent.identity.slurm_user.mappers.single_user import SingleUserMapper
 
 __all__ = [
     "SlurmUserMapper",
     "LDAPMapper",
+    "LDAPIndexMapper",
     "SingleUserMapper",
+    "FileMapper",
+    "CachedMapper",
+    "UsernameCache",
 ]
@@ -0,0 +1,202 @@
+"""
+Define a caching layer for slurm user mappers.
+"""
+
+import asyncio
+import json
+import time
+import typing
+from collections import OrderedDict
+from pathlib import Path
+
+from loguru import logger
+
+from cluster_agent.identity.slurm_user.exceptions import UserNotFoundError
+from cluster_agent.identity.slurm_user.mappers.mapper_base import SlurmUserMapper
+from cluster_agent.settings import Settings
+from cluster_agent.utils.files import write_json_atomically
+
+
+class CacheEntry(typing.NamedTuple):
+    """
+    A cached username (or ``None`` for an unknown email) and its expiration timestamp.
+    """
+
+    username: typing.Optional[str]
+    expires_at: float
+
+
+class UsernameCache:
+    """
+    Map emails to usernames, keeping at most ``max_size`` of the most recently used ones.
+
+    Known users are kept for ``ttl`` seconds and unknown emails for ``negative_ttl``
+    seconds. If a ``path`` is supplied, the cache is loaded from that file and saved to
+    it by ``save_if_changed``, so it survives restarts.
+    """
+
+    def __init__(
+        self,
+        ttl: float,
+        negative_ttl: float,
+        max_size: int,
+        path: typing.Optional[Path] = None,
+    ):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_size = max_size
+        self.path = path
+        self.entries: typing.OrderedDict[str, CacheEntry] = OrderedDict()
+        self._changed = False
+        if path is not None:
+            self.load()
+
+    def get(self, email: str) -> typing.Optional[CacheEntry]:
+        """
+        Get the cache entry for an email, if it's cached and not expired.
+        """
+        entry = self.entries.get(email)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.time():
+            del self.entries[email]
+            return None
+        self.entries.move_to_end(email)
+        return entry
+
+    def set(self, email: str, username: typing.Optional[str]):
+        """
+        Cache the username of an email (``None`` if the email is unknown).
+        """
+        ttl = self.ttl if username is not None else self.negative_ttl
+        if ttl <= 0:
+            return
+        self.entries[email] = CacheEntry(username=username, expires_at=time.time() + ttl)
+        self.entries.move_to_end(email)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+        self._changed = True
+
+    def load(self):
+        """
+        Load the unexpired entries from the cache file.
+        """
+        assert self.path is not None
+        if not self.path.exists():
+            return
+        try:
+            data = json.loads(self.path.read_text())
+            now = time.time()
+            for (email, (username, expires_at)) in data.items():
+                if expires_at > now:
+                    self.entries[email] = CacheEntry(username=username, expires_at=expires_at)
+        except Exception:
+            logger.warning(f"Couldn't load the username cache from {self.path}")
+            self.entries.clear()
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def save(self):
+        """
+        Persist the cache in its file.
+        """
+        assert self.path is not None
+        self._changed = False
+        write_json_atomically(self.path, self.entries, "username cache")
+
+    def save_if_changed(self):
+        """
+        Persist the cache if it has a file and entries were set since it was last saved.
+
+        Lookups call it once they cached all their results, so a batch of lookups only
+        rewrites the file once.
+        """
+        if self.path is not None and self._changed:
+            self.save()
+
+
+class CachedMapper(SlurmUserMapper):
+    """
+    Provide a class that caches the usernames found by another mapper.
+
+    Concurrent lookups of the same email share a single lookup in the wrapped mapper.
+    Emails the wrapped mapper reports as unknown (``UserNotFoundError``) are cached too,
+    so they are not looked up again for a while.
+    """
+
+    def __init__(self, mapper: SlurmUserMapper, cache: UsernameCache):
+        self.mapper = mapper
+        self.cache = cache
+        self._lookups: typing.Dict[str, asyncio.Future] = dict()
+
+    async def configure(self, settings: Settings):
+        """
+        Configure the wrapped mapper.
+        """
+        await self.mapper.configure(settings)
+
+    async def find_username(self, email: str) -> str:
+        """
+        Find a slurm user name given an email, using the cache when possible.
+        """
+        entry = self.cache.get(email)
+        if entry is not None:
+            UserNotFoundError.require_condition(
+                entry.username is not None,
+                f"Email {email} was recently not found by the user mapper",
+            )
+            assert entry.username is not None
+            return entry.username
+
+        lookup = self._lookups.get(email)
+        if lookup is None:
+            lookup = asyncio.ensure_future(self._look_up(email))
+            self._lookups[email] = lookup
+            lookup.add_done_callback(lambda _: self._lookups.pop(email, None))
+        return await asyncio.shield(lookup)
+
+    async def _look_up(self, email: str) -> str:
+        try:
+            username = await self.mapper.find_username(email)
+        except UserNotFoundError:
+            self.cache.set(email, None)
+            raise
+        else:
+            self.cache.set(email, username)
+        finally:
+            self.cache.save_if_changed()
+        return username
+
+    async def find_usernames(self, emails: typing.Iterable[str]) -> typing.Dict[str, str]:
+        """
+        Find the slurm user names of many emails, only looking up the uncached ones.
+        """
+        usernames: typing.Dict[str, str] = dict()
+        uncached_emails = []
+        for email in set(emails):
+            entry = self.cache.get(email)
+            if entry is None:
+                uncached_emails.append(email)
+            elif entry.username is not None:
+                usernames[email] = entry.username
+
+        if uncached_emails:
+            found_usernames = await self.mapper.find_usernames(uncached_emails)
+            for (email, username) in found_usernames.items():
+                self.cache.set(email, username)
+            self.cache.save_if_changed()
+            usernames.update(found_usernames)
+
+        return usernames
+
+    def needs_rebuild(self) -> bool:
+        """
+        Tell if the wrapped mapper is no longer usable.
+        """
+        return self.mapper.needs_rebuild()
+
+    async def close(self):
+        """
+        Close the wrapped mapper.
+        """
+        await self.mapper.close()
@@ -0,0 +1,172 @@
+"""
+Define a mapper that finds usernames in a local CSV or JSON file.
+"""
+
+import csv
+import io
+import json
+import typing
+from pathlib import Path
+
+from loguru import logger
+
+from cluster_agent.identity.slurm_user.exceptions import FileMapperError, FileUserNotFoundError
+from cluster_agent.identity.slurm_user.mappers.mapper_base import SlurmUserMapper
+from cluster_agent.settings import Settings
+from cluster_agent.utils.logging import log_error
+
+
+def parse_user_map(path: Path) -> typing.Dict[str, str]:
+    """
+    Parse a file mapping emails to usernames into a dictionary keyed by lower-case email.
+
+    JSON files (``.json``) must contain an object mapping emails to usernames. Any other
+    file is read as CSV with the email and the username in the first two columns. Empty
+    lines, lines starting with ``#`` and an ``email,username`` header are skipped.
+    """
+    text = path.read_text()
+    if path.suffix.lower() == ".json":
+        data = json.loads(text)
+        FileMapperError.require_condition(
+            isinstance(data, dict),
+            "The JSON user map must be an object mapping emails to usernames",
+        )
+        pairs = list(data.items())
+    else:
+        pairs = []
+        for row in csv.reader(io.StringIO(text)):
+            if not row or not row[0].strip() or row[0].strip().startswith("#"):
+                continue
+            FileMapperError.require_condition(
+                len(row) >= 2,
+                f"Expected an email and a username in the CSV user map, got {row}",
+            )
+            pairs.append((row[0], row[1]))
+        if pairs and pairs[0][0].strip().lower() == "email":
+            pairs = pairs[1:]
+
+    user_map = dict()
+    for (email, username) in pairs:
+        FileMapperError.require_condition(
+            isinstance(email, str) and isinstance(username, str) and username.strip(),
+            f"Invalid user map entry for {email}: {username}",
+        )
+        user_map[email.strip().lower()] = username.strip()
+    return user_map
+
+
+class FileMapper(SlurmUserMapper):
+    """
+    Provide a class that finds usernames in a file mapping emails to usernames.
+
+    The file is loaded into a dictionary and loaded again whenever its modification time
+    changes. Emails that are not in the file are looked up with the ``fallback`` mapper,
+    if one is supplied (e.g. the LDAP mapper for the users that are not service accounts).
+    If the fallback mapper cannot be configured, the users in the file are still found and
+    the mapper asks to be rebuilt.
+    """
+
+    def __init__(self, fallback: typing.Optional[SlurmUserMapper] = None):
+        self.fallback = fallback
+        self.path: typing.Optional[Path] = None
+        self.user_map: typing.Dict[str, str] = dict()
+        self._mtime: typing.Optional[int] = None
+        self._fallback_failed = False
+
+    async def configure(self, settings: Settings):
+        """
+        Load the user map file and configure the fallback mapper.
+        """
+        FileMapperError.require_condition(
+            settings.USER_MAPPER_FILE is not None,
+            "USER_MAPPER_FILE is not set in the settings. Cannot use the file user-mapper.",
+        )
+        self.path = settings.USER_MAPPER_FILE
+        with FileMapperError.handle_errors(
+            f"Couldn't load the user map from {self.path}",
+            do_except=log_error,
+        ):
+            self._load()
+
+        if self.fallback is not None:
+            self._fallback_failed = True
+            with FileMapperError.handle_errors(
+                "Couldn't configure the fallback user-mapper",
+                do_except=log_error,
+                re_raise=False,
+            ):
+                await self.fallback.configure(settings)
+                self._fallback_failed = False
+
+    def _load(self):
+        assert self.path is not None
+        mtime = self.path.stat().st_mtime_ns
+        self.user_map = parse_user_map(self.path)
+        self._mtime = mtime
+        logger.debug(f"Loaded {len(self.user_map)} users from {self.path}")
+
+    def _reload_if_changed(self):
+        """
+        Load the file again if it was modified, keeping the current map if it can't be read.
+        """
+        assert self.path is not None
+        with FileMapperError.handle_errors(
+            f"Couldn't reload the user map from {self.path}. Keeping the previous one",
+            do_except=lambda params: logger.warning(params.final_message),
+            re_raise=False,
+        ):
+            if self.path.stat().st_mtime_ns != self._mtime:
+                self._load()
+
+    async def find_username(self, email: str) -> str:
+        """
+        Find a slurm user name given an email, in the file or with the fallback mapper.
+        """
+        self._reload_if_changed()
+        username = self.user_map.get(email.lower())
+        if username is not None:
+            return username
+
+        FileUserNotFoundError.require_condition(
+            self.fallback is not None,
+            f"Email {email} was not found in the user map",
+        )
+        FileMapperError.require_condition(
+            not self._fallback_failed,
+            f"Email {email} was not found in the user map and the fallback is unavailable",
+        )
+        assert self.fallback is not None
+        return await self.fallback.find_username(email)
+
+    async def find_usernames(self, emails: typing.Iterable[str]) -> typing.Dict[str, str]:
+        """
+        Find the slurm user names of many emails, in the file or with the fallback mapper.
+        """
+        self._reload_if_changed()
+        usernames = dict()
+        missing_emails = []
+        for email in set(emails):
+            username = self.user_map.get(email.lower())
+            if username is not None:
+                usernames[email] = username
+            else:
+                missing_emails.append(email)
+
+        if missing_emails and self.fallback is not None and not self._fallback_failed:
+            usernames.update(await self.fallback.find_usernames(missing_emails))
+        return usernames
+
+    def needs_rebuild(self) -> bool:
+        """
+        Tell if the fallback mapper couldn't be configured or is no longer usable.
+        """
+        if self.fallback is None:
+            return False
+        return self._fallback_failed or self.fallback.needs_rebuild()
+
+    async def close(self):
+        """
+        Close the fallback mapper.
+        """
+        if self.fallback is not None:
+            await self.fallback.close()
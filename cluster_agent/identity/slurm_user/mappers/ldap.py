@@ -1,12 +1,19 @@
-import json
+import asyncio
+import functools
+import math
+import time
+import typing
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 
-from ldap3 import ALL, NTLM, RESTARTABLE, SIMPLE, Connection, Server
+from ldap3 import ALL, NTLM, RESTARTABLE, SIMPLE, Connection, Entry, Server
+from ldap3.core.exceptions import LDAPCommunicationError, LDAPMaximumRetriesError
+from ldap3.utils.conv import escape_filter_chars
 from ldap3.utils.log import ERROR, set_library_log_detail_level
 from loguru import logger
-from timeoutcontext import timeout
 
 from cluster_agent.identity.slurm_user.constants import LDAPAuthType
-from cluster_agent.identity.slurm_user.exceptions import LDAPError
+from cluster_agent.identity.slurm_user.exceptions import LDAPError, LDAPUserNotFoundError
 from cluster_agent.identity.slurm_user.mappers.mapper_base import SlurmUserMapper
 from cluster_agent.settings import Settings
 from cluster_agent.utils.logging import log_error
@@ -14,13 +21,79 @@ from cluster_agent.utils.logging import log_error
 set_library_log_detail_level(ERROR)
 
 
+class LDAPServer:
+    """
+    Track the health and the latency of one of the LDAP servers.
+
+    The latency is a moving average of the time taken by binds and searches. A server
+    that fails is considered unhealthy (and skipped) for ``retry_seconds``.
+    """
+
+    def __init__(self, host: str, retry_seconds: float):
+        self.host = host
+        self.retry_seconds = retry_seconds
+        self.server: typing.Optional[Server] = None
+        self.latency: typing.Optional[float] = None
+        self.unhealthy_until: float = 0
+
+    @property
+    def healthy(self) -> bool:
+        """
+        Tell if the server didn't fail recently.
+        """
+        return time.time() >= self.unhealthy_until
+
+    def record_success(self, elapsed: typing.Optional[float] = None):
+        """
+        Mark the server as healthy, updating its latency with the time a call took.
+        """
+        self.unhealthy_until = 0
+        if elapsed is not None:
+            self.latency = elapsed if self.latency is None else 0.7 * self.latency + 0.3 * elapsed
+
+    def record_failure(self):
+        """
+        Mark the server as unhealthy for a while.
+        """
+        self.unhealthy_until = time.time() + self.retry_seconds
+
+
+class PooledConnection(typing.NamedTuple):
+    """
+    A bound connection in the pool and the server it's connected to.
+    """
+
+    connection: Connection
+    server: LDAPServer
+
+
 class LDAPMapper(SlurmUserMapper):
     """
     Provide a class to interface with the LDAP server
+
+    The blocking ldap3 calls run in a thread pool, so they don't stall the event loop.
+    Up to ``LDAP_POOL_SIZE`` bound connections are opened as needed, so that many
+    lookups can run at the same time. Each LDAP call is limited to ``_timeout_seconds``.
+
+    ``LDAP_HOST`` may list several servers (separated by commas). They are all probed
+    when the mapper is configured and every ``LDAP_HEALTH_CHECK_SECONDS`` after that.
+    New connections go to the fastest healthy server, and searches that fail because of
+    the connection are retried on another server.
     """
 
-    connection = None
+    connection_lost = False
     _timeout_seconds = 30
+    _search_chunk_size = 50
+
+    def __init__(self):
+        self._pool_size = 1
+        self._connection_count = 0
+        self._servers: typing.List[LDAPServer] = []
+        self._connections: typing.List[PooledConnection] = []
+        self._idle_connections: typing.Optional[asyncio.Queue] = None
+        self._pool_changed: typing.Optional[asyncio.Event] = None
+        self._executor: typing.Optional[ThreadPoolExecutor] = None
+        self._health_checker: typing.Optional[asyncio.Future] = None
 
     async def configure(self, settings: Settings):
         """
@@ -43,9 +116,22 @@ class LDAPMapper(SlurmUserMapper):
         domain = settings.LDAP_DOMAIN
 
         # Make static type checkers happy
+        assert host is not None
         assert domain is not None
 
         self.search_base = ",".join([f"DC={dc}" for dc in domain.split(".")])
+        self._search_chunk_size = settings.LDAP_SEARCH_CHUNK_SIZE
+        self._pool_size = settings.LDAP_POOL_SIZE
+        self._idle_connections = asyncio.Queue()
+        self._pool_changed = asyncio.Event()
+        self._executor = ThreadPoolExecutor(
+            max_workers=self._pool_size, thread_name_prefix="ldap"
+        )
+        self._servers = [
+            LDAPServer(server_host.strip(), settings.LDAP_SERVER_RETRY_SECONDS)
+            for server_host in host.split(",")
+            if server_host.strip()
+        ]
 
         if settings.LDAP_AUTH_TYPE == LDAPAuthType.NTLM:
             username = f"{settings.LDAP_DOMAIN}\\{settings.LDAP_USERNAME}"
@@ -55,54 +141,285 @@ class LDAPMapper(SlurmUserMapper):
             auth_type = SIMPLE
 
         password = settings.LDAP_PASSWORD
+        self._connection_options = dict(
+            user=username,
+            password=password,
+            authentication=auth_type,
+            client_strategy=RESTARTABLE,
+        )
 
         logger.debug(f"Connecting to LDAP at {host} ({domain}) with {username}")
         with LDAPError.handle_errors("Couldn't connect to LDAP", do_except=log_error):
-            with timeout(self._timeout_seconds):
-                logger.debug("Creating server object")
-                server = Server(host, get_info=ALL)
-                logger.debug("Creating connection object")
-                self.connection = Connection(
-                    server,
-                    user=username,
-                    password=password,
-                    authentication=auth_type,
-                    client_strategy=RESTARTABLE,
-                )
-                logger.debug("Starting TLS")
-                self.connection.start_tls()
-                logger.debug("Binding to LDAP")
-                self.connection.bind()
-        logger.debug("Connection established to LDAP")
+            probes = await self._probe_servers()
+            best_server = self._best_server()
+            for pooled in probes:
+                if pooled.server is best_server:
+                    self._connections.append(pooled)
+                    self._connection_count = 1
+                    self._release(pooled)
+                else:
+                    await self._unbind(pooled.connection)
+        logger.debug(f"Connection established to LDAP at {best_server.host}")
 
-    async def find_username(self, email: str) -> str:
+        if len(self._servers) > 1:
+            self._health_checker = asyncio.ensure_future(
+                self._check_health_periodically(settings.LDAP_HEALTH_CHECK_SECONDS)
+            )
+
+    async def _run(
+        self,
+        func: typing.Callable,
+        *args,
+        timeout: typing.Optional[float] = None,
+        **kwargs,
+    ) -> typing.Any:
         """
-        Find an active diretory username given a user email.
+        Run a blocking call in the thread pool, giving up after ``timeout`` seconds
+        (``_timeout_seconds`` by default).
+        """
+        loop = asyncio.get_running_loop()
+        return await asyncio.wait_for(
+            loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs)),
+            timeout or self._timeout_seconds,
+        )
 
-        Lazily connect to the LDAP server if not already connected.
+    @staticmethod
+    def _is_connection_error(err: Exception) -> bool:
         """
-        LDAPError.require_condition(
-            self.connection is not None,
-            "Not connected to an LDAP server yet!",
+        Tell if an error means the connection to the LDAP server was lost.
+        """
+        return isinstance(
+            err, (LDAPCommunicationError, LDAPMaximumRetriesError, asyncio.TimeoutError)
         )
-        # Make static type checkers happy
-        assert self.connection is not None
 
-        logger.debug(f"Searching for email {email} in LDAP")
+    def _connect(self, server: LDAPServer) -> Connection:
+        """
+        Open and bind a new connection to an LDAP server (blocking).
+        """
+        if server.server is None:
+            logger.debug(f"Creating server object for {server.host}")
+            server.server = Server(server.host, get_info=ALL)
+        logger.debug("Creating connection object")
+        connection = Connection(server.server, **self._connection_options)
+        logger.debug("Starting TLS")
+        connection.start_tls()
+        logger.debug("Binding to LDAP")
+        connection.bind()
+        return connection
+
+    async def _open(self, server: LDAPServer) -> PooledConnection:
+        """
+        Open a connection to a server, tracking how long it took and if it failed.
+        """
+        start = time.monotonic()
+        try:
+            connection = await self._run(self._connect, server)
+        except Exception:
+            server.record_failure()
+            raise
+        server.record_success(time.monotonic() - start)
+        return PooledConnection(connection, server)
 
+    async def _unbind(self, connection: Connection):
         with LDAPError.handle_errors(
-            "LDAP search failed",
+            "Failed to unbind from LDAP",
             do_except=log_error,
+            re_raise=False,
         ):
-            self.connection.search(
-                self.search_base,
-                f"(mail={email})",
-                attributes=["cn"],
+            await self._run(connection.unbind)
+
+    async def _probe_servers(self) -> typing.List[PooledConnection]:
+        """
+        Open a connection to each server, raising the first error if none could be reached.
+        """
+        results = await asyncio.gather(
+            *(self._open(server) for server in self._servers), return_exceptions=True
+        )
+        probes = [result for result in results if isinstance(result, PooledConnection)]
+        for (server, result) in zip(self._servers, results):
+            if isinstance(result, BaseException):
+                logger.warning(f"LDAP server {server.host} is unhealthy: {result!r}")
+        if not probes:
+            raise next(result for result in results if isinstance(result, BaseException))
+        return probes
+
+    async def _check_health(self):
+        """
+        Probe every server, so the ones that recovered are used again.
+        """
+        with LDAPError.handle_errors(
+            "All the LDAP servers are unhealthy",
+            do_except=log_error,
+            re_raise=False,
+        ):
+            for pooled in await self._probe_servers():
+                await self._unbind(pooled.connection)
+
+    async def _check_health_periodically(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            await self._check_health()
+
+    def _best_server(self) -> LDAPServer:
+        """
+        Select the fastest healthy server, or the one that will be retried first if none
+        is healthy.
+        """
+        healthy_servers = [server for server in self._servers if server.healthy]
+        if not healthy_servers:
+            return min(self._servers, key=lambda server: server.unhealthy_until)
+        return min(
+            healthy_servers,
+            key=lambda server: server.latency if server.latency is not None else math.inf,
+        )
+
+    def _should_replace(self, pooled: PooledConnection) -> bool:
+        """
+        Tell if a connection should be replaced by one to a healthier or faster server.
+        """
+        best_server = self._best_server()
+        if pooled.server is best_server:
+            return False
+        if not pooled.server.healthy:
+            return best_server.healthy
+        return (
+            best_server.latency is not None
+            and pooled.server.latency is not None
+            and best_server.latency < pooled.server.latency / 2
+        )
+
+    async def _acquire(self) -> PooledConnection:
+        """
+        Take an idle connection, opening a new one if all are busy and the pool isn't full.
+
+        Idle connections to servers that became unhealthy or much slower than the best
+        one are replaced by connections to the best server. When the pool is full, wait
+        until a connection is released or discarded (making room for a new one).
+        """
+        deadline = time.monotonic() + self._timeout_seconds
+        while True:
+            LDAPError.require_condition(
+                self._idle_connections is not None and self._pool_changed is not None,
+                "Not connected to an LDAP server yet!",
             )
+            LDAPError.require_condition(
+                not self.connection_lost,
+                "The connection to the LDAP server was lost",
+            )
+            # Make static type checkers happy
+            assert self._idle_connections is not None
+            assert self._pool_changed is not None
+
+            while not self._idle_connections.empty():
+                pooled = self._idle_connections.get_nowait()
+                if not self._should_replace(pooled):
+                    return pooled
+                logger.debug(f"Replacing the connection to LDAP server {pooled.server.host}")
+                self._discard(pooled)
+                asyncio.ensure_future(self._unbind(pooled.connection))
+
+            if self._connection_count < self._pool_size:
+                self._connection_count += 1
+                with LDAPError.handle_errors("Couldn't connect to LDAP", do_except=log_error):
+                    try:
+                        pooled = await self._open(self._best_server())
+                    except Exception:
+                        self._connection_count -= 1
+                        self._pool_changed.set()
+                        raise
+                    self._connections.append(pooled)
+                    return pooled
+
+            self._pool_changed.clear()
+            with LDAPError.handle_errors("Timed out waiting for an LDAP connection"):
+                await asyncio.wait_for(
+                    self._pool_changed.wait(), max(deadline - time.monotonic(), 0)
+                )
+
+    def _release(self, pooled: PooledConnection):
+        """
+        Return a connection to the pool.
+        """
+        assert self._idle_connections is not None
+        assert self._pool_changed is not None
+        self._idle_connections.put_nowait(pooled)
+        self._pool_changed.set()
+
+    def _discard(self, pooled: PooledConnection):
+        """
+        Drop a connection from the pool, so a new one can be opened in its place.
+        """
+        if pooled in self._connections:
+            self._connections.remove(pooled)
+            self._connection_count -= 1
+            if self._pool_changed is not None:
+                self._pool_changed.set()
+
+    async def _call(
+        self,
+        func: typing.Callable[[Connection], typing.Any],
+        timeout: typing.Optional[float] = None,
+        track_latency: bool = True,
+    ) -> typing.Any:
+        """
+        Run a blocking call with a connection from the pool.
+
+        If the call fails because of the connection (or times out), the server is marked
+        as unhealthy and the call is retried with another server. Once every server has
+        failed, the mapper is flagged for rebuild. The failed connections are not
+        returned to the pool, as they may still be in use by a worker thread.
+        """
+        for attempt in range(1, len(self._servers) + 1):
+            pooled = await self._acquire()
+            start = time.monotonic()
+            try:
+                result = await self._run(func, pooled.connection, timeout=timeout)
+            except Exception as err:
+                if not self._is_connection_error(err):
+                    self._release(pooled)
+                    raise
+                pooled.server.record_failure()
+                self._discard(pooled)
+                if attempt == len(self._servers) or not self._best_server().healthy:
+                    self.connection_lost = True
+                    raise
+                logger.warning(f"LDAP server {pooled.server.host} failed: {err!r}. Failing over")
+                continue
+
+            pooled.server.record_success(time.monotonic() - start if track_latency else None)
+            self._release(pooled)
+            return result
+
+    async def _search(
+        self, search_filter: str, attributes: typing.List[str]
+    ) -> typing.List[Entry]:
+        """
+        Search the directory, failing over to another server if the connection was lost.
+        """
+
+        def _search_entries(connection: Connection) -> typing.List[Entry]:
+            connection.search(self.search_base, search_filter, attributes=attributes)
+            return connection.entries
+
+        with LDAPError.handle_errors("LDAP search failed", do_except=log_error):
+            entries = await self._call(_search_entries)
 
-        entries = self.connection.entries
         logger.debug(f"Found {len(entries)} entries")
+        return entries
+
+    async def find_username(self, email: str) -> str:
+        """
+        Find an active diretory username given a user email.
+
+        Lazily connect to the LDAP server if not already connected.
+        """
+        logger.debug(f"Searching for email {email} in LDAP")
+        entries = await self._search(f"(mail={escape_filter_chars(email)})", ["cn"])
 
+        LDAPUserNotFoundError.require_condition(
+            len(entries) != 0,
+            f"Did not find exactly one match for email {email}. Found 0",
+        )
         LDAPError.require_condition(
             len(entries) == 1,
             f"Did not find exactly one match for email {email}. Found {len(entries)}",
@@ -112,8 +429,7 @@ class LDAPMapper(SlurmUserMapper):
             "Failed to extract data from match",
             do_except=log_error,
         ):
-            match = json.loads(entries[0].entry_to_json())
-            cns = match["attributes"]["cn"]
+            cns = list(entries[0].cn.values)
 
         LDAPError.require_condition(
             len(cns) == 1,
@@ -122,3 +438,76 @@ class LDAPMapper(SlurmUserMapper):
 
         username = cns.pop().lower()
         return username
+
+    async def find_usernames(self, emails: typing.Iterable[str]) -> typing.Dict[str, str]:
+        """
+        Find the active directory usernames of many emails with few searches.
+
+        The distinct emails are looked up with concurrent OR-filter searches of at most
+        ``LDAP_SEARCH_CHUNK_SIZE`` emails each. Emails that don't match exactly one entry
+        with exactly one CN are left out of the result.
+        """
+        distinct_emails = sorted(set(emails))
+        chunks = [
+            distinct_emails[i:i + self._search_chunk_size]
+            for i in range(0, len(distinct_emails), self._search_chunk_size)
+        ]
+        usernames: typing.Dict[str, str] = dict()
+
+        async def _search_chunk(chunk: typing.List[str]) -> typing.List[Entry]:
+            logger.debug(f"Searching for {len(chunk)} emails in LDAP")
+            search_filter = "(|{})".format(
+                "".join(f"(mail={escape_filter_chars(email)})" for email in chunk)
+            )
+            return await self._search(search_filter, ["cn", "mail"])
+
+        chunk_entries = await asyncio.gather(*(_search_chunk(chunk) for chunk in chunks))
+
+        for (chunk, entries) in zip(chunks, chunk_entries):
+            matches: typing.Dict[str, typing.List[Entry]] = defaultdict(list)
+            with LDAPError.handle_errors(
+                "Failed to extract data from matches",
+                do_except=log_error,
+            ):
+                for entry in entries:
+                    for mail in {mail.lower() for mail in entry.mail.values}:
+                        matches[mail].append(entry)
+
+                for email in chunk:
+                    email_matches = matches.get(email.lower(), [])
+                    if len(email_matches) != 1:
+                        logger.debug(f"Found {len(email_matches)} matches for email {email}")
+                        continue
+                    cns = list(email_matches[0].cn.values)
+                    if len(cns) != 1:
+                        logger.debug(f"User with email {email} did not have exactly one CN")
+                        continue
+                    usernames[email] = cns[0].lower()
+
+        return usernames
+
+    def needs_rebuild(self) -> bool:
+        """
+        Tell if the connection to the LDAP server was lost.
+        """
+        return self.connection_lost
+
+    async def close(self):
+        """
+        Unbind the connections to the LDAP servers and stop the thread pool.
+        """
+        if self._health_checker is not None:
+            self._health_checker.cancel()
+            self._health_checker = None
+        for pooled in self._connections:
+            await self._unbind(pooled.connection)
+        self._connections = []
+        self._connection_count = 0
+        self._idle_connections = None
+        if self._pool_changed is not None:
+            # Wake up the callers waiting for a connection, so they fail right away
+            self._pool_changed.set()
+            self._pool_changed = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
@@ -0,0 +1,256 @@
+"""
+Define an LDAP mapper that looks up usernames in a local index of the directory.
+"""
+
+import asyncio
+import datetime
+import json
+import time
+import typing
+from collections import defaultdict
+from pathlib import Path
+
+from ldap3 import Connection
+from loguru import logger
+
+from cluster_agent.identity.slurm_user.exceptions import LDAPError, LDAPUserNotFoundError
+from cluster_agent.identity.slurm_user.mappers.ldap import LDAPMapper
+from cluster_agent.settings import Settings
+from cluster_agent.utils.files import write_json_atomically
+from cluster_agent.utils.logging import log_error
+
+LDAP_TIMESTAMP_FORMAT = "%Y%m%d%H%M%SZ"
+
+
+def to_ldap_timestamp(value: typing.Any) -> str:
+    """
+    Convert a ``modifyTimestamp`` value (a datetime or a generalized time string) to the
+    generalized time format used in LDAP filters.
+    """
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(datetime.timezone.utc)
+        return value.strftime(LDAP_TIMESTAMP_FORMAT)
+    return str(value)
+
+
+class DirectoryIndex:
+    """
+    Keep the emails and CNs of the users in the directory, keyed by their DN.
+
+    The index is persisted in a file, so it survives restarts. It also records when the
+    last refresh and the last full sync happened and the latest ``modifyTimestamp``
+    seen (``last_modified``) for incremental refreshes.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.entries: typing.Dict[str, typing.Tuple[typing.List[str], typing.List[str]]] = {}
+        self.last_modified: typing.Optional[str] = None
+        self.last_refresh: float = 0
+        self.last_full_sync: float = 0
+        self._dns_by_mail: typing.Dict[str, typing.List[str]] = {}
+
+    def load(self):
+        """
+        Load the index from its file, starting empty if it cannot be read.
+        """
+        if not self.path.exists():
+            return
+        try:
+            data = json.loads(self.path.read_text())
+            self.entries = {
+                dn: (list(mails), list(cns)) for (dn, (mails, cns)) in data["entries"].items()
+            }
+            self.last_modified = data["last_modified"]
+            self.last_refresh = float(data["last_refresh"])
+            self.last_full_sync = float(data["last_full_sync"])
+        except Exception:
+            logger.warning(f"Couldn't load the LDAP index from {self.path}. Will do a full sync")
+            self.entries = {}
+            self.last_modified = None
+            self.last_refresh = 0
+            self.last_full_sync = 0
+        self._index_mails()
+
+    def save(self):
+        """
+        Persist the index in its file.
+        """
+        data = dict(
+            entries=self.entries,
+            last_modified=self.last_modified,
+            last_refresh=self.last_refresh,
+            last_full_sync=self.last_full_sync,
+        )
+        write_json_atomically(self.path, data, "LDAP index")
+
+    def update(self, entries: typing.List[dict], full_sync: bool):
+        """
+        Add or replace entries found by a search, as returned by ldap3's paged search.
+
+        A full sync replaces the whole index, dropping the users that were removed from
+        the directory.
+        """
+        updated_entries = dict() if full_sync else dict(self.entries)
+        last_modified = None if full_sync else self.last_modified
+        for entry in entries:
+            if entry.get("type") != "searchResEntry":
+                continue
+            attributes = entry["attributes"]
+            mails = [mail.lower() for mail in attributes.get("mail") or []]
+            cns = list(attributes.get("cn") or [])
+            updated_entries[entry["dn"]] = (mails, cns)
+
+            modified = attributes.get("modifyTimestamp")
+            if modified:
+                modified = to_ldap_timestamp(modified)
+                if last_modified is None or modified > last_modified:
+                    last_modified = modified
+
+        self.entries = updated_entries
+        self.last_modified = last_modified
+        self.last_refresh = time.time()
+        if full_sync:
+            self.last_full_sync = self.last_refresh
+        self._index_mails()
+
+    def _index_mails(self):
+        dns_by_mail: typing.Dict[str, typing.List[str]] = defaultdict(list)
+        for (dn, (mails, _)) in self.entries.items():
+            for mail in set(mails):
+                dns_by_mail[mail].append(dn)
+        self._dns_by_mail = dict(dns_by_mail)
+
+    def find_cns(self, email: str) -> typing.List[typing.List[str]]:
+        """
+        Provide the CNs of each entry that has the given email.
+        """
+        return [self.entries[dn][1] for dn in self._dns_by_mail.get(email.lower(), [])]
+
+
+class LDAPIndexMapper(LDAPMapper):
+    """
+    Provide a class that finds usernames in a local index of the LDAP directory.
+
+    The index is refreshed every ``LDAP_INDEX_REFRESH_SECONDS`` by a background task,
+    only fetching the entries modified since the previous refresh. Every
+    ``LDAP_INDEX_FULL_RESYNC_SECONDS`` all the entries are fetched again, dropping the
+    users removed from the directory. Lookups never reach the LDAP server.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.index: typing.Optional[DirectoryIndex] = None
+        self._refresher: typing.Optional[asyncio.Future] = None
+
+    async def configure(self, settings: Settings):
+        """
+        Connect to the LDAP server, refresh the index if due and start the refresher.
+        """
+        await super().configure(settings)
+        self._refresh_seconds = settings.LDAP_INDEX_REFRESH_SECONDS
+        self._full_resync_seconds = settings.LDAP_INDEX_FULL_RESYNC_SECONDS
+        self._page_size = settings.LDAP_INDEX_PAGE_SIZE
+        self._refresh_timeout_seconds = settings.LDAP_INDEX_TIMEOUT_SECONDS
+
+        self.index = DirectoryIndex(settings.CACHE_DIR / "slurm-user" / "ldap-index.json")
+        self.index.load()
+        if time.time() - self.index.last_refresh >= self._refresh_seconds:
+            await self.refresh()
+
+        self._refresher = asyncio.ensure_future(self._refresh_periodically())
+
+    async def refresh(self):
+        """
+        Fetch the new and modified entries (or all of them, if a full sync is due).
+        """
+        assert self.index is not None
+        full_sync = (
+            self.index.last_modified is None
+            or time.time() - self.index.last_full_sync >= self._full_resync_seconds
+        )
+        search_filter = "(mail=*)"
+        if not full_sync:
+            search_filter = f"(&(mail=*)(modifyTimestamp>={self.index.last_modified}))"
+
+        logger.debug(f"Refreshing the LDAP index ({'full' if full_sync else 'incremental'})")
+
+        def _paged_search(connection: Connection) -> typing.List[dict]:
+            return connection.extend.standard.paged_search(
+                self.search_base,
+                search_filter,
+                attributes=["mail", "cn", "modifyTimestamp"],
+                paged_size=self._page_size,
+                generator=False,
+            )
+
+        with LDAPError.handle_errors("Failed to refresh the LDAP index", do_except=log_error):
+            entries = await self._call(
+                _paged_search, timeout=self._refresh_timeout_seconds, track_latency=False
+            )
+
+        self.index.update(entries, full_sync)
+        self.index.save()
+        logger.debug(f"The LDAP index has {len(self.index.entries)} entries")
+
+    async def _refresh_periodically(self):
+        retry_at = 0.0
+        while True:
+            assert self.index is not None
+            next_refresh = max(self.index.last_refresh + self._refresh_seconds, retry_at)
+            await asyncio.sleep(max(next_refresh - time.time(), 0))
+            # A failed refresh doesn't move last_refresh, so it's retried after an interval
+            retry_at = time.time() + self._refresh_seconds
+            with LDAPError.handle_errors(
+                "Failed to refresh the LDAP index in the background",
+                do_except=log_error,
+                re_raise=False,
+            ):
+                await self.refresh()
+            if self.connection_lost:
+                logger.warning("Stopping the LDAP index refresher until the mapper is rebuilt")
+                return
+
+    async def find_username(self, email: str) -> str:
+        """
+        Find an active diretory username given a user email in the local index.
+        """
+        assert self.index is not None
+        matches = self.index.find_cns(email)
+
+        LDAPUserNotFoundError.require_condition(
+            len(matches) != 0,
+            f"Did not find exactly one match for email {email}. Found 0",
+        )
+        LDAPError.require_condition(
+            len(matches) == 1,
+            f"Did not find exactly one match for email {email}. Found {len(matches)}",
+        )
+        cns = matches[0]
+        LDAPError.require_condition(
+            len(cns) == 1,
+            f"User did not have exactly one CN. Got {cns}.",
+        )
+        return cns[0].lower()
+
+    async def find_usernames(self, emails: typing.Iterable[str]) -> typing.Dict[str, str]:
+        """
+        Find the active directory usernames of many emails in the local index.
+        """
+        assert self.index is not None
+        usernames = dict()
+        for email in set(emails):
+            matches = self.index.find_cns(email)
+            if len(matches) == 1 and len(matches[0]) == 1:
+                usernames[email] = matches[0][0].lower()
+        return usernames
+
+    async def close(self):
+        """
+        Stop the refresher and unbind the connections to the LDAP server.
+        """
+        if self._refresher is not None:
+            self._refresher.cancel()
+            self._refresher = None
+        await super().close()
@@ -2,6 +2,7 @@
 Provide definition of the base SlurmUserMapper class.
 """
 import abc
+import typing
 
 from cluster_agent.settings import Settings
 
@@ -14,6 +15,9 @@ class SlurmUserMapper(metaclass=abc.ABCMeta):
 
     - configure(): Configure the mapper given the app settings
     - find_username(): Map a provided email address to a local slurm user.
+
+    Mappers that can look up many emails at once may override ``find_usernames()``, and
+    mappers that hold connections may also override ``needs_rebuild()`` and ``close()``.
     """
 
     async def configure(self, settings: Settings):
@@ -32,3 +36,36 @@ class SlurmUserMapper(metaclass=abc.ABCMeta):
         Must be implemented by any derived class.
         """
         raise NotImplementedError
+
+    async def find_usernames(self, emails: typing.Iterable[str]) -> typing.Dict[str, str]:
+        """
+        Find the slurm user names of many emails.
+
+        Emails whose user name cannot be found are left out of the result, so they can be
+        looked up individually with ``find_username()`` to get the error.
+
+        May be overridden by any derived class
+        """
+        usernames = dict()
+        for email in set(emails):
+            try:
+                usernames[email] = await self.find_username(email)
+            except Exception:
+                continue
+        return usernames
+
+    def needs_rebuild(self) -> bool:
+        """
+        Tell if the mapper is no longer usable (e.g. it lost its connection).
+
+        May be overridden by any derived class
+        """
+        return False
+
+    async def close(self):
+        """
+        Release any resource held by the mapper.
+
+        May be overridden by any derived class
+        """
+        pass
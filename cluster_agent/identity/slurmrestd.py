@@ -1,18 +1,117 @@
 """Core module for Jobbergate API identity management"""
 
+import time
 import typing
+from dataclasses import dataclass
 from datetime import datetime, timedelta
+from pathlib import Path
 
 import httpx
 from jose import jwt
 from jose.exceptions import ExpiredSignatureError, JWTClaimsError, JWTError
 
 from cluster_agent.settings import SETTINGS
+from cluster_agent.utils.http import client_options
 from cluster_agent.utils.logging import logger
 
 CACHE_DIR = SETTINGS.CACHE_DIR / "slurmrestd"
 
 
+@dataclass
+class CachedToken:
+    """
+    A slurmrestd token held in memory along with its expiration timestamp (if any).
+    """
+
+    token: str
+    expires_at: typing.Optional[int]
+
+    def is_valid(self) -> bool:
+        """
+        Check if the token is still valid (and will not expire within 10 seconds).
+        """
+        return self.expires_at is None or self.expires_at - 10 > time.time()
+
+
+_token_cache: typing.Dict[str, CachedToken] = dict()
+"""
+Process-wide cache of slurmrestd tokens keyed by username.
+
+Valid tokens are served from memory, the cache files are only used to persist tokens
+across restarts.
+"""
+
+
+class SigningKeyLoader:
+    """
+    Provide the secret key used to sign slurmrestd tokens.
+
+    When the key is read from a file, it is held in memory and only reloaded if the
+    file's mtime or inode change (the file is checked at most once every
+    ``SLURMRESTD_JWT_KEY_CHECK_INTERVAL_SECONDS``). When the key is rotated, the tokens
+    signed with the old key are invalidated.
+    """
+
+    def __init__(self):
+        self.key: typing.Optional[str] = None
+        self.key_path: typing.Optional[Path] = None
+        self.file_id: typing.Optional[typing.Tuple[int, int]] = None
+        self.last_check: typing.Optional[float] = None
+
+    def check_rotation(self):
+        """
+        Reload the key if its file has changed since it was loaded.
+
+        Does nothing if the key was not loaded from a file yet or if it was checked recently.
+        """
+        if self.key is None or not SETTINGS.SLURMRESTD_USE_KEY_PATH:
+            return
+        assert self.last_check is not None
+        if time.monotonic() - self.last_check < SETTINGS.SLURMRESTD_JWT_KEY_CHECK_INTERVAL_SECONDS:
+            return
+        self.get_key()
+
+    def get_key(self) -> str:
+        """
+        Get the secret key, loading it from the key file if needed.
+        """
+        if not SETTINGS.SLURMRESTD_USE_KEY_PATH:
+            return SETTINGS.SLURMRESTD_JWT_KEY_STRING
+
+        key_path = Path(SETTINGS.SLURMRESTD_JWT_KEY_PATH)
+        stat = key_path.stat()
+        file_id = (stat.st_mtime_ns, stat.st_ino)
+        self.last_check = time.monotonic()
+
+        if self.key is not None and self.key_path == key_path and self.file_id == file_id:
+            return self.key
+
+        logger.debug(f"Loading slurmrestd JWT key from {key_path}")
+        key = key_path.read_text()
+        if self.key is not None and key != self.key:
+            logger.info("The slurmrestd JWT key was rotated. Invalidating existing tokens")
+            _token_cache.clear()
+
+        self.key = key
+        self.key_path = key_path
+        self.file_id = file_id
+        return key
+
+
+signing_key = SigningKeyLoader()
+
+
+def _cache_token_in_memory(token: str, username: str):
+    """
+    Keep the token in the in-memory cache, recording its expiration.
+    """
+    try:
+        expires_at = jwt.get_unverified_claims(token).get("exp")
+    except JWTError:
+        expires_at = None
+    _token_cache[username] = CachedToken(token=token, expires_at=expires_at)
+
+
 def _load_token_from_cache(username: str) -> typing.Union[str, None]:
     """
     Looks for and returns a token from a cache file (if it exists).
@@ -20,7 +119,7 @@ def _load_token_from_cache(username: str) -> typing.Union[str, None]:
     * The token does not exist
     * Can't read the token
     * The token is expired (or will expire within 10 seconds)
-    * The token has invalid signature
+    * The token has invalid signature (e.g. it was signed with a key that was rotated)
     * The token has invalid claims
     """
     token_path = CACHE_DIR / f"{username}.token"
@@ -36,23 +135,20 @@ def _load_token_from_cache(username: str) -> typing.Union[str, None]:
         logger.warning(f"Couldn't load token from cache file {token_path}. Will acquire a new one")
         return None
 
-    if SETTINGS.SLURMRESTD_USE_KEY_PATH:
-        secret_key = open(SETTINGS.SLURMRESTD_JWT_KEY_PATH, "r").read()
-    else:
-        secret_key = SETTINGS.SLURMRESTD_JWT_KEY_STRING
+    secret_key = signing_key.get_key()
 
     try:
         jwt.decode(
-            token, secret_key, options=dict(verify_signature=False, verify_exp=True, leeway=-10)
+            token, secret_key, algorithms=["HS256"], options=dict(verify_exp=True, leeway=-10)
         )
     except ExpiredSignatureError:
         logger.warning("Cached token is expired. Will acquire a new one.")
         return None
     except JWTClaimsError:
-        logger.warning("Cached token has the signature invalid in any way. Will acquire a new one.")
+        logger.warning("Cached token has invalid claims. Will acquire a new one.")
         return None
     except JWTError:
-        logger.warning("Cached token has invalid claims. Will acquire a new one.")
+        logger.warning("Cached token has the signature invalid in any way. Will acquire a new one.")
         return None
 
     return token
@@ -82,16 +178,21 @@ def _write_token_to_cache(token: str, username: str):
 def acquire_token(username: str) -> str:
     """
     Retrieves a token from Slurmrestd based on the app settings.
+
+    Tokens are served from memory while valid. Otherwise, they are loaded from the
+    cache files or generated.
     """
+    signing_key.check_rotation()
+    cached_token = _token_cache.get(username)
+    if cached_token is not None and cached_token.is_valid():
+        return cached_token.token
+
     logger.debug("Attempting to use cached token")
     token = _load_token_from_cache(username)
 
     if token is None:
         logger.debug("Attempting to generate token for Slurmrestd")
-        if SETTINGS.SLURMRESTD_USE_KEY_PATH:
-            secret_key = open(SETTINGS.SLURMRESTD_JWT_KEY_PATH, "r").read()
-        else:
-            secret_key = SETTINGS.SLURMRESTD_JWT_KEY_STRING
+        secret_key = signing_key.get_key()
 
         now = datetime.now()
         payload = {
@@ -104,6 +205,7 @@ def acquire_token(username: str) -> str:
         token = jwt.encode(payload, secret_key, algorithm="HS256")
         _write_token_to_cache(token, username)
 
+    _cache_token_in_memory(token, username)
     logger.debug("Successfully generated auth token")
     return token
 
@@ -140,6 +242,9 @@ class AsyncBackendClient(httpx.AsyncClient):
     Extends the httpx.AsyncClient class with automatic token acquisition for requests.
     The token is acquired lazily on the first httpx request issued.
     This client should be used for most agent actions.
+
+    If ``SLURMRESTD_UNIX_SOCKET`` is set, the requests are sent through that unix socket
+    (the host of the base URL is then only used in the ``Host`` header).
     """
 
     _token: typing.Optional[str]
@@ -149,6 +254,17 @@ class AsyncBackendClient(httpx.AsyncClient):
             raise ValueError(
                 "SLURM_RESTD_VERSIONED_URL must be set in order to use the AsyncBackendClient"
             )
+
+        options = client_options("SLURMRESTD")
+        transport = None
+        if SETTINGS.SLURMRESTD_UNIX_SOCKET is not None:
+            logger.debug(f"Connecting to slurmrestd through {SETTINGS.SLURMRESTD_UNIX_SOCKET}")
+            transport = httpx.AsyncHTTPTransport(
+                uds=SETTINGS.SLURMRESTD_UNIX_SOCKET,
+                http2=options.pop("http2"),
+                limits=options.pop("limits"),
+            )
+
         super().__init__(
             base_url=SETTINGS.SLURM_RESTD_VERSIONED_URL,
             auth=inject_token,
@@ -156,6 +272,8 @@ class AsyncBackendClient(httpx.AsyncClient):
                 request=[self._log_request],
                 response=[self._log_response],
             ),
+            transport=transport,
+            **options,
         )
 
     @staticmethod
@@ -1,13 +1,37 @@
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set
+
 from loguru import logger
 
 from cluster_agent.identity.slurmrestd import backend_client as slurmrestd_client
 from cluster_agent.jobbergate.api import fetch_active_submissions, update_status
 from cluster_agent.jobbergate.constants import JobSubmissionStatus
-from cluster_agent.jobbergate.schemas import SlurmSubmittedJobStatus
+from cluster_agent.jobbergate.schemas import ActiveJobSubmission, SlurmSubmittedJobStatus
+from cluster_agent.settings import SETTINGS
+from cluster_agent.utils.concurrency import gather_bounded
 from cluster_agent.utils.exception import SlurmrestdError
+from cluster_agent.utils.http import list_timeout
 from cluster_agent.utils.logging import log_error
 
 
+@dataclass
+class BulkStatusTracker:
+    """
+    Keep track of the bulk job status lookups across agent cycles.
+
+    After the first lookup, only jobs updated since the previous lookup are requested
+    from slurm. Jobs that were seen unfinished and are missing from the newer responses
+    have not changed, so they don't need to be looked up individually.
+    """
+
+    last_sync: Optional[int] = None
+    unfinished_job_ids: Set[int] = field(default_factory=set)
+
+
+bulk_status_tracker = BulkStatusTracker()
+
+
 async def fetch_job_status(slurm_job_id: int) -> SlurmSubmittedJobStatus:
     logger.debug(f"Fetching slurm job status for slurm job {slurm_job_id}")
 
@@ -29,43 +53,159 @@ async def fetch_job_status(slurm_job_id: int) -> SlurmSubmittedJobStatus:
     return slurm_status
 
 
+async def fetch_job_statuses(
+    update_time: Optional[int] = None,
+) -> Dict[int, SlurmSubmittedJobStatus]:
+    """
+    Fetch the status of all jobs known by slurm with a single request.
+
+    The list can be very large, so it's read with the longer list timeout.
+
+    If ``update_time`` is supplied, only jobs updated since then are returned by slurm.
+    """
+    logger.debug(f"Fetching slurm job statuses in bulk ({update_time=})")
+
+    with SlurmrestdError.handle_errors(
+        "Failed to fetch job statuses from slurm",
+        do_except=log_error,
+    ):
+        params = dict() if update_time is None else dict(update_time=update_time)
+        response = await slurmrestd_client.get("/jobs", params=params, timeout=list_timeout())
+        response.raise_for_status()
+        data = response.json()
+
+        slurm_statuses = [SlurmSubmittedJobStatus.parse_obj(job) for job in data["jobs"]]
+
+    logger.debug(f"Retrieved the status of {len(slurm_statuses)} slurm jobs")
+    return {
+        slurm_status.job_id: slurm_status
+        for slurm_status in slurm_statuses
+        if slurm_status.job_id is not None
+    }
+
+
+async def fetch_bulk_statuses(
+    active_job_submissions: List[ActiveJobSubmission],
+) -> Dict[int, Optional[SlurmSubmittedJobStatus]]:
+    """
+    Look up the slurm status of the active job submissions in bulk.
+
+    Map each slurm job id either to its status or to ``None`` if the job is known to be
+    unfinished and unchanged since the previous lookup. Jobs that are not in the mapping
+    must be looked up individually.
+    """
+    sync_time = int(time.time())
+    try:
+        slurm_statuses = await fetch_job_statuses(bulk_status_tracker.last_sync)
+    except Exception:
+        logger.debug("Bulk status lookup failed...falling back to per-job lookups")
+        return dict()
+
+    unchanged_job_ids = bulk_status_tracker.unfinished_job_ids - slurm_statuses.keys()
+    bulk_status_tracker.last_sync = sync_time
+    bulk_status_tracker.unfinished_job_ids = set(unchanged_job_ids)
+
+    statuses: Dict[int, Optional[SlurmSubmittedJobStatus]] = dict()
+    for slurm_job_id in {ajs.slurm_job_id for ajs in active_job_submissions}:
+        if slurm_job_id in slurm_statuses:
+            statuses[slurm_job_id] = slurm_statuses[slurm_job_id]
+        elif slurm_job_id in unchanged_job_ids:
+            statuses[slurm_job_id] = None
+    return statuses
+
+
+async def finish_active_job(
+    active_job_submission: ActiveJobSubmission,
+    status: SlurmSubmittedJobStatus,
+):
+    """
+    Mark an active job submission as finished if its slurm job has completed or failed.
+    """
+    skip = "skipping to next active job"
+
+    if status.jobbergate_status not in {
+        JobSubmissionStatus.COMPLETED,
+        JobSubmissionStatus.FAILED,
+    }:
+        logger.debug(f"Job is not complete or failed...{skip}")
+        bulk_status_tracker.unfinished_job_ids.add(active_job_submission.slurm_job_id)
+        return
+
+    logger.debug(f"Updating job_submission with status={status.jobbergate_status}")
+
+    try:
+        await update_status(
+            active_job_submission.id,
+            status.jobbergate_status,
+            report_message=status.state_reason,
+        )
+    except Exception:
+        logger.debug(f"API update failed...{skip}")
+
+
+async def check_active_job(
+    active_job_submission: ActiveJobSubmission,
+    bulk_statuses: Dict[int, Optional[SlurmSubmittedJobStatus]],
+):
+    """
+    Check the slurm status of an active job submission and finish it if it's done.
+
+    The status is taken from the bulk lookup when available. Otherwise, it's fetched
+    from slurm individually.
+    """
+    skip = "skipping to next active job"
+    slurm_job_id = active_job_submission.slurm_job_id
+
+    if slurm_job_id in bulk_statuses:
+        bulk_status = bulk_statuses[slurm_job_id]
+        if bulk_status is None:
+            logger.debug(f"Job is unchanged since the last lookup...{skip}")
+            return
+        await finish_active_job(active_job_submission, bulk_status)
+        return
+
+    logger.debug(
+        f"Fetching status of job_submission {active_job_submission.id} from slurm"
+    )
+
+    try:
+        status = await fetch_job_status(slurm_job_id)
+    except Exception:
+        logger.debug(f"Fetch status failed...{skip}")
+        return
+
+    await finish_active_job(active_job_submission, status)
+
+
 async def finish_active_jobs():
     """
     Mark all active jobs that have completed or failed as finished.
+
+    When ``JOB_STATUS_BULK_LOOKUP`` is enabled, the slurm job statuses are fetched in
+    bulk and only the jobs missing from the bulk response are looked up individually.
+    Up to ``JOB_STATUS_CONCURRENCY`` active jobs are checked at the same time, and each
+    one is updated as soon as its status is known.
     """
     logger.debug("Started marking completed jobs as finished...")
 
     logger.debug("Fetching active jobs")
     active_job_submissions = await fetch_active_submissions()
 
-    for active_job_submission in active_job_submissions:
-        skip = "skipping to next active job"
-        logger.debug(
-            f"Fetching status of job_submission {active_job_submission.id} from slurm"
-        )
+    # Forget about jobs whose submissions are no longer active
+    bulk_status_tracker.unfinished_job_ids &= {
+        ajs.slurm_job_id for ajs in active_job_submissions
+    }
+
+    bulk_statuses: Dict[int, Optional[SlurmSubmittedJobStatus]] = dict()
+    if SETTINGS.JOB_STATUS_BULK_LOOKUP and active_job_submissions:
+        bulk_statuses = await fetch_bulk_statuses(active_job_submissions)
 
-        try:
-            status = await fetch_job_status(active_job_submission.slurm_job_id)
-        except Exception:
-            logger.debug(f"Fetch status failed...{skip}")
-            continue
-
-        if status.jobbergate_status not in {
-            JobSubmissionStatus.COMPLETED,
-            JobSubmissionStatus.FAILED,
-        }:
-            logger.debug(f"Job is not complete or failed...{skip}")
-            continue
-
-        logger.debug(f"Updating job_submission with status={status.jobbergate_status}")
-
-        try:
-            await update_status(
-                active_job_submission.id,
-                status.jobbergate_status,
-                report_message=status.state_reason,
-            )
-        except Exception:
-            logger.debug(f"API update failed...{skip}")
+    await gather_bounded(
+        (
+            check_active_job(active_job_submission, bulk_statuses)
+            for active_job_submission in active_job_submissions
+        ),
+        SETTINGS.JOB_STATUS_CONCURRENCY,
+    )
 
     logger.debug("...Finished marking completed jobs as finished")
@@ -1,10 +1,10 @@
 import json
-from typing import Any, Dict, cast
+from typing import Any, Dict, Optional, cast
 
 from buzz import handle_errors
 from loguru import logger
 
-from cluster_agent.identity.slurm_user.factory import manufacture
+from cluster_agent.identity.slurm_user.factory import get_mapper
 from cluster_agent.identity.slurm_user.mappers import SlurmUserMapper
 from cluster_agent.identity.slurmrestd import backend_client as slurmrestd_client
 from cluster_agent.identity.slurmrestd import inject_token
@@ -21,12 +21,14 @@ from cluster_agent.jobbergate.schemas import (
     SlurmSubmitResponse,
 )
 from cluster_agent.settings import SETTINGS
+from cluster_agent.utils.concurrency import gather_bounded
 from cluster_agent.utils.exception import (
     JobSubmissionError,
     SlurmParameterParserError,
     SlurmrestdError,
     handle_errors_async,
 )
+from cluster_agent.utils.files import stage_files
 from cluster_agent.utils.logging import log_error
 
 
@@ -69,11 +71,14 @@ def get_job_parameters(slurm_parameters: Dict[str, Any], **kwargs) -> SlurmJobPa
 async def submit_job_script(
     pending_job_submission: PendingJobSubmission,
     user_mapper: SlurmUserMapper,
+    usernames: Optional[Dict[str, str]] = None,
 ) -> int:
     """
     Submit a Job Script to slurm via the Slurm REST API.
 
     :param: pending_job_submission: A job_submission with fields needed to submit.
+    :param: usernames: Usernames already found for the owner emails, if any. Owners
+            that are not included are looked up with the user mapper.
     :returns: The ``slurm_job_id`` for the submitted job
     """
 
@@ -88,11 +93,13 @@ async def submit_job_script(
     ):
         email = pending_job_submission.job_submission_owner_email
         name = pending_job_submission.application_name
-        mapper_class_name = user_mapper.__class__.__name__
-        logger.debug(
-            f"Fetching username for email {email} with mapper {mapper_class_name}"
-        )
-        username = await user_mapper.find_username(email)
+        username = (usernames or {}).get(email)
+        if username is None:
+            mapper_class_name = user_mapper.__class__.__name__
+            logger.debug(
+                f"Fetching username for email {email} with mapper {mapper_class_name}"
+            )
+            username = await user_mapper.find_username(email)
         logger.debug(f"Using local slurm user {username} for job submission")
 
         job_script = get_job_script(pending_job_submission)
@@ -102,11 +109,11 @@ async def submit_job_script(
             or SETTINGS.DEFAULT_SLURM_WORK_DIR
         )
 
-        for path, file_content in pending_job_submission.job_script_files.files.items():
-            local_script_path = submit_dir / path
-            local_script_path.parent.mkdir(parents=True, exist_ok=True)
-            local_script_path.write_text(file_content)
-            logger.debug(f"Copied job script file to {local_script_path}")
+        await stage_files(
+            submit_dir,
+            pending_job_submission.job_script_files.files,
+            SETTINGS.JOB_FILES_STAGING_CONCURRENCY,
+        )
 
     async with handle_errors_async(
         "Failed to extract Slurm parameters",
@@ -152,35 +159,72 @@ async def submit_job_script(
     return slurm_job_id
 
 
+async def submit_pending_job(
+    pending_job_submission: PendingJobSubmission,
+    user_mapper: SlurmUserMapper,
+    usernames: Optional[Dict[str, str]] = None,
+):
+    """
+    Submit a single pending job and update it with ``SUBMITTED`` status and slurm_job_id.
+
+    Failures are logged and swallowed so they don't affect other submissions.
+    """
+    logger.debug(f"Submitting pending job_submission {pending_job_submission.id}")
+    with JobSubmissionError.handle_errors(
+        (
+            f"Failed to submit pending job_submission {pending_job_submission.id}"
+            "...skipping to next pending job"
+        ),
+        do_except=log_error,
+        do_else=lambda: logger.debug(
+            f"Finished submitting pending job_submission {pending_job_submission.id}"
+        ),
+        re_raise=False,
+    ):
+        slurm_job_id = await submit_job_script(
+            pending_job_submission, user_mapper, usernames
+        )
+
+        await mark_as_submitted(pending_job_submission.id, slurm_job_id)
+
+
 async def submit_pending_jobs():
     """
     Submit all pending jobs and update them with ``SUBMITTED`` status and slurm_job_id.
 
-    :returns: The ``slurm_job_id`` for the submitted job
+    Up to ``SUBMISSION_CONCURRENCY`` pending jobs are submitted at the same time. The
+    user mapper is only retrieved when there are pending jobs, and the usernames of all
+    the owners are looked up at once before submitting.
     """
     logger.debug("Started submitting pending jobs...")
 
-    logger.debug("Building user-mapper")
-    user_mapper = await manufacture()
-
     logger.debug("Fetching pending jobs...")
     pending_job_submissions = await fetch_pending_submissions()
 
-    for pending_job_submission in pending_job_submissions:
-        logger.debug(f"Submitting pending job_submission {pending_job_submission.id}")
-        with JobSubmissionError.handle_errors(
-            (
-                f"Failed to submit pending job_submission {pending_job_submission.id}"
-                "...skipping to next pending job"
-            ),
-            do_except=log_error,
-            do_else=lambda: logger.debug(
-                f"Finished submitting pending job_submission {pending_job_submission.id}"
-            ),
-            re_raise=False,
-        ):
-            slurm_job_id = await submit_job_script(pending_job_submission, user_mapper)
-
-            await mark_as_submitted(pending_job_submission.id, slurm_job_id)
+    if not pending_job_submissions:
+        logger.debug("...No pending jobs to submit")
+        return
+
+    logger.debug("Retrieving user-mapper")
+    user_mapper = await get_mapper()
+
+    logger.debug("Fetching usernames of the pending job owners...")
+    usernames: Dict[str, str] = {}
+    with JobSubmissionError.handle_errors(
+        "Failed to fetch the usernames of the pending job owners",
+        do_except=log_error,
+        re_raise=False,
+    ):
+        usernames = await user_mapper.find_usernames(
+            pjs.job_submission_owner_email for pjs in pending_job_submissions
+        )
+
+    await gather_bounded(
+        (
+            submit_pending_job(pending_job_submission, user_mapper, usernames)
+            for pending_job_submission in pending_job_submissions
+        ),
+        SETTINGS.SUBMISSION_CONCURRENCY,
+    )
 
     logger.debug("...Finished submitting pending jobs")
@@ -1,5 +1,7 @@
 import asyncio
 import logging
+import signal
+from typing import Awaitable, Callable, List
 
 from sentry_sdk.integrations.logging import LoggingIntegration
 from sentry_sdk.utils import BadDsn
@@ -9,8 +11,12 @@ from cluster_agent.utils.logging import logger, log_error
 from cluster_agent.utils.exception import ProcessExecutionError
 from cluster_agent.settings import SETTINGS
 from cluster_agent import agent
+from cluster_agent.identity.cluster_api import backend_client as cluster_api_client
+from cluster_agent.identity.slurm_user.factory import close_mapper
+from cluster_agent.identity.slurmrestd import backend_client as slurmrestd_client
 from cluster_agent.jobbergate.submit import submit_pending_jobs
 from cluster_agent.jobbergate.finish import finish_active_jobs
+from cluster_agent.scheduler import ScheduledOperation, run_scheduler
 
 
 async def collect_diagnostics():
@@ -76,37 +82,103 @@ except BadDsn as e:
     logger.debug("##### Sentry could not be enabled: {}".format(e))
 
 
+def scheduled_operations() -> List[ScheduledOperation]:
+    """
+    Build the list of enabled agent operations along with their schedule.
+    """
+    operations = [
+        (collect_diagnostics, "COLLECT_DIAGNOSTICS"),
+        (collect_partitions, "COLLECT_PARTITIONS"),
+        (collect_nodes, "COLLECT_NODES"),
+        (collect_jobs, "COLLECT_JOBS"),
+        (submit_jobs, "SUBMIT_JOBS"),
+        (finish_jobs, "FINISH_JOBS"),
+    ]
+
+    return [
+        ScheduledOperation(
+            operation=operation,
+            interval=getattr(SETTINGS, f"{prefix}_INTERVAL_SECONDS"),
+            jitter=getattr(SETTINGS, f"{prefix}_JITTER_SECONDS"),
+        )
+        for (operation, prefix) in operations
+        if getattr(SETTINGS, f"{prefix}_ENABLED")
+    ]
+
+
+async def execute_operation(operation: Callable[[], Awaitable[None]]):
+    """
+    Execute a single agent operation, logging (and swallowing) any error it raises.
+    """
+    docstring = (operation.__doc__ or operation.__name__).strip()
+    logger.info(f">>>> Start: {docstring}")
+    finish_status = "!!!! Failed"
+    with ProcessExecutionError.handle_errors(
+        f"Operation {operation.__name__} failed",
+        do_except=log_error,
+        do_finally=lambda: logger.info(f"{finish_status}: {docstring}"),
+        re_raise=False,
+    ):
+        await operation()
+        finish_status = "<<<< Completed"
+
+
 async def run_agent():
     """Run task functions for the agent"""
     logger.info("Starting Cluster Agent")
 
-    operations = [
-        # collect_diagnostics,
-        # collect_partitions,
-        # collect_nodes,
-        # collect_jobs,
-        submit_jobs,
-        finish_jobs,
-    ]
+    # Operations are independent, so they run concurrently and a slow one doesn't delay
+    # the others. Errors are isolated per operation by ``execute_operation()``.
+    await asyncio.gather(
+        *(execute_operation(scheduled.operation) for scheduled in scheduled_operations())
+    )
 
-    for operation in operations:
-        docstring = (operation.__doc__ or operation.__name__).strip()
-        logger.info(f">>>> Start: {docstring}")
-        finish_status = "!!!! Failed"
-        with ProcessExecutionError.handle_errors(
-            f"Operation {operation.__name__} failed",
-            do_except=log_error,
-            do_finally=lambda: logger.info(f"{finish_status}: {docstring}"),
-            re_raise=False,
-        ):
-            await operation()
-            finish_status = "<<<< Completed"
+    logger.info("Cluster Agent run successfully")
 
-    logger.info("Cluster Agent run successfully, exiting...")
+
+async def close_clients():
+    """
+    Close the connection pools of the backend clients.
+    """
+    await cluster_api_client.aclose()
+    await slurmrestd_client.aclose()
+
+
+async def run_daemon():
+    """
+    Run the agent operations continuously inside a single event loop.
+
+    Each enabled operation runs on its own schedule (see ``scheduled_operations()``),
+    while the backend clients, their tokens and the user mapper are kept warm.
+    SIGTERM and SIGINT stop the daemon gracefully, closing the clients and the mapper.
+    """
+    logger.info("Starting Cluster Agent daemon")
+    loop = asyncio.get_running_loop()
+    daemon_task = asyncio.current_task()
+    assert daemon_task is not None
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, daemon_task.cancel)
+
+    try:
+        operations = scheduled_operations()
+        if not operations:
+            logger.warning("No agent operations are enabled, exiting...")
+            return
+        await run_scheduler(operations, execute_operation)
+    except asyncio.CancelledError:
+        logger.info("Cluster Agent daemon was stopped, exiting...")
+    finally:
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            loop.remove_signal_handler(signum)
+        await close_clients()
+        await close_mapper()
 
 
 def main():
-    asyncio.run(run_agent())
+    if SETTINGS.DAEMON_MODE:
+        asyncio.run(run_daemon())
+    else:
+        asyncio.run(run_agent())
 
 
 if __name__ == "__main__":
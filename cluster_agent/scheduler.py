@@ -0,0 +1,80 @@
+"""
+Provide a scheduler that runs agent operations periodically and independently.
+"""
+import asyncio
+import random
+from dataclasses import dataclass
+from typing import Awaitable, Callable, List
+
+from cluster_agent.utils.logging import logger
+
+
+@dataclass
+class ScheduledOperation:
+    """
+    Describe an agent operation along with how often it should run.
+
+    The operation runs every ``interval`` seconds, delayed by a random amount of up to
+    ``jitter`` seconds to avoid synchronized bursts against the backends.
+    """
+
+    operation: Callable[[], Awaitable[None]]
+    interval: float
+    jitter: float = 0.0
+
+    @property
+    def name(self) -> str:
+        return self.operation.__name__
+
+
+async def run_periodically(
+    scheduled: ScheduledOperation,
+    execute: Callable[[Callable[[], Awaitable[None]]], Awaitable[None]],
+):
+    """
+    Run a scheduled operation forever using the ``execute`` callable.
+
+    Runs of the same operation never overlap: if a run takes longer than the interval,
+    the missed runs are coalesced into a single run that starts right away.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await execute(scheduled.operation)
+        elapsed = loop.time() - started
+
+        if elapsed > scheduled.interval:
+            logger.warning(
+                f"Operation {scheduled.name} took {elapsed:.1f} seconds, longer than its "
+                f"interval of {scheduled.interval} seconds. Missed runs were coalesced"
+            )
+
+        delay = max(0.0, scheduled.interval - elapsed)
+        if scheduled.jitter:
+            delay += random.uniform(0, scheduled.jitter)
+        await asyncio.sleep(delay)
+
+
+async def run_scheduler(
+    scheduled_operations: List[ScheduledOperation],
+    execute: Callable[[Callable[[], Awaitable[None]]], Awaitable[None]],
+):
+    """
+    Run each scheduled operation on its own cadence until cancelled.
+    """
+    for scheduled in scheduled_operations:
+        logger.info(
+            f"Scheduling {scheduled.name} every {scheduled.interval} seconds "
+            f"(jitter up to {scheduled.jitter} seconds)"
+        )
+
+    tasks = [
+        asyncio.create_task(run_periodically(scheduled, execute))
+        for scheduled in scheduled_operations
+    ]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -20,15 +20,76 @@ class Settings(BaseSettings):
     X_SLURM_USER_TOKEN: Optional[str]
     DEFAULT_SLURM_WORK_DIR: Path = Path("/tmp")
 
+    # Parse the node and job lists while they are downloaded from slurmrestd
+    SLURMRESTD_STREAM_RESPONSES: bool = True
+
+    # Maximum number of pending jobs submitted at the same time
+    SUBMISSION_CONCURRENCY: int = Field(10, ge=1)
+    # Maximum number of job script files written at the same time for a submission
+    JOB_FILES_STAGING_CONCURRENCY: int = Field(4, ge=1)
+
+    # Look up the status of active jobs with a single request to slurmrestd
+    JOB_STATUS_BULK_LOOKUP: bool = True
+
+    # Maximum number of active jobs checked at the same time (protects slurmctld)
+    JOB_STATUS_CONCURRENCY: int = Field(10, ge=1)
+
     # Slurmrestd authentication
     SLURMRESTD_JWT_KEY_PATH: Optional[str]
     SLURMRESTD_JWT_KEY_STRING: Optional[str]
     SLURMRESTD_USE_KEY_PATH: bool = True
     SLURMRESTD_EXP_TIME_IN_SECONDS: int = 60 * 60 * 24  # one day
+    SLURMRESTD_JWT_KEY_CHECK_INTERVAL_SECONDS: float = 30
+
+    # Reach slurmrestd through a unix socket (a path or a unix:// URL) instead of TCP
+    SLURMRESTD_UNIX_SOCKET: Optional[str]
+
+    # Slurmrestd connection settings (HTTP/2 requires the h2 package)
+    SLURMRESTD_HTTP2: bool = False
+    SLURMRESTD_MAX_CONNECTIONS: int = Field(100, ge=1)
+    SLURMRESTD_MAX_KEEPALIVE_CONNECTIONS: int = Field(20, ge=0)
+    SLURMRESTD_KEEPALIVE_EXPIRY_SECONDS: float = Field(5, ge=0)
+    SLURMRESTD_TIMEOUT_SECONDS: float = Field(5, gt=0)
+    SLURMRESTD_CONNECT_TIMEOUT_SECONDS: float = Field(5, gt=0)
+    SLURMRESTD_READ_TIMEOUT_SECONDS: float = Field(5, gt=0)
+    # Read timeout for the node and job lists, which can be very large
+    SLURMRESTD_LIST_READ_TIMEOUT_SECONDS: float = Field(60, gt=0)
 
     # cluster api info
     BASE_API_URL: AnyHttpUrl = Field("https://armada-k8s.staging.omnivector.solutions")
 
+    # Cluster API connection settings (HTTP/2 requires the h2 package)
+    CLUSTER_API_HTTP2: bool = False
+    CLUSTER_API_MAX_CONNECTIONS: int = Field(100, ge=1)
+    CLUSTER_API_MAX_KEEPALIVE_CONNECTIONS: int = Field(20, ge=0)
+    CLUSTER_API_KEEPALIVE_EXPIRY_SECONDS: float = Field(5, ge=0)
+    CLUSTER_API_TIMEOUT_SECONDS: float = Field(5, gt=0)
+    CLUSTER_API_CONNECT_TIMEOUT_SECONDS: float = Field(5, gt=0)
+    CLUSTER_API_READ_TIMEOUT_SECONDS: float = Field(5, gt=0)
+
+    # Maximum number of upsert requests sent at the same time by each agent collector
+    CLUSTER_API_UPSERT_CONCURRENCY: int = Field(20, ge=1)
+
+    # Send the collected items in batches instead of one request per item
+    CLUSTER_API_BATCH_UPSERTS: bool = False
+    CLUSTER_API_BATCH_MAX_ITEMS: int = Field(100, ge=1)
+    CLUSTER_API_BATCH_MAX_BYTES: int = Field(1024 * 1024, ge=1)  # one megabyte
+
+    # Compress the request bodies larger than the threshold with gzip
+    CLUSTER_API_REQUEST_COMPRESSION: bool = False
+    CLUSTER_API_COMPRESSION_THRESHOLD_BYTES: int = Field(1024, ge=0)  # one kilobyte
+
+    # Remove the nodes and jobs that vanished from slurmrestd, with one DELETE per item
+    CLUSTER_API_REMOVE_VANISHED_ITEMS: bool = False
+
+    # Only send nodes that changed since the last sync, with a periodic full resync
+    NODES_DELTA_SYNC: bool = True
+    NODES_FULL_RESYNC_SECONDS: float = 60 * 60  # one hour
+
+    # Only request jobs updated since the last sync, with a periodic full pass
+    JOBS_INCREMENTAL_SYNC: bool = True
+    JOBS_FULL_RESYNC_SECONDS: float = 60 * 10  # ten minutes
+
     SENTRY_DSN: Optional[AnyHttpUrl] = None
     SENTRY_ENV: str = "local"
 
@@ -37,22 +98,73 @@ class Settings(BaseSettings):
     OIDC_AUDIENCE: str = "https://apis.omnivector.solutions"
     OIDC_CLIENT_ID: str
     OIDC_CLIENT_SECRET: str
+    OIDC_TOKEN_REFRESH_MARGIN_SECONDS: float = 60
 
     CACHE_DIR = Path.home() / ".cache/cluster-agent"
 
     # Type of slurm user mapper to use
     SLURM_USER_MAPPER: MapperType = MapperType.SINGLE_USER
 
-    # LDAP server settings
+    # LDAP server settings (LDAP_HOST may list several servers, separated by commas)
     LDAP_HOST: Optional[str]
     LDAP_DOMAIN: Optional[str]
     LDAP_USERNAME: Optional[str]
     LDAP_PASSWORD: Optional[str]
     LDAP_AUTH_TYPE: LDAPAuthType = LDAPAuthType.SIMPLE
+    # Maximum number of emails looked up with a single search (limits the filter size)
+    LDAP_SEARCH_CHUNK_SIZE: int = Field(50, ge=1)
+    # Maximum number of connections used for concurrent LDAP lookups
+    LDAP_POOL_SIZE: int = Field(4, ge=1)
+    # How often the LDAP servers are probed and for how long a failed server is skipped
+    LDAP_HEALTH_CHECK_SECONDS: float = Field(60, gt=0)
+    LDAP_SERVER_RETRY_SECONDS: float = Field(30, gt=0)
+    # Look up usernames in a local index of the directory, refreshed in the background
+    LDAP_INDEX_ENABLED: bool = False
+    LDAP_INDEX_REFRESH_SECONDS: float = Field(60 * 15, gt=0)  # fifteen minutes
+    LDAP_INDEX_FULL_RESYNC_SECONDS: float = Field(60 * 60 * 24, gt=0)  # one day
+    LDAP_INDEX_PAGE_SIZE: int = Field(500, ge=1)
+    LDAP_INDEX_TIMEOUT_SECONDS: float = Field(60 * 5, gt=0)
+
+    # Cache of the usernames found by the user mapper (not used for single user)
+    USER_MAPPER_CACHE_ENABLED: bool = True
+    USER_MAPPER_CACHE_TTL_SECONDS: float = Field(60 * 60, ge=0)  # one hour
+    USER_MAPPER_CACHE_NEGATIVE_TTL_SECONDS: float = Field(60, ge=0)
+    USER_MAPPER_CACHE_MAX_SIZE: int = Field(10000, ge=1)
+    USER_MAPPER_CACHE_PERSIST: bool = False
+
+    # File user mapper settings: a CSV or JSON file mapping emails to usernames, and the
+    # mapper type used for the emails not in the file (no fallback if not set)
+    USER_MAPPER_FILE: Optional[Path]
+    USER_MAPPER_FILE_FALLBACK: Optional[MapperType]
 
     # Single user submitter settings
     SINGLE_USER_SUBMITTER: Optional[str]
 
+    # Daemon mode settings
+    DAEMON_MODE: bool = False
+    DAEMON_CYCLE_INTERVAL_SECONDS: float = Field(15, gt=0)
+
+    # Operation scheduling settings
+    # Intervals default to DAEMON_CYCLE_INTERVAL_SECONDS when not set
+    SUBMIT_JOBS_ENABLED: bool = True
+    SUBMIT_JOBS_INTERVAL_SECONDS: Optional[float] = Field(None, gt=0)
+    SUBMIT_JOBS_JITTER_SECONDS: float = Field(0, ge=0)
+    FINISH_JOBS_ENABLED: bool = True
+    FINISH_JOBS_INTERVAL_SECONDS: Optional[float] = Field(None, gt=0)
+    FINISH_JOBS_JITTER_SECONDS: float = Field(0, ge=0)
+    COLLECT_DIAGNOSTICS_ENABLED: bool = False
+    COLLECT_DIAGNOSTICS_INTERVAL_SECONDS: Optional[float] = Field(None, gt=0)
+    COLLECT_DIAGNOSTICS_JITTER_SECONDS: float = Field(0, ge=0)
+    COLLECT_PARTITIONS_ENABLED: bool = False
+    COLLECT_PARTITIONS_INTERVAL_SECONDS: Optional[float] = Field(None, gt=0)
+    COLLECT_PARTITIONS_JITTER_SECONDS: float = Field(0, ge=0)
+    COLLECT_NODES_ENABLED: bool = False
+    COLLECT_NODES_INTERVAL_SECONDS: Optional[float] = Field(None, gt=0)
+    COLLECT_NODES_JITTER_SECONDS: float = Field(0, ge=0)
+    COLLECT_JOBS_ENABLED: bool = False
+    COLLECT_JOBS_INTERVAL_SECONDS: Optional[float] = Field(None, gt=0)
+    COLLECT_JOBS_JITTER_SECONDS: float = Field(0, ge=0)
+
     @root_validator
     def compute_extra_settings(cls, values):
         """
@@ -64,6 +176,10 @@ class Settings(BaseSettings):
                 version=values["SLURM_RESTD_VERSION"],
             )
 
+        unix_socket = values.get("SLURMRESTD_UNIX_SOCKET")
+        if unix_socket is not None and unix_socket.startswith("unix://"):
+            values["SLURMRESTD_UNIX_SOCKET"] = unix_socket[len("unix://"):]
+
         ldap_host = values["LDAP_HOST"]
         ldap_domain = values["LDAP_DOMAIN"]
 
@@ -71,6 +187,20 @@ class Settings(BaseSettings):
         if ldap_domain is not None and ldap_host is None:
             values["LDAP_HOST"] = ldap_domain
 
+        # Operations without their own interval run once per daemon cycle
+        for operation in (
+            "SUBMIT_JOBS",
+            "FINISH_JOBS",
+            "COLLECT_DIAGNOSTICS",
+            "COLLECT_PARTITIONS",
+            "COLLECT_NODES",
+            "COLLECT_JOBS",
+        ):
+            if values.get(f"{operation}_INTERVAL_SECONDS") is None:
+                values[f"{operation}_INTERVAL_SECONDS"] = values.get(
+                    "DAEMON_CYCLE_INTERVAL_SECONDS"
+                )
+
         # If using single user, but don't have the setting, use default slurm user
         if values["SINGLE_USER_SUBMITTER"] is None:
             values["SINGLE_USER_SUBMITTER"] = values["X_SLURM_USER_NAME"]
@@ -0,0 +1,82 @@
+"""Core module for bounded concurrency operations"""
+
+import asyncio
+from typing import AsyncIterable, AsyncIterator, Awaitable, Iterable, List, Set, TypeVar, Union
+
+T = TypeVar("T")
+
+
+async def gather_bounded(aws: Iterable[Awaitable[T]], limit: int) -> List[T]:
+    """
+    Await all the awaitables concurrently, with at most ``limit`` of them in flight.
+
+    The results are returned in the same order as the awaitables were supplied, just like
+    ``asyncio.gather()``. Exceptions are propagated, so each awaitable should handle its
+    own errors if failures must be isolated.
+
+    :param: aws:   The awaitables (usually coroutines) to run.
+    :param: limit: The maximum number of awaitables that may run at the same time.
+    """
+    semaphore = asyncio.Semaphore(limit)
+
+    async def _bounded(aw: Awaitable[T]) -> T:
+        async with semaphore:
+            return await aw
+
+    return await asyncio.gather(*(_bounded(aw) for aw in aws))
+
+
+async def iterate_async(items: Union[Iterable[T], AsyncIterable[T]]) -> AsyncIterator[T]:
+    """
+    Iterate asynchronously over either a regular or an asynchronous iterable.
+    """
+    if isinstance(items, AsyncIterable):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
+
+
+async def as_completed_bounded(
+    aws: Union[Iterable[Awaitable[T]], AsyncIterable[Awaitable[T]]], limit: int
+) -> AsyncIterator["asyncio.Future[T]"]:
+    """
+    Run the awaitables concurrently and yield them as they complete.
+
+    At most ``limit`` awaitables are in flight at any time and new ones are only pulled
+    from ``aws`` when there is room for them, so a lazy iterable (like a generator) is
+    never fully materialized. ``aws`` may also be an asynchronous iterable, in which case
+    the awaitables in flight keep running while the next ones are produced. Each completed
+    future is yielded as is, so the caller can handle its result or exception individually.
+
+    :param: aws:   The awaitables (usually coroutines) to run.
+    :param: limit: The maximum number of awaitables that may run at the same time.
+    """
+    iterator = iterate_async(aws)
+    exhausted = False
+    pending: Set["asyncio.Future[T]"] = set()
+
+    async def _refill(count: int):
+        nonlocal exhausted
+        while not exhausted and count > 0:
+            try:
+                aw = await iterator.__anext__()
+            except StopAsyncIteration:
+                exhausted = True
+            else:
+                pending.add(asyncio.ensure_future(aw))
+                count -= 1
+
+    try:
+        await _refill(limit)
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            pending.difference_update(done)
+            await _refill(len(done))
+            for future in done:
+                yield future
+    finally:
+        for future in pending:
+            future.cancel()
+        await iterator.aclose()
@@ -0,0 +1,112 @@
+"""Core module for writing files safely and without blocking the event loop"""
+
+import asyncio
+import json
+import os
+import typing
+import uuid
+from pathlib import Path
+
+from cluster_agent.utils.concurrency import gather_bounded
+from cluster_agent.utils.logging import logger
+
+# Directories known to exist, so they are not created again for every file
+_created_directories: typing.Set[Path] = set()
+
+
+def ensure_directory(path: Path, refresh: bool = False):
+    """
+    Create a directory (and its parents) unless it was already created.
+
+    If ``refresh`` is set, the directory is created even if it's in the cache (e.g. after
+    it was removed by someone else).
+    """
+    if path in _created_directories and not refresh:
+        return
+    path.mkdir(parents=True, exist_ok=True)
+    _created_directories.add(path)
+
+
+def has_content(path: Path, data: bytes) -> bool:
+    """
+    Check if a file already exists with exactly the given content.
+
+    The sizes are compared first, so the file is only read when it could have the same
+    content.
+    """
+    try:
+        if path.stat().st_size != len(data):
+            return False
+        return path.read_bytes() == data
+    except OSError:
+        return False
+
+
+def write_file_atomically(path: Path, content: str) -> bool:
+    """
+    Write a file through a temporary file that is renamed over it (blocking).
+
+    Readers never see a partially written file. Files that already have the same content
+    are not written again. Return whether the file was written.
+    """
+    data = content.encode("utf-8")
+    if has_content(path, data):
+        return False
+
+    temp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        temp_path.write_bytes(data)
+    except FileNotFoundError:
+        ensure_directory(path.parent, refresh=True)
+        temp_path.write_bytes(data)
+    try:
+        os.replace(temp_path, path)
+    except Exception:
+        temp_path.unlink()
+        raise
+    return True
+
+
+def write_json_atomically(path: Path, data: typing.Any, description: str):
+    """
+    Persist ``data`` as JSON, replacing the previous file atomically (blocking).
+
+    The parent directory is created if needed, only accessible by the agent. Failures are
+    only logged with the ``description`` of the data, since it's still usable in memory.
+    """
+    temp_path = path.with_name(f".{path.name}.tmp")
+    try:
+        path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        temp_path.write_text(json.dumps(data))
+        temp_path.replace(path)
+    except Exception:
+        logger.warning(f"Couldn't save the {description} to {path}")
+
+
+def stage_file(path: Path, content: str):
+    """
+    Create the parent directory of a file and write it atomically (blocking).
+    """
+    ensure_directory(path.parent)
+    if write_file_atomically(path, content):
+        logger.debug(f"Copied job script file to {path}")
+    else:
+        logger.debug(f"Job script file {path} is unchanged. Skipping it")
+
+
+async def stage_files(directory: Path, files: typing.Dict[str, str], concurrency: int):
+    """
+    Write files relative to a directory in the default thread pool.
+
+    At most ``concurrency`` files are written at the same time, so a slow (e.g. network)
+    filesystem doesn't block the event loop or exhaust the thread pool.
+    """
+    loop = asyncio.get_running_loop()
+
+    async def _stage(path: Path, content: str):
+        await loop.run_in_executor(None, stage_file, path, content)
+
+    await gather_bounded(
+        (_stage(directory / path, content) for (path, content) in files.items()),
+        concurrency,
+    )
@@ -0,0 +1,56 @@
+"""Core module for http client related operations"""
+
+import importlib.util
+import typing
+
+import httpx
+
+from cluster_agent.settings import SETTINGS
+from cluster_agent.utils.logging import logger
+
+
+def http2_available() -> bool:
+    """
+    Check if the optional ``h2`` package needed for HTTP/2 is installed.
+    """
+    return importlib.util.find_spec("h2") is not None
+
+
+def client_options(prefix: str) -> typing.Dict[str, typing.Any]:
+    """
+    Provide the connection options for a backend client from the settings with ``prefix``.
+
+    The options include the HTTP/2 flag, the connection pool limits and the timeouts. If
+    HTTP/2 is enabled but the ``h2`` package is not installed, HTTP/1.1 is used instead.
+    """
+    http2 = getattr(SETTINGS, f"{prefix}_HTTP2")
+    if http2 and not http2_available():
+        logger.warning(
+            f"{prefix}_HTTP2 is enabled but the h2 package is not installed. Using HTTP/1.1"
+        )
+        http2 = False
+
+    return dict(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=getattr(SETTINGS, f"{prefix}_MAX_CONNECTIONS"),
+            max_keepalive_connections=getattr(SETTINGS, f"{prefix}_MAX_KEEPALIVE_CONNECTIONS"),
+            keepalive_expiry=getattr(SETTINGS, f"{prefix}_KEEPALIVE_EXPIRY_SECONDS"),
+        ),
+        timeout=httpx.Timeout(
+            getattr(SETTINGS, f"{prefix}_TIMEOUT_SECONDS"),
+            connect=getattr(SETTINGS, f"{prefix}_CONNECT_TIMEOUT_SECONDS"),
+            read=getattr(SETTINGS, f"{prefix}_READ_TIMEOUT_SECONDS"),
+        ),
+    )
+
+
+def list_timeout() -> httpx.Timeout:
+    """
+    Provide the timeout for reading item lists from slurmrestd, which can be very large.
+    """
+    return httpx.Timeout(
+        SETTINGS.SLURMRESTD_TIMEOUT_SECONDS,
+        connect=SETTINGS.SLURMRESTD_CONNECT_TIMEOUT_SECONDS,
+        read=SETTINGS.SLURMRESTD_LIST_READ_TIMEOUT_SECONDS,
+    )
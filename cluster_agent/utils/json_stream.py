@@ -0,0 +1,184 @@
+"""Core module for parsing large JSON documents incrementally"""
+
+import codecs
+import json
+import typing
+
+WHITESPACE = " \t\n\r"
+
+
+class JSONItemStream:
+    """
+    Parse a JSON object from a stream of bytes, yielding the items of one of its arrays.
+
+    Only one item (plus the chunk being read) is held in memory at a time, so documents
+    with huge arrays can be processed as they arrive. The other values of the object are
+    collected in ``header`` as they are parsed.
+
+    The items are yielded as soon as all the ``header_keys`` were parsed. If the array
+    comes before them in the document, its items are kept until they were found, since
+    they are usually needed to process the items.
+
+    Example:
+
+    .. code-block:: python
+
+       stream = JSONItemStream(response.aiter_bytes(), "jobs", header_keys=["meta"])
+       async for job in stream.items():
+           process(stream.header["meta"], job)
+    """
+
+    def __init__(
+        self,
+        chunks: typing.AsyncIterable[bytes],
+        items_key: str,
+        header_keys: typing.Iterable[str] = (),
+    ):
+        self.header: typing.Dict[str, typing.Any] = dict()
+        self.items_key = items_key
+        self.header_keys = set(header_keys)
+
+        self._chunks = chunks.__aiter__()
+        self._text_decoder = codecs.getincrementaldecoder("utf-8")()
+        self._json_decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._position = 0
+        self._exhausted = False
+
+    async def items(self) -> typing.AsyncIterator[typing.Any]:
+        """
+        Parse the document, yielding the items of the array as they are parsed.
+
+        Raises a ``ValueError`` if the document is not a valid JSON object.
+        """
+        pending_items: typing.List[typing.Any] = []
+
+        await self._expect("{")
+        if await self._peek() == "}":
+            self._position += 1
+        else:
+            while True:
+                key = await self._decode_value()
+                if not isinstance(key, str):
+                    raise ValueError(f"Expected an object key, found {key!r}")
+                await self._expect(":")
+
+                if key == self.items_key:
+                    await self._expect("[")
+                    if await self._peek() == "]":
+                        self._position += 1
+                    else:
+                        while True:
+                            item = await self._decode_value()
+                            if self.header_keys.issubset(self.header):
+                                yield item
+                            else:
+                                pending_items.append(item)
+                            if await self._expect(",", "]") == "]":
+                                break
+                else:
+                    self.header[key] = await self._decode_value()
+
+                if await self._expect(",", "}") == "}":
+                    break
+
+        for item in pending_items:
+            yield item
+
+        if await self._peek(allow_end=True) is not None:
+            raise ValueError("Unexpected data after the end of the JSON document")
+
+    async def _fill(self) -> bool:
+        """
+        Read the next chunk into the buffer, discarding the text that was already parsed.
+
+        Returns False if there is nothing left to read.
+        """
+        if self._exhausted:
+            return False
+
+        self._buffer = self._buffer[self._position:]
+        self._position = 0
+
+        try:
+            chunk = await self._chunks.__anext__()
+        except StopAsyncIteration:
+            self._exhausted = True
+            self._buffer += self._text_decoder.decode(b"", final=True)
+            return False
+
+        self._buffer += self._text_decoder.decode(chunk)
+        return True
+
+    async def _peek(self, allow_end: bool = False) -> typing.Optional[str]:
+        """
+        Skip whitespace and return the next character without consuming it.
+        """
+        while True:
+            while self._position < len(self._buffer):
+                character = self._buffer[self._position]
+                if character not in WHITESPACE:
+                    return character
+                self._position += 1
+            if not await self._fill():
+                if allow_end:
+                    return None
+                raise ValueError("Unexpected end of the JSON document")
+
+    async def _expect(self, *characters: str) -> str:
+        """
+        Consume the next character, which must be one of ``characters``.
+        """
+        character = await self._peek()
+        if character not in characters:
+            raise ValueError(
+                f"Expected one of {characters} at position {self._position}, found {character!r}"
+            )
+        self._position += 1
+        return typing.cast(str, character)
+
+    async def _decode_value(self) -> typing.Any:
+        """
+        Decode the next JSON value, reading more chunks until it's complete.
+
+        A value that ends with the buffer (like a number) might continue in the next chunk,
+        so it's only accepted once the following character was read. The same goes for a
+        number followed by an incomplete fraction or exponent (like ``1.`` or ``1e``). To
+        keep the parsing linear, the buffer is at least doubled before decoding an
+        incomplete value again.
+        """
+        await self._peek()
+        while True:
+            try:
+                (value, end) = self._json_decoder.raw_decode(self._buffer, self._position)
+            except json.JSONDecodeError:
+                end = None
+
+            if end is not None and (self._exhausted or not self._might_continue(value, end)):
+                self._position = end
+                return value
+
+            pending_size = len(self._buffer) - self._position
+            read_size = 0
+            while read_size < pending_size:
+                size_before = len(self._buffer) - self._position
+                if not await self._fill():
+                    break
+                read_size += len(self._buffer) - self._position - size_before
+
+            if read_size == 0 and self._exhausted:
+                if end is not None:
+                    self._position = end
+                    return value
+                raise ValueError(f"Invalid JSON value at position {self._position}")
+
+    def _might_continue(self, value: typing.Any, end: int) -> bool:
+        """
+        Tell if a value decoded up to ``end`` might continue in the next chunk.
+        """
+        if end == len(self._buffer):
+            return True
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            # The fraction or exponent of a number may be incomplete, e.g. "1." or "1e-"
+            return self._buffer[end] in ".eE"
+        return False
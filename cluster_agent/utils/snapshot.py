@@ -0,0 +1,98 @@
+"""Core module for tracking what was already synced to the cluster API"""
+
+import hashlib
+import json
+import time
+import typing
+from pathlib import Path
+
+from cluster_agent.utils.files import write_json_atomically
+from cluster_agent.utils.logging import logger
+
+
+def content_hash(item: typing.Any) -> str:
+    """
+    Compute a stable hash of the content of a JSON-serializable item.
+    """
+    serialized = json.dumps(item, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+
+class SyncSnapshot:
+    """
+    Keep the content hashes of the items synced to the cluster API, keyed by item id.
+
+    The snapshot is persisted in a file, so it survives restarts. It also records when
+    the last full sync happened, so that a full resync can heal any drift periodically,
+    and the time of the last completed sync (``last_sync``) for incremental queries.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._hashes: typing.Optional[typing.Dict[str, str]] = None
+        self._last_full_sync: float = 0
+        self._last_sync: typing.Optional[int] = None
+
+    @property
+    def hashes(self) -> typing.Dict[str, str]:
+        """
+        Provide the content hashes, loading them from the snapshot file on first use.
+        """
+        self._ensure_loaded()
+        assert self._hashes is not None
+        return self._hashes
+
+    @property
+    def last_sync(self) -> typing.Optional[int]:
+        """
+        Provide the timestamp of the last completed sync, if any.
+        """
+        self._ensure_loaded()
+        return self._last_sync
+
+    @last_sync.setter
+    def last_sync(self, value: typing.Optional[int]):
+        self._ensure_loaded()
+        self._last_sync = value
+
+    def _ensure_loaded(self):
+        if self._hashes is not None:
+            return
+        self._hashes = dict()
+        if not self.path.exists():
+            return
+        try:
+            data = json.loads(self.path.read_text())
+            self._hashes = dict(data["hashes"])
+            self._last_full_sync = float(data["last_full_sync"])
+            self._last_sync = data.get("last_sync")
+        except Exception:
+            logger.warning(f"Couldn't load sync snapshot from {self.path}. Will do a full sync")
+            self._hashes = dict()
+            self._last_full_sync = 0
+            self._last_sync = None
+
+    def save(self):
+        """
+        Persist the snapshot in its file.
+        """
+        data = dict(
+            hashes=self.hashes,
+            last_full_sync=self._last_full_sync,
+            last_sync=self._last_sync,
+        )
+        write_json_atomically(self.path, data, "sync snapshot")
+
+    def full_sync_due(self, interval: float) -> bool:
+        """
+        Check if the last full sync happened more than ``interval`` seconds ago.
+        """
+        self._ensure_loaded()
+        return time.time() - self._last_full_sync >= interval
+
+    def mark_full_sync(self):
+        """
+        Record that a full sync was just completed.
+        """
+        self._ensure_loaded()
+        self._last_full_sync = time.time()
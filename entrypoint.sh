@@ -33,10 +33,7 @@ do
 done < /etc/users/user-tokens.txt
 echo "Finished processing /etc/users/user-tokens.txt"
 
-while true
-do
-    echo "Executing agent in loop"
-    python3 cluster_agent/main.py
-    echo "Sleeping for 15 seconds"
-    sleep 15
-done
+echo "Executing agent in daemon mode"
+export CLUSTER_AGENT_DAEMON_MODE=true
+export CLUSTER_AGENT_DAEMON_CYCLE_INTERVAL_SECONDS=${CLUSTER_AGENT_DAEMON_CYCLE_INTERVAL_SECONDS:-15}
+exec python3 cluster_agent/main.py
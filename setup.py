@@ -34,7 +34,8 @@ setup(
             "pytest-random-order==1.0.4",
             "pytest-cov==3.0.0",
             "freezegun==1.2.2",
-        ]
+        ],
+        http2=["h2>=3,<5"],
     ),
     packages=find_packages(),
     keywords=["armada", "hpc"],
@@ -43,6 +43,27 @@ def mock_slurmrestd_api_cache_dir(tmp_path):
         yield _cache_dir
 
 
+@pytest.fixture(autouse=True)
+def mock_slurmrestd_token_memory_cache():
+    with mock.patch.dict("cluster_agent.identity.slurmrestd._token_cache", clear=True):
+        yield
+
+
+@pytest.fixture(autouse=True)
+def mock_slurmrestd_signing_key():
+    from cluster_agent.identity.slurmrestd import SigningKeyLoader
+
+    with mock.patch("cluster_agent.identity.slurmrestd.signing_key", new=SigningKeyLoader()):
+        yield
+
+
+@pytest.fixture(autouse=True)
+def reset_user_mapper():
+    with mock.patch("cluster_agent.identity.slurm_user.factory._mapper_instance", new=None):
+        with mock.patch("cluster_agent.identity.slurm_user.factory._username_cache", new=None):
+            yield
+
+
 @pytest.fixture(autouse=True)
 def slurmrestd_jwt_key_string():
     yield "DUMMY-JWT-SECRET"
@@ -0,0 +1,181 @@
+"""
+Define tests for the cached mapper.
+"""
+
+import asyncio
+
+import pytest
+from freezegun import freeze_time
+
+from cluster_agent.identity.slurm_user.exceptions import (
+    LDAPError,
+    LDAPUserNotFoundError,
+    UserNotFoundError,
+)
+from cluster_agent.identity.slurm_user.mappers.cached import CachedMapper, UsernameCache
+from cluster_agent.identity.slurm_user.mappers.mapper_base import SlurmUserMapper
+
+
+@pytest.fixture
+def mock_mapper(mocker):
+    mapper = mocker.AsyncMock(SlurmUserMapper)
+    mapper.find_username.side_effect = lambda email: email.split("@")[0]
+    return mapper
+
+
+async def test_find_username__caches_usernames_until_they_expire(mock_mapper):
+    """
+    Test that a username is only looked up again once its cache entry expired.
+    """
+    mapper = CachedMapper(mock_mapper, UsernameCache(ttl=60, negative_ttl=10, max_size=10))
+
+    with freeze_time("2023-03-01 12:00:00"):
+        assert await mapper.find_username("alice@dummy.com") == "alice"
+        assert await mapper.find_username("alice@dummy.com") == "alice"
+    with freeze_time("2023-03-01 12:00:59"):
+        assert await mapper.find_username("alice@dummy.com") == "alice"
+    assert mock_mapper.find_username.await_count == 1
+
+    with freeze_time("2023-03-01 12:01:01"):
+        assert await mapper.find_username("alice@dummy.com") == "alice"
+    assert mock_mapper.find_username.await_count == 2
+
+
+async def test_find_username__caches_unknown_emails_briefly(mock_mapper):
+    """
+    Test that unknown emails are cached for the negative ttl, while other errors (like
+    connection failures) are not cached.
+    """
+    mock_mapper.find_username.side_effect = LDAPUserNotFoundError("Found 0")
+    mapper = CachedMapper(mock_mapper, UsernameCache(ttl=60, negative_ttl=10, max_size=10))
+
+    with freeze_time("2023-03-01 12:00:00"):
+        with pytest.raises(LDAPUserNotFoundError):
+            await mapper.find_username("ghost@dummy.com")
+        with pytest.raises(UserNotFoundError, match="recently not found"):
+            await mapper.find_username("ghost@dummy.com")
+    assert mock_mapper.find_username.await_count == 1
+
+    mock_mapper.find_username.side_effect = LDAPError("LDAP search failed")
+    with freeze_time("2023-03-01 12:00:11"):
+        for _ in range(2):
+            with pytest.raises(LDAPError, match="LDAP search failed"):
+                await mapper.find_username("ghost@dummy.com")
+    assert mock_mapper.find_username.await_count == 3
+
+
+async def test_find_username__shares_concurrent_lookups_of_the_same_email(mock_mapper):
+    """
+    Test that concurrent lookups of an email result in a single lookup.
+    """
+
+    async def _slow_lookup(email):
+        await asyncio.sleep(0.01)
+        return email.split("@")[0]
+
+    mock_mapper.find_username.side_effect = _slow_lookup
+    mapper = CachedMapper(mock_mapper, UsernameCache(ttl=60, negative_ttl=10, max_size=10))
+
+    usernames = await asyncio.gather(
+        *(mapper.find_username("alice@dummy.com") for _ in range(5)),
+        mapper.find_username("bob@dummy.com"),
+    )
+
+    assert usernames == ["alice"] * 5 + ["bob"]
+    assert mock_mapper.find_username.await_count == 2
+
+
+async def test_find_usernames__only_looks_up_uncached_emails(mock_mapper):
+    """
+    Test that bulk lookups are served from the cache and only look up the missing emails,
+    caching what was found.
+    """
+    mock_mapper.find_usernames.side_effect = lambda emails: {
+        email: email.split("@")[0] for email in emails if not email.startswith("ghost")
+    }
+    mapper = CachedMapper(mock_mapper, UsernameCache(ttl=60, negative_ttl=10, max_size=10))
+    mapper.cache.set("alice@dummy.com", "alice")
+    mapper.cache.set("unknown@dummy.com", None)
+
+    usernames = await mapper.find_usernames(
+        ["alice@dummy.com", "bob@dummy.com", "unknown@dummy.com", "ghost@dummy.com"]
+    )
+
+    assert usernames == {"alice@dummy.com": "alice", "bob@dummy.com": "bob"}
+    assert sorted(mock_mapper.find_usernames.await_args.args[0]) == [
+        "bob@dummy.com",
+        "ghost@dummy.com",
+    ]
+    assert mapper.cache.get("bob@dummy.com").username == "bob"
+    assert mapper.cache.get("ghost@dummy.com") is None
+
+
+def test_username_cache__evicts_the_least_recently_used_entries():
+    """
+    Test that the cache keeps at most ``max_size`` entries, evicting the least recently
+    used ones.
+    """
+    cache = UsernameCache(ttl=60, negative_ttl=10, max_size=2)
+    cache.set("alice@dummy.com", "alice")
+    cache.set("bob@dummy.com", "bob")
+    assert cache.get("alice@dummy.com").username == "alice"
+
+    cache.set("carol@dummy.com", "carol")
+
+    assert cache.get("bob@dummy.com") is None
+    assert cache.get("alice@dummy.com").username == "alice"
+    assert cache.get("carol@dummy.com").username == "carol"
+
+
+def test_username_cache__persists_unexpired_entries(tmp_path):
+    """
+    Test that the cache is saved to its file and that only unexpired entries are loaded.
+    """
+    cache_path = tmp_path / "slurm-user" / "usernames.json"
+
+    with freeze_time("2023-03-01 12:00:00"):
+        cache = UsernameCache(ttl=60, negative_ttl=10, max_size=10, path=cache_path)
+        cache.set("alice@dummy.com", "alice")
+        cache.set("ghost@dummy.com", None)
+        assert not cache_path.exists()
+        cache.save_if_changed()
+
+    with freeze_time("2023-03-01 12:00:30"):
+        reloaded_cache = UsernameCache(ttl=60, negative_ttl=10, max_size=10, path=cache_path)
+        assert reloaded_cache.get("alice@dummy.com").username == "alice"
+        assert reloaded_cache.get("ghost@dummy.com") is None
+
+
+async def test_find_usernames__saves_the_cache_once_per_batch(mock_mapper, mocker, tmp_path):
+    """
+    Test that a bulk lookup only rewrites the cache file once, and only if it found
+    something new. Also check that single lookups are saved too.
+    """
+    mock_mapper.find_usernames.side_effect = lambda emails: {
+        email: email.split("@")[0] for email in emails
+    }
+    cache = UsernameCache(ttl=60, negative_ttl=10, max_size=10, path=tmp_path / "usernames.json")
+    mapper = CachedMapper(mock_mapper, cache)
+    save = mocker.spy(cache, "save")
+
+    emails = ["alice@dummy.com", "bob@dummy.com", "carol@dummy.com"]
+    await mapper.find_usernames(emails)
+    await mapper.find_usernames(emails)
+    assert save.call_count == 1
+
+    await mapper.find_username("dave@dummy.com")
+    assert save.call_count == 2
+    reloaded_cache = UsernameCache(ttl=60, negative_ttl=10, max_size=10, path=cache.path)
+    assert reloaded_cache.get("bob@dummy.com").username == "bob"
+
+
+def test_username_cache__ignores_a_corrupted_file(tmp_path):
+    """
+    Test that the cache starts empty if its file cannot be loaded.
+    """
+    cache_path = tmp_path / "usernames.json"
+    cache_path.write_text("not json")
+
+    cache = UsernameCache(ttl=60, negative_ttl=10, max_size=10, path=cache_path)
+
+    assert cache.get("alice@dummy.com") is None
@@ -0,0 +1,161 @@
+"""
+Define tests for the file mapper.
+"""
+
+import json
+import os
+
+import pytest
+
+from cluster_agent.identity.slurm_user.exceptions import (
+    FileMapperError,
+    FileUserNotFoundError,
+    LDAPError,
+)
+from cluster_agent.identity.slurm_user.mappers import file
+from cluster_agent.identity.slurm_user.mappers.mapper_base import SlurmUserMapper
+from cluster_agent.settings import SETTINGS
+
+
+def _touch(path, mtime_ns):
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+@pytest.mark.parametrize(
+    "file_name,content",
+    [
+        (
+            "users.csv",
+            "email,username\n# service accounts\nCI@dummy.com, ci-bot\n\nops@dummy.com,ops\n",
+        ),
+        ("users.json", json.dumps({"ci@dummy.com": "ci-bot", "OPS@dummy.com": "ops"})),
+    ],
+)
+async def test_find_username__finds_users_in_csv_and_json_files(
+    file_name, content, tmp_path, tweak_settings
+):
+    """
+    Test that the users are found in CSV and JSON files, regardless of the email case.
+    """
+    user_map_path = tmp_path / file_name
+    user_map_path.write_text(content)
+    mapper = file.FileMapper()
+
+    with tweak_settings(USER_MAPPER_FILE=user_map_path):
+        await mapper.configure(SETTINGS)
+
+    assert await mapper.find_username("ci@dummy.com") == "ci-bot"
+    assert await mapper.find_username("Ops@Dummy.com") == "ops"
+    with pytest.raises(FileUserNotFoundError, match="not found in the user map"):
+        await mapper.find_username("ghost@dummy.com")
+
+
+@pytest.mark.parametrize(
+    "file_name,content",
+    [
+        ("users.csv", "ci@dummy.com\n"),
+        ("users.csv", "ci@dummy.com,\n"),
+        ("users.json", "[]"),
+        ("users.json", "not json"),
+    ],
+)
+async def test_configure__fails_on_invalid_files(file_name, content, tmp_path, tweak_settings):
+    """
+    Test that ``configure()`` fails if the file is missing, not set or invalid.
+    """
+    user_map_path = tmp_path / file_name
+    mapper = file.FileMapper()
+
+    with tweak_settings(USER_MAPPER_FILE=None):
+        with pytest.raises(FileMapperError, match="USER_MAPPER_FILE is not set"):
+            await mapper.configure(SETTINGS)
+
+    with tweak_settings(USER_MAPPER_FILE=user_map_path):
+        with pytest.raises(FileMapperError, match="Couldn't load the user map"):
+            await mapper.configure(SETTINGS)
+
+        user_map_path.write_text(content)
+        with pytest.raises(FileMapperError, match="Couldn't load the user map"):
+            await mapper.configure(SETTINGS)
+
+
+async def test_find_username__reloads_the_file_when_it_changes(tmp_path, tweak_settings):
+    """
+    Test that the file is loaded again when its modification time changes, and that the
+    previous map is kept if the new file cannot be loaded.
+    """
+    user_map_path = tmp_path / "users.csv"
+    user_map_path.write_text("ci@dummy.com,ci-bot\n")
+    _touch(user_map_path, 1_000_000_000)
+    mapper = file.FileMapper()
+
+    with tweak_settings(USER_MAPPER_FILE=user_map_path):
+        await mapper.configure(SETTINGS)
+
+    user_map_path.write_text("ci@dummy.com,ci-bot-2\n")
+    _touch(user_map_path, 1_000_000_000)
+    assert await mapper.find_username("ci@dummy.com") == "ci-bot"
+
+    _touch(user_map_path, 2_000_000_000)
+    assert await mapper.find_username("ci@dummy.com") == "ci-bot-2"
+
+    user_map_path.write_text("broken")
+    _touch(user_map_path, 3_000_000_000)
+    assert await mapper.find_username("ci@dummy.com") == "ci-bot-2"
+
+
+async def test_find_usernames__falls_back_for_emails_not_in_the_file(
+    tmp_path, tweak_settings, mocker
+):
+    """
+    Test that the emails not in the file are looked up with the fallback mapper.
+    """
+    user_map_path = tmp_path / "users.csv"
+    user_map_path.write_text("ci@dummy.com,ci-bot\n")
+    fallback = mocker.AsyncMock(SlurmUserMapper)
+    fallback.find_username.return_value = "alice"
+    fallback.find_usernames.return_value = {"alice@dummy.com": "alice"}
+    fallback.needs_rebuild.return_value = False
+    mapper = file.FileMapper(fallback=fallback)
+
+    with tweak_settings(USER_MAPPER_FILE=user_map_path):
+        await mapper.configure(SETTINGS)
+
+    fallback.configure.assert_awaited_once_with(SETTINGS)
+    assert await mapper.find_username("ci@dummy.com") == "ci-bot"
+    fallback.find_username.assert_not_awaited()
+    assert await mapper.find_username("alice@dummy.com") == "alice"
+
+    usernames = await mapper.find_usernames(["ci@dummy.com", "alice@dummy.com", "ci@dummy.com"])
+    assert usernames == {"ci@dummy.com": "ci-bot", "alice@dummy.com": "alice"}
+    fallback.find_usernames.assert_awaited_once_with(["alice@dummy.com"])
+
+    assert not mapper.needs_rebuild()
+    await mapper.close()
+    fallback.close.assert_awaited_once_with()
+
+
+async def test_configure__keeps_serving_the_file_if_the_fallback_fails(
+    tmp_path, tweak_settings, mocker
+):
+    """
+    Test that the users in the file are still found if the fallback mapper cannot be
+    configured, and that the mapper asks to be rebuilt.
+    """
+    user_map_path = tmp_path / "users.csv"
+    user_map_path.write_text("ci@dummy.com,ci-bot\n")
+    fallback = mocker.AsyncMock(SlurmUserMapper)
+    fallback.configure.side_effect = LDAPError("Couldn't connect to LDAP")
+    mapper = file.FileMapper(fallback=fallback)
+
+    with tweak_settings(USER_MAPPER_FILE=user_map_path):
+        await mapper.configure(SETTINGS)
+
+    assert mapper.needs_rebuild()
+    assert await mapper.find_username("ci@dummy.com") == "ci-bot"
+    with pytest.raises(FileMapperError, match="fallback is unavailable"):
+        await mapper.find_username("alice@dummy.com")
+    assert await mapper.find_usernames(["ci@dummy.com", "alice@dummy.com"]) == {
+        "ci@dummy.com": "ci-bot"
+    }
+    fallback.find_usernames.assert_not_awaited()
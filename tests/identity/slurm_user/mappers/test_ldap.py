@@ -2,11 +2,18 @@
 Define tests for the ldap mapper.
 """
 
-import json
+import asyncio
+import threading
 import time
+from types import SimpleNamespace
 
 import pytest
 from ldap3 import RESTARTABLE
+from ldap3.core.exceptions import (
+    LDAPInvalidFilterError,
+    LDAPMaximumRetriesError,
+    LDAPSocketOpenError,
+)
 
 from cluster_agent.identity.slurm_user.exceptions import LDAPError
 from cluster_agent.identity.slurm_user.mappers import ldap
@@ -141,11 +148,11 @@ async def test_find_username__success(mocker, tweak_settings):
     Test that the ``find_username()`` gets username from ldap server given email.
 
     Mock the connection object to return a list of entries with one and only one
-    json blob including a test username. Assert that the returned username is a lower-
+    entry including a test username. Assert that the returned username is a lower-
     case version of the test username.
     """
     mock_entry = mocker.MagicMock()
-    mock_entry.entry_to_json = lambda: json.dumps(dict(attributes=dict(cn=["XXX00X"])))
+    mock_entry.cn.values = ["XXX00X"]
     mock_connection_obj = mocker.MagicMock()
     mock_connection_obj.entries = [mock_entry]
 
@@ -214,10 +221,9 @@ async def test_find_username__fails_if_entries_cannot_be_extracted(
     Test that the ``find_username()`` fails if entries are invalid.
 
     Mock the connection object to return a list of entries with one and only one
-    json blob that is malformed. Assert that an LDAPError is raised.
+    entry that is missing the CN attribute. Assert that an LDAPError is raised.
     """
-    mock_entry = mocker.MagicMock()
-    mock_entry.entry_to_json = lambda: "BAD DATA"
+    mock_entry = mocker.MagicMock(spec=[])
     mock_connection_obj = mocker.MagicMock()
     mock_connection_obj.entries = [mock_entry]
 
@@ -248,7 +254,7 @@ async def test_find_username__fails_if_user_has_more_than_one_CN(
     Test that the ``find_username()`` fails if a user has more than one username.
 
     Mock the connection object to return a list of entries with one and only one
-    json blob first including no usernames and then multiple test username. Assert that
+    entry first including no usernames and then multiple test username. Assert that
     in both cases a LDAPError is raised.
     """
     mock_entry = mocker.MagicMock()
@@ -271,10 +277,454 @@ async def test_find_username__fails_if_user_has_more_than_one_CN(
         LDAP_PASSWORD="dummy-password",
     ):
         await mapper.configure(SETTINGS)
-        mock_entry.entry_to_json = lambda: json.dumps(dict(attributes=dict(cn=[])))
+        mock_entry.cn.values = []
         with pytest.raises(LDAPError, match="User did not have exactly one CN"):
             await mapper.find_username("dummy_user@dummy.domain.com")
 
-        mock_entry.entry_to_json = lambda: json.dumps(dict(attributes=dict(cn=[1, 2])))
+        mock_entry.cn.values = ["user1", "user2"]
         with pytest.raises(LDAPError, match="User did not have exactly one CN"):
             await mapper.find_username("dummy_user@dummy.domain.com")
+
+
+@pytest.mark.parametrize(
+    "search_error,expect_connection_lost",
+    [
+        (LDAPSocketOpenError("unable to open socket"), True),
+        (LDAPMaximumRetriesError("max retries reached"), True),
+        (LDAPInvalidFilterError("invalid filter"), False),
+    ],
+)
+async def test_find_username__flags_lost_connections(
+    mocker, tweak_settings, search_error, expect_connection_lost
+):
+    """
+    Test that a search failing because of the connection flags the mapper for rebuild,
+    while other search errors don't.
+    """
+    mock_connection_obj = mocker.MagicMock()
+    mock_connection_obj.search.side_effect = search_error
+
+    mocker.patch.object(ldap, "Server")
+    mocker.patch.object(ldap, "Connection", return_value=mock_connection_obj)
+
+    mapper = ldap.LDAPMapper()
+
+    with tweak_settings(
+        LDAP_HOST="dummy.domain.com",
+        LDAP_DOMAIN="dummy.domain.com",
+        LDAP_USERNAME="dummyUser",
+        LDAP_PASSWORD="dummy-password",
+    ):
+        await mapper.configure(SETTINGS)
+        assert not mapper.needs_rebuild()
+        with pytest.raises(LDAPError, match="LDAP search failed"):
+            await mapper.find_username("dummy_user@dummy.domain.com")
+
+    assert mapper.needs_rebuild() is expect_connection_lost
+
+
+async def test_find_username__escapes_the_email_in_the_filter(mocker, tweak_settings):
+    """
+    Test that ``find_username()`` escapes the email and only requests the CN attribute.
+    """
+    mock_entry = mocker.MagicMock()
+    mock_entry.cn.values = ["xxx00x"]
+    mock_connection_obj = mocker.MagicMock()
+    mock_connection_obj.entries = [mock_entry]
+
+    mocker.patch.object(ldap, "Server")
+    mocker.patch.object(ldap, "Connection", return_value=mock_connection_obj)
+
+    mapper = ldap.LDAPMapper()
+
+    with tweak_settings(
+        LDAP_HOST="dummy.domain.com",
+        LDAP_DOMAIN="dummy.domain.com",
+        LDAP_USERNAME="dummyUser",
+        LDAP_PASSWORD="dummy-password",
+    ):
+        await mapper.configure(SETTINGS)
+        await mapper.find_username("dummy*user@dummy.domain.com")
+
+    mock_connection_obj.search.assert_called_once_with(
+        "DC=dummy,DC=domain,DC=com",
+        "(mail=dummy\\2auser@dummy.domain.com)",
+        attributes=["cn"],
+    )
+
+
+async def test_find_usernames__searches_in_chunks(mocker, tweak_settings):
+    """
+    Test that ``find_usernames()`` looks up the emails with chunked OR searches and
+    leaves out the emails that are unknown or ambiguous.
+    """
+
+    def _entry(mail, cns):
+        entry = mocker.MagicMock()
+        entry.mail.values = [mail]
+        entry.cn.values = cns
+        return entry
+
+    entries_by_filter = {
+        "(|(mail=alice@dummy.com)(mail=bob@dummy.com))": [
+            _entry("Alice@dummy.com", ["ALICE"]),
+            _entry("bob@dummy.com", ["bob1", "bob2"]),
+        ],
+        "(|(mail=carol@dummy.com)(mail=dave@dummy.com))": [
+            _entry("carol@dummy.com", ["carol"]),
+        ],
+        "(|(mail=eve@dummy.com))": [
+            _entry("eve@dummy.com", ["eve1"]),
+            _entry("eve@dummy.com", ["eve2"]),
+        ],
+    }
+    mock_connection_obj = mocker.MagicMock()
+
+    def _search(search_base, search_filter, attributes):
+        mock_connection_obj.entries = entries_by_filter[search_filter]
+        return True
+
+    mock_connection_obj.search.side_effect = _search
+
+    mocker.patch.object(ldap, "Server")
+    mocker.patch.object(ldap, "Connection", return_value=mock_connection_obj)
+
+    mapper = ldap.LDAPMapper()
+
+    with tweak_settings(
+        LDAP_HOST="dummy.domain.com",
+        LDAP_DOMAIN="dummy.domain.com",
+        LDAP_USERNAME="dummyUser",
+        LDAP_PASSWORD="dummy-password",
+        LDAP_SEARCH_CHUNK_SIZE=2,
+    ):
+        await mapper.configure(SETTINGS)
+        usernames = await mapper.find_usernames(
+            [
+                "dave@dummy.com",
+                "alice@dummy.com",
+                "eve@dummy.com",
+                "carol@dummy.com",
+                "bob@dummy.com",
+                "alice@dummy.com",
+            ]
+        )
+
+    assert usernames == {"alice@dummy.com": "alice", "carol@dummy.com": "carol"}
+    assert mock_connection_obj.search.call_count == 3
+    assert all(
+        c.kwargs["attributes"] == ["cn", "mail"]
+        for c in mock_connection_obj.search.call_args_list
+    )
+
+
+async def test_find_username__runs_lookups_concurrently_in_a_pool(mocker, tweak_settings):
+    """
+    Test that concurrent lookups don't block the event loop and use separate connections,
+    opened as needed up to ``LDAP_POOL_SIZE``.
+    """
+
+    in_flight = 0
+    max_in_flight = 0
+    lock = threading.Lock()
+
+    def _make_connection(*args, **kwargs):
+        connection = mocker.MagicMock()
+
+        def _search(search_base, search_filter, attributes):
+            nonlocal in_flight, max_in_flight
+            with lock:
+                in_flight += 1
+                max_in_flight = max(max_in_flight, in_flight)
+            time.sleep(0.05)
+            with lock:
+                in_flight -= 1
+            entry = mocker.MagicMock()
+            entry.cn.values = [search_filter[6:-1].split("@")[0]]
+            connection.entries = [entry]
+
+        connection.search.side_effect = _search
+        return connection
+
+    mocker.patch.object(ldap, "Server")
+    mock_connection = mocker.patch.object(ldap, "Connection", side_effect=_make_connection)
+
+    mapper = ldap.LDAPMapper()
+
+    with tweak_settings(
+        LDAP_HOST="dummy.domain.com",
+        LDAP_DOMAIN="dummy.domain.com",
+        LDAP_USERNAME="dummyUser",
+        LDAP_PASSWORD="dummy-password",
+        LDAP_POOL_SIZE=2,
+    ):
+        await mapper.configure(SETTINGS)
+        assert mock_connection.call_count == 1
+
+        ticks = 0
+
+        async def _tick():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        ticker = asyncio.ensure_future(_tick())
+        usernames = await asyncio.gather(
+            *(mapper.find_username(f"user{i}@dummy.com") for i in range(4))
+        )
+        ticker.cancel()
+
+    assert usernames == ["user0", "user1", "user2", "user3"]
+    assert mock_connection.call_count == 2
+    assert max_in_flight == 2
+    assert ticks > 1
+
+
+async def test_acquire__opens_a_connection_when_a_busy_one_is_discarded(
+    mocker, tweak_settings
+):
+    """
+    Test that a caller waiting for a connection of a full pool opens a new one as soon as
+    a busy connection is discarded, instead of waiting until it times out.
+    """
+    mocker.patch.object(ldap, "Server")
+    mock_connection = mocker.patch.object(
+        ldap, "Connection", side_effect=lambda *args, **kwargs: mocker.MagicMock()
+    )
+    mapper = ldap.LDAPMapper()
+
+    with tweak_settings(
+        LDAP_HOST="dummy.domain.com",
+        LDAP_DOMAIN="dummy.domain.com",
+        LDAP_USERNAME="dummyUser",
+        LDAP_PASSWORD="dummy-password",
+        LDAP_POOL_SIZE=1,
+    ):
+        await mapper.configure(SETTINGS)
+    try:
+        busy = await mapper._acquire()
+        waiter = asyncio.ensure_future(mapper._acquire())
+        await asyncio.sleep(0)
+        assert not waiter.done()
+
+        mapper._discard(busy)
+        pooled = await asyncio.wait_for(waiter, 5)
+    finally:
+        await mapper.close()
+
+    assert pooled is not busy
+    assert mock_connection.call_count == 2
+
+
+async def test_find_username__times_out_slow_searches(mocker, tweak_settings):
+    """
+    Test that a search taking longer than the timeout fails and flags the mapper for
+    rebuild.
+    """
+    mock_connection_obj = mocker.MagicMock()
+    mock_connection_obj.search.side_effect = lambda *args, **kwargs: time.sleep(0.05)
+
+    mocker.patch.object(ldap, "Server")
+    mocker.patch.object(ldap, "Connection", return_value=mock_connection_obj)
+
+    mapper = ldap.LDAPMapper()
+
+    with tweak_settings(
+        LDAP_HOST="dummy.domain.com",
+        LDAP_DOMAIN="dummy.domain.com",
+        LDAP_USERNAME="dummyUser",
+        LDAP_PASSWORD="dummy-password",
+    ):
+        await mapper.configure(SETTINGS)
+        mocker.patch.object(mapper, "_timeout_seconds", 0.01)
+        with pytest.raises(LDAPError, match="LDAP search failed -- TimeoutError"):
+            await mapper.find_username("dummy_user@dummy.domain.com")
+
+    assert mapper.needs_rebuild()
+
+
+async def test_close__unbinds_the_connection(mocker, tweak_settings):
+    """
+    Test that ``close()`` unbinds the connection and tolerates unbind failures.
+    """
+    mock_connection_obj = mocker.MagicMock()
+    mock_connection_obj.unbind.side_effect = LDAPSocketOpenError("already closed")
+
+    mocker.patch.object(ldap, "Server")
+    mocker.patch.object(ldap, "Connection", return_value=mock_connection_obj)
+
+    mapper = ldap.LDAPMapper()
+
+    with tweak_settings(
+        LDAP_HOST="dummy.domain.com",
+        LDAP_DOMAIN="dummy.domain.com",
+        LDAP_USERNAME="dummyUser",
+        LDAP_PASSWORD="dummy-password",
+    ):
+        await mapper.configure(SETTINGS)
+        await mapper.close()
+
+    mock_connection_obj.unbind.assert_called_once_with()
+    assert mapper._connections == []
+
+
+@pytest.fixture
+def server_pool(mocker):
+    """
+    Mock two LDAP servers: ``fast.dummy.com`` and ``slow.dummy.com``.
+
+    The latency recorded for each server is taken from ``latencies`` instead of being
+    measured, and the health of the servers is checked against the ``now`` timestamp.
+    Searches return an entry with the host of the server as CN. Hosts listed in
+    ``unreachable`` fail to bind and hosts listed in ``broken`` fail to search.
+    """
+    pool = mocker.MagicMock(
+        unreachable=set(),
+        broken=set(),
+        latencies={"fast.dummy.com": 0.01, "slow.dummy.com": 0.05},
+        now=1677672000.0,
+    )
+
+    def _make_connection(host, **kwargs):
+        connection = mocker.MagicMock()
+
+        def _bind():
+            if host in pool.unreachable:
+                raise LDAPSocketOpenError("unable to open socket")
+
+        def _search(search_base, search_filter, attributes):
+            if host in pool.broken:
+                raise LDAPSocketOpenError("unable to open socket")
+            entry = mocker.MagicMock()
+            entry.cn.values = [host]
+            connection.entries = [entry]
+
+        connection.bind.side_effect = _bind
+        connection.search.side_effect = _search
+        return connection
+
+    record_success = ldap.LDAPServer.record_success
+
+    def _record_success(server, elapsed=None):
+        record_success(server, None if elapsed is None else pool.latencies[server.host])
+
+    mocker.patch.object(ldap.LDAPServer, "record_success", _record_success)
+    mocker.patch.object(
+        ldap, "time", SimpleNamespace(time=lambda: pool.now, monotonic=time.monotonic)
+    )
+    # Use the host as the server object, so the connections know their server
+    mocker.patch.object(ldap, "Server", side_effect=lambda host, **kwargs: host)
+    pool.connection = mocker.patch.object(ldap, "Connection", side_effect=_make_connection)
+    return pool
+
+
+@pytest.fixture
+def pool_settings(tweak_settings):
+    with tweak_settings(
+        LDAP_HOST="slow.dummy.com, fast.dummy.com",
+        LDAP_DOMAIN="dummy.domain.com",
+        LDAP_USERNAME="dummyUser",
+        LDAP_PASSWORD="dummy-password",
+        LDAP_SERVER_RETRY_SECONDS=60,
+        LDAP_HEALTH_CHECK_SECONDS=60,
+    ):
+        yield
+
+
+async def test_find_username__uses_the_fastest_server(server_pool, pool_settings):
+    """
+    Test that every server is probed on ``configure()`` and that the searches go to the
+    fastest one.
+    """
+    mapper = ldap.LDAPMapper()
+    await mapper.configure(SETTINGS)
+
+    try:
+        assert server_pool.connection.call_count == 2
+        assert await mapper.find_username("dummy_user@dummy.domain.com") == "fast.dummy.com"
+    finally:
+        await mapper.close()
+
+
+async def test_find_username__fails_over_to_another_server(server_pool, pool_settings):
+    """
+    Test that a search failing because of the connection is retried on another server,
+    and that the failed server is used again once it recovers.
+    """
+    mapper = ldap.LDAPMapper()
+    await mapper.configure(SETTINGS)
+
+    try:
+        server_pool.broken.add("fast.dummy.com")
+        assert await mapper.find_username("dummy_user@dummy.domain.com") == "slow.dummy.com"
+        assert await mapper.find_username("dummy_user@dummy.domain.com") == "slow.dummy.com"
+        assert not mapper.needs_rebuild()
+
+        server_pool.broken.clear()
+        server_pool.now += 59
+        assert await mapper.find_username("dummy_user@dummy.domain.com") == "slow.dummy.com"
+        server_pool.now += 1
+        assert await mapper.find_username("dummy_user@dummy.domain.com") == "fast.dummy.com"
+    finally:
+        await mapper.close()
+
+
+async def test_find_username__flags_the_mapper_when_all_servers_fail(
+    server_pool, pool_settings
+):
+    """
+    Test that the mapper is flagged for rebuild once every server failed.
+    """
+    mapper = ldap.LDAPMapper()
+    await mapper.configure(SETTINGS)
+
+    try:
+        server_pool.broken.update({"fast.dummy.com", "slow.dummy.com"})
+        with pytest.raises(LDAPError, match="LDAP search failed"):
+            await mapper.find_username("dummy_user@dummy.domain.com")
+        assert mapper.needs_rebuild()
+    finally:
+        await mapper.close()
+
+
+async def test_configure__skips_unreachable_servers(server_pool, pool_settings):
+    """
+    Test that ``configure()`` succeeds if at least one server is reachable, and fails
+    with the error of the first server otherwise.
+    """
+    server_pool.unreachable.add("fast.dummy.com")
+    mapper = ldap.LDAPMapper()
+    await mapper.configure(SETTINGS)
+
+    try:
+        assert await mapper.find_username("dummy_user@dummy.domain.com") == "slow.dummy.com"
+    finally:
+        await mapper.close()
+
+    server_pool.unreachable.add("slow.dummy.com")
+    mapper = ldap.LDAPMapper()
+    with pytest.raises(LDAPError, match="Couldn't connect to LDAP -- LDAPSocketOpenError"):
+        await mapper.configure(SETTINGS)
+
+
+async def test_check_health__uses_the_servers_that_recovered(server_pool, pool_settings):
+    """
+    Test that a health checker is started for several servers and that probing them
+    brings a server that recovered back before its retry time.
+    """
+    server_pool.unreachable.add("fast.dummy.com")
+    mapper = ldap.LDAPMapper()
+    await mapper.configure(SETTINGS)
+
+    try:
+        assert mapper._health_checker is not None
+        assert await mapper.find_username("dummy_user@dummy.domain.com") == "slow.dummy.com"
+
+        server_pool.unreachable.clear()
+        assert await mapper.find_username("dummy_user@dummy.domain.com") == "slow.dummy.com"
+
+        await mapper._check_health()
+        assert await mapper.find_username("dummy_user@dummy.domain.com") == "fast.dummy.com"
+    finally:
+        await mapper.close()
@@ -0,0 +1,287 @@
+"""
+Define tests for the ldap index mapper.
+"""
+
+import asyncio
+import datetime
+from types import SimpleNamespace
+
+import pytest
+from ldap3.core.exceptions import LDAPSocketOpenError
+
+from cluster_agent.identity.slurm_user.exceptions import LDAPError, LDAPUserNotFoundError
+from cluster_agent.identity.slurm_user.mappers import ldap, ldap_index
+from cluster_agent.settings import SETTINGS
+
+
+def _entry(dn, mails, cns, modified):
+    return dict(
+        type="searchResEntry",
+        dn=dn,
+        attributes=dict(mail=mails, cn=cns, modifyTimestamp=modified),
+    )
+
+
+@pytest.fixture
+def mock_connection_obj(mocker):
+    connection = mocker.MagicMock()
+    connection.extend.standard.paged_search.return_value = [
+        _entry("CN=alice", ["Alice@dummy.com"], ["ALICE"], "20230301120000Z"),
+        _entry("CN=bob", ["bob@dummy.com"], ["bob1", "bob2"], "20230301120500Z"),
+        _entry("CN=carol1", ["carol@dummy.com"], ["carol1"], "20230301110000Z"),
+        _entry("CN=carol2", ["carol@dummy.com"], ["carol2"], "20230301110000Z"),
+        dict(type="searchResRef", uri=["ldap://elsewhere"]),
+    ]
+    mocker.patch.object(ldap, "Server")
+    mocker.patch.object(ldap, "Connection", return_value=connection)
+    return connection
+
+
+@pytest.fixture
+def index_settings(tweak_settings, tmp_path):
+    with tweak_settings(
+        LDAP_HOST="dummy.domain.com",
+        LDAP_DOMAIN="dummy.domain.com",
+        LDAP_USERNAME="dummyUser",
+        LDAP_PASSWORD="dummy-password",
+        LDAP_INDEX_ENABLED=True,
+        LDAP_INDEX_PAGE_SIZE=100,
+        CACHE_DIR=tmp_path,
+    ):
+        yield
+
+
+async def test_configure__builds_the_index_with_a_paged_search(
+    mock_connection_obj, index_settings
+):
+    """
+    Test that ``configure()`` fetches all the entries with a paged search and that the
+    lookups are served from the index.
+    """
+    mapper = ldap_index.LDAPIndexMapper()
+    await mapper.configure(SETTINGS)
+
+    try:
+        mock_connection_obj.extend.standard.paged_search.assert_called_once_with(
+            "DC=dummy,DC=domain,DC=com",
+            "(mail=*)",
+            attributes=["mail", "cn", "modifyTimestamp"],
+            paged_size=100,
+            generator=False,
+        )
+        assert await mapper.find_username("alice@dummy.com") == "alice"
+        with pytest.raises(LDAPUserNotFoundError, match="Found 0"):
+            await mapper.find_username("ghost@dummy.com")
+        with pytest.raises(LDAPError, match="Found 2"):
+            await mapper.find_username("carol@dummy.com")
+        with pytest.raises(LDAPError, match="User did not have exactly one CN"):
+            await mapper.find_username("bob@dummy.com")
+        assert await mapper.find_usernames(
+            ["alice@dummy.com", "bob@dummy.com", "carol@dummy.com", "ghost@dummy.com"]
+        ) == {"alice@dummy.com": "alice"}
+        mock_connection_obj.search.assert_not_called()
+    finally:
+        await mapper.close()
+
+
+async def test_refresh__fetches_only_the_modified_entries(mock_connection_obj, index_settings):
+    """
+    Test that later refreshes only fetch the entries modified since the latest one seen,
+    and that a full sync drops the entries removed from the directory.
+    """
+    mapper = ldap_index.LDAPIndexMapper()
+    await mapper.configure(SETTINGS)
+
+    try:
+        paged_search = mock_connection_obj.extend.standard.paged_search
+        paged_search.return_value = [
+            _entry(
+                "CN=alice",
+                ["alice.new@dummy.com"],
+                ["alice"],
+                datetime.datetime(2023, 3, 1, 13, 0, tzinfo=datetime.timezone.utc),
+            ),
+            _entry("CN=dave", ["dave@dummy.com"], ["dave"], "20230301120600Z"),
+        ]
+        await mapper.refresh()
+
+        assert paged_search.call_args.args[1] == (
+            "(&(mail=*)(modifyTimestamp>=20230301120500Z))"
+        )
+        assert mapper.index.last_modified == "20230301130000Z"
+        assert await mapper.find_username("alice.new@dummy.com") == "alice"
+        assert await mapper.find_username("dave@dummy.com") == "dave"
+        with pytest.raises(LDAPUserNotFoundError):
+            await mapper.find_username("alice@dummy.com")
+        with pytest.raises(LDAPError, match="Found 2"):
+            await mapper.find_username("carol@dummy.com")
+
+        mapper.index.last_full_sync = 0
+        paged_search.return_value = [
+            _entry("CN=dave", ["dave@dummy.com"], ["dave"], "20230301120600Z"),
+        ]
+        await mapper.refresh()
+
+        assert paged_search.call_args.args[1] == "(mail=*)"
+        assert await mapper.find_usernames(["alice.new@dummy.com", "dave@dummy.com"]) == {
+            "dave@dummy.com": "dave",
+        }
+    finally:
+        await mapper.close()
+
+
+async def test_configure__uses_a_fresh_index_from_disk(mock_connection_obj, index_settings):
+    """
+    Test that a new mapper loads the persisted index and doesn't refresh it until due.
+    """
+    first_mapper = ldap_index.LDAPIndexMapper()
+    await first_mapper.configure(SETTINGS)
+    await first_mapper.close()
+
+    mock_connection_obj.extend.standard.paged_search.reset_mock()
+    mapper = ldap_index.LDAPIndexMapper()
+    await mapper.configure(SETTINGS)
+
+    try:
+        mock_connection_obj.extend.standard.paged_search.assert_not_called()
+        assert await mapper.find_username("alice@dummy.com") == "alice"
+    finally:
+        await mapper.close()
+
+
+class StopRefresher(Exception):
+    pass
+
+
+@pytest.fixture
+def fake_clock(mocker):
+    """
+    Replace the clock of the index mapper with one that only moves when the refresher
+    sleeps, recording the delays. The refresher is stopped after ``max_sleeps`` sleeps.
+    """
+    clock = SimpleNamespace(now=1677672000.0, sleeps=[], max_sleeps=0)
+
+    async def _sleep(delay):
+        if len(clock.sleeps) == clock.max_sleeps:
+            raise StopRefresher()
+        clock.sleeps.append(delay)
+        clock.now += delay
+
+    mocker.patch.object(ldap_index, "time", SimpleNamespace(time=lambda: clock.now))
+    mocker.patch.object(ldap_index.asyncio, "sleep", _sleep)
+    return clock
+
+
+async def _configure_without_refresher(mapper, settings):
+    """
+    Configure the mapper and stop its background refresher before it starts, so the test
+    can step through ``_refresh_periodically()`` itself.
+    """
+    await mapper.configure(settings)
+    mapper._refresher.cancel()
+
+
+async def test_configure__starts_a_refresher_that_stops_when_closed(
+    mock_connection_obj, index_settings
+):
+    """
+    Test that a background refresher is started by ``configure()`` and cancelled by
+    ``close()``.
+    """
+    mapper = ldap_index.LDAPIndexMapper()
+    await mapper.configure(SETTINGS)
+    refresher = mapper._refresher
+
+    await mapper.close()
+    await asyncio.gather(refresher, return_exceptions=True)
+
+    assert refresher.cancelled()
+    assert mapper._refresher is None
+
+
+async def test_refresh_periodically__refreshes_the_index_every_interval(
+    mock_connection_obj, index_settings, tweak_settings, fake_clock
+):
+    """
+    Test that the refresher refreshes the index once every ``LDAP_INDEX_REFRESH_SECONDS``.
+    """
+    paged_search = mock_connection_obj.extend.standard.paged_search
+    mapper = ldap_index.LDAPIndexMapper()
+
+    with tweak_settings(LDAP_INDEX_REFRESH_SECONDS=60):
+        await _configure_without_refresher(mapper, SETTINGS)
+    assert paged_search.call_count == 1
+
+    fake_clock.max_sleeps = 3
+    try:
+        with pytest.raises(StopRefresher):
+            await mapper._refresh_periodically()
+    finally:
+        await mapper.close()
+
+    assert fake_clock.sleeps == [60, 60, 60]
+    assert paged_search.call_count == 4
+    assert mapper.index.last_refresh == fake_clock.now
+
+
+async def test_refresh_periodically__waits_an_interval_after_a_failed_refresh(
+    mock_connection_obj, index_settings, tweak_settings, fake_clock
+):
+    """
+    Test that a background refresh that fails without losing the connection is retried
+    after a full ``LDAP_INDEX_REFRESH_SECONDS`` instead of right away.
+    """
+    paged_search = mock_connection_obj.extend.standard.paged_search
+    mapper = ldap_index.LDAPIndexMapper()
+
+    with tweak_settings(LDAP_INDEX_REFRESH_SECONDS=60):
+        await _configure_without_refresher(mapper, SETTINGS)
+    last_refresh = mapper.index.last_refresh
+
+    paged_search.side_effect = RuntimeError("Boom!")
+    fake_clock.max_sleeps = 3
+    try:
+        with pytest.raises(StopRefresher):
+            await mapper._refresh_periodically()
+    finally:
+        await mapper.close()
+
+    assert fake_clock.sleeps == [60, 60, 60]
+    assert paged_search.call_count == 4
+    assert mapper.index.last_refresh == last_refresh
+    assert not mapper.needs_rebuild()
+
+
+async def test_refresh__flags_lost_connections(mock_connection_obj, index_settings):
+    """
+    Test that a refresh failing because of the connection flags the mapper for rebuild
+    and keeps the index as it was.
+    """
+    mapper = ldap_index.LDAPIndexMapper()
+    await mapper.configure(SETTINGS)
+
+    try:
+        mock_connection_obj.extend.standard.paged_search.side_effect = (
+            LDAPSocketOpenError("unable to open socket")
+        )
+        with pytest.raises(LDAPError, match="Failed to refresh the LDAP index"):
+            await mapper.refresh()
+
+        assert mapper.needs_rebuild()
+        assert await mapper.find_username("alice@dummy.com") == "alice"
+    finally:
+        await mapper.close()
+
+
+def test_directory_index__ignores_a_corrupted_file(tmp_path):
+    """
+    Test that the index starts empty if its file cannot be loaded.
+    """
+    index_path = tmp_path / "ldap-index.json"
+    index_path.write_text("not json")
+
+    index = ldap_index.DirectoryIndex(index_path)
+    index.load()
+
+    assert index.entries == {}
+    assert index.last_modified is None
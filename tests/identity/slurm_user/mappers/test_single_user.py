@@ -39,3 +39,17 @@ async def test_find_username__fails_mapper_is_not_configured():
     mapper = single_user.SingleUserMapper()
     with pytest.raises(SingleUserError, match="No username set"):
         await mapper.find_username("dummy_user@dummy.domain.com")
+
+
+async def test_find_usernames__looks_up_each_email(tweak_settings):
+    """
+    Test that the default ``find_usernames()`` looks up each distinct email, leaving out
+    the ones that fail.
+    """
+    mapper = single_user.SingleUserMapper()
+    assert await mapper.find_usernames(["a@dummy.com", "b@dummy.com"]) == {}
+
+    with tweak_settings(SINGLE_USER_SUBMITTER="dummy-user"):
+        await mapper.configure(SETTINGS)
+        usernames = await mapper.find_usernames(["a@dummy.com", "b@dummy.com", "a@dummy.com"])
+    assert usernames == {"a@dummy.com": "dummy-user", "b@dummy.com": "dummy-user"}
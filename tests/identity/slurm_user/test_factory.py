@@ -1,8 +1,11 @@
 import pytest
 
 from cluster_agent.identity.slurm_user.exceptions import MapperFactoryError
-from cluster_agent.identity.slurm_user.factory import manufacture
+from cluster_agent.identity.slurm_user.factory import close_mapper, get_mapper, manufacture
+from cluster_agent.identity.slurm_user.mappers.cached import CachedMapper
+from cluster_agent.identity.slurm_user.mappers.file import FileMapper
 from cluster_agent.identity.slurm_user.mappers.ldap import LDAPMapper
+from cluster_agent.identity.slurm_user.mappers.single_user import SingleUserMapper
 from cluster_agent.identity.slurm_user.constants import MapperType
 from cluster_agent.settings import SETTINGS
 
@@ -27,3 +30,135 @@ async def test_manufacture__with_invalid_mapper_name(tweak_settings, mocker):
     with tweak_settings(SLURM_USER_MAPPER="FAKE"):
         with pytest.raises(MapperFactoryError, match="Couldn't find a mapper class"):
             await manufacture()
+
+
+async def test_get_mapper__manufactures_only_once(tweak_settings, mocker):
+    mocked_ldap_instance = mocker.AsyncMock(LDAPMapper)
+    mocked_ldap_instance.needs_rebuild.return_value = False
+    mocked_ldap_class = mocker.MagicMock(return_value=mocked_ldap_instance)
+    mocker.patch.dict(
+        "cluster_agent.identity.slurm_user.factory.mapper_map",
+        {MapperType.LDAP: mocked_ldap_class},
+    )
+    with tweak_settings(SLURM_USER_MAPPER=MapperType.LDAP, USER_MAPPER_CACHE_ENABLED=False):
+        first_mapper = await get_mapper()
+        second_mapper = await get_mapper()
+
+    assert first_mapper is mocked_ldap_instance
+    assert second_mapper is mocked_ldap_instance
+    mocked_ldap_class.assert_called_once_with()
+    mocked_ldap_instance.configure.assert_called_once_with(SETTINGS)
+
+
+async def test_get_mapper__rebuilds_the_mapper_if_it_lost_its_connection(tweak_settings, mocker):
+    broken_instance = mocker.AsyncMock(LDAPMapper)
+    broken_instance.needs_rebuild.return_value = True
+    fresh_instance = mocker.AsyncMock(LDAPMapper)
+    fresh_instance.needs_rebuild.return_value = False
+    mocked_ldap_class = mocker.MagicMock(side_effect=[broken_instance, fresh_instance])
+    mocker.patch.dict(
+        "cluster_agent.identity.slurm_user.factory.mapper_map",
+        {MapperType.LDAP: mocked_ldap_class},
+    )
+    with tweak_settings(SLURM_USER_MAPPER=MapperType.LDAP, USER_MAPPER_CACHE_ENABLED=False):
+        assert await get_mapper() is broken_instance
+        assert await get_mapper() is fresh_instance
+        assert await get_mapper() is fresh_instance
+
+    broken_instance.close.assert_awaited_once_with()
+    fresh_instance.close.assert_not_awaited()
+    assert mocked_ldap_class.call_count == 2
+
+
+async def test_get_mapper__wraps_the_mapper_with_a_cache_that_survives_rebuilds(
+    tweak_settings, mocker
+):
+    broken_instance = mocker.AsyncMock(LDAPMapper)
+    broken_instance.needs_rebuild.return_value = True
+    fresh_instance = mocker.AsyncMock(LDAPMapper)
+    fresh_instance.needs_rebuild.return_value = False
+    mocker.patch.dict(
+        "cluster_agent.identity.slurm_user.factory.mapper_map",
+        {MapperType.LDAP: mocker.MagicMock(side_effect=[broken_instance, fresh_instance])},
+    )
+    with tweak_settings(SLURM_USER_MAPPER=MapperType.LDAP, USER_MAPPER_CACHE_ENABLED=True):
+        first_mapper = await get_mapper()
+        second_mapper = await get_mapper()
+
+    assert isinstance(first_mapper, CachedMapper)
+    assert first_mapper.mapper is broken_instance
+    assert isinstance(second_mapper, CachedMapper)
+    assert second_mapper.mapper is fresh_instance
+    assert second_mapper.cache is first_mapper.cache
+
+
+async def test_get_mapper__does_not_cache_the_single_user_mapper(tweak_settings):
+    with tweak_settings(SLURM_USER_MAPPER=MapperType.SINGLE_USER, USER_MAPPER_CACHE_ENABLED=True):
+        mapper = await get_mapper()
+
+    assert isinstance(mapper, SingleUserMapper)
+
+
+async def test_manufacture__uses_the_ldap_index_if_enabled(tweak_settings, mocker):
+    mocked_index_instance = mocker.AsyncMock(LDAPMapper)
+    mocked_index_class = mocker.MagicMock(return_value=mocked_index_instance)
+    mocker.patch(
+        "cluster_agent.identity.slurm_user.factory.LDAPIndexMapper", mocked_index_class
+    )
+    with tweak_settings(SLURM_USER_MAPPER=MapperType.LDAP, LDAP_INDEX_ENABLED=True):
+        mapper = await manufacture()
+
+    assert mapper is mocked_index_instance
+    mocked_index_instance.configure.assert_called_once_with(SETTINGS)
+
+
+async def test_manufacture__chains_the_file_mapper_to_its_fallback(
+    tweak_settings, mocker, tmp_path
+):
+    user_map_path = tmp_path / "users.csv"
+    user_map_path.write_text("ci@dummy.com,ci-bot\n")
+    mocked_ldap_instance = mocker.AsyncMock(LDAPMapper)
+    mocker.patch.dict(
+        "cluster_agent.identity.slurm_user.factory.mapper_map",
+        {MapperType.LDAP: mocker.MagicMock(return_value=mocked_ldap_instance)},
+    )
+    with tweak_settings(
+        SLURM_USER_MAPPER=MapperType.FILE,
+        USER_MAPPER_FILE=user_map_path,
+        USER_MAPPER_FILE_FALLBACK=MapperType.LDAP,
+        USER_MAPPER_CACHE_ENABLED=True,
+    ):
+        mapper = await manufacture()
+
+    assert isinstance(mapper, FileMapper)
+    assert isinstance(mapper.fallback, CachedMapper)
+    assert mapper.fallback.mapper is mocked_ldap_instance
+    mocked_ldap_instance.configure.assert_awaited_once_with(SETTINGS)
+
+
+async def test_manufacture__rejects_a_file_mapper_falling_back_to_itself(tweak_settings):
+    with tweak_settings(
+        SLURM_USER_MAPPER=MapperType.FILE,
+        USER_MAPPER_FILE_FALLBACK=MapperType.FILE,
+    ):
+        with pytest.raises(MapperFactoryError, match="cannot fall back"):
+            await manufacture()
+
+
+async def test_close_mapper__closes_the_running_mapper(tweak_settings, mocker):
+    mocked_ldap_instance = mocker.AsyncMock(LDAPMapper)
+    mocked_ldap_instance.needs_rebuild.return_value = False
+    mocked_ldap_class = mocker.MagicMock(return_value=mocked_ldap_instance)
+    mocker.patch.dict(
+        "cluster_agent.identity.slurm_user.factory.mapper_map",
+        {MapperType.LDAP: mocked_ldap_class},
+    )
+    await close_mapper()
+
+    with tweak_settings(SLURM_USER_MAPPER=MapperType.LDAP, USER_MAPPER_CACHE_ENABLED=False):
+        await get_mapper()
+        await close_mapper()
+        mocked_ldap_instance.close.assert_awaited_once_with()
+
+        await get_mapper()
+    assert mocked_ldap_class.call_count == 2
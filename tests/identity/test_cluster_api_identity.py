@@ -1,12 +1,26 @@
+import asyncio
+import gzip
+import json
 from datetime import datetime, timezone
 
+import httpx
 import jwt
+import pytest
+import respx
 
 from cluster_agent.identity.cluster_api import (
+    AsyncBackendClient,
+    TokenAuth,
     _load_token_from_cache,
     _write_token_to_cache,
     acquire_token,
 )
+from cluster_agent.settings import SETTINGS
+
+
+def _make_token(seconds_to_expire: int, subject: str = "dummy") -> str:
+    exp = int(datetime.now(tz=timezone.utc).timestamp()) + seconds_to_expire
+    return jwt.encode(dict(exp=exp, sub=subject), key="dummy-key", algorithm="HS256")
 
 
 def test__write_token_to_cache__caches_a_token(mock_cluster_api_cache_dir):
@@ -114,7 +128,7 @@ def test__load_token_from_cache__returns_none_if_cached_token_will_expire_soon(
     assert retrieved_token is None
 
 
-def test_acquire_token__gets_a_token_from_the_cache(mock_cluster_api_cache_dir):
+async def test_acquire_token__gets_a_token_from_the_cache(mock_cluster_api_cache_dir):
     """
     Verifies that the token is retrieved from the cache if it is found there.
     """
@@ -127,11 +141,11 @@ def test_acquire_token__gets_a_token_from_the_cache(mock_cluster_api_cache_dir):
         algorithm="HS256",
     )
     token_path.write_text(created_token)
-    retrieved_token = acquire_token()
+    retrieved_token = await acquire_token()
     assert retrieved_token == created_token
 
 
-def test_acquire_token__gets_a_token_from_auth_0_if_one_is_not_in_the_cache(
+async def test_acquire_token__gets_a_token_from_auth_0_if_one_is_not_in_the_cache(
     mock_cluster_api_cache_dir, respx_mock, tweak_settings,
 ):  # noqa
     """
@@ -143,8 +157,162 @@ def test_acquire_token__gets_a_token_from_auth_0_if_one_is_not_in_the_cache(
     assert not token_path.exists()
 
     with tweak_settings(OIDC_CLIENT_ID="dummy", OIDC_CLIENT_SECRET="dummy"):
-        retrieved_token = acquire_token()
+        retrieved_token = await acquire_token()
     assert retrieved_token == "dummy-token"
 
     token_path = mock_cluster_api_cache_dir / "token"
     assert token_path.read_text() == retrieved_token
+
+
+async def test_acquire_token__ignores_the_cache_if_requested(
+    mock_cluster_api_cache_dir, respx_mock
+):
+    """
+    Verifies that a new token is requested from OIDC when the cache must not be used.
+    """
+    mock_cluster_api_cache_dir.mkdir(parents=True)
+    (mock_cluster_api_cache_dir / "token").write_text(_make_token(60))
+
+    retrieved_token = await acquire_token(use_cache=False)
+
+    assert retrieved_token == "dummy-token"
+    assert (mock_cluster_api_cache_dir / "token").read_text() == "dummy-token"
+
+
+async def test_token_auth__shares_a_single_inflight_acquisition(mocker):
+    """
+    Verifies that concurrent requests for a token share a single acquisition.
+    """
+    token = _make_token(3600)
+
+    async def _acquire(use_cache=True):
+        await asyncio.sleep(0.01)
+        return token
+
+    mock_acquire = mocker.patch(
+        "cluster_agent.identity.cluster_api.acquire_token", side_effect=_acquire
+    )
+    auth = TokenAuth()
+
+    tokens = await asyncio.gather(*(auth.get_token() for _ in range(10)))
+
+    assert tokens == [token] * 10
+    mock_acquire.assert_awaited_once_with(use_cache=True)
+
+
+async def test_token_auth__refreshes_the_token_ahead_of_expiry(mocker, tweak_settings):
+    """
+    Verifies that a token close to its expiration is still used while a new one is
+    acquired in the background.
+    """
+    old_token = _make_token(30, subject="old")
+    new_token = _make_token(3600, subject="new")
+    mock_acquire = mocker.patch(
+        "cluster_agent.identity.cluster_api.acquire_token", return_value=new_token
+    )
+    auth = TokenAuth()
+    auth.token = old_token
+    auth.expires_at = jwt.decode(old_token, options=dict(verify_signature=False))["exp"]
+
+    with tweak_settings(OIDC_TOKEN_REFRESH_MARGIN_SECONDS=60):
+        assert await auth.get_token() == old_token
+        await auth._refresh_task
+
+    mock_acquire.assert_awaited_once_with(use_cache=False)
+    assert await auth.get_token() == new_token
+
+
+async def test_token_auth__refreshes_the_token_and_retries_on_401(mocker):
+    """
+    Verifies that a request answered with a 401 is retried once with a new token.
+    """
+    mocker.patch(
+        "cluster_agent.identity.cluster_api.acquire_token",
+        side_effect=["revoked-token", "fresh-token"],
+    )
+
+    def _check_token(request: httpx.Request):
+        if request.headers["authorization"] == "Bearer fresh-token":
+            return httpx.Response(status_code=200)
+        return httpx.Response(status_code=401)
+
+    async with respx.mock:
+        route = respx.get(f"{SETTINGS.BASE_API_URL}/dummy")
+        route.mock(side_effect=_check_token)
+
+        async with httpx.AsyncClient(base_url=SETTINGS.BASE_API_URL, auth=TokenAuth()) as client:
+            response = await client.get("/dummy")
+
+    assert response.status_code == 200
+    assert route.call_count == 2
+
+
+@pytest.mark.parametrize(
+    "compression_enabled,body_size,expect_compressed",
+    [(True, 2000, True), (True, 100, False), (False, 2000, False)],
+)
+async def test_async_backend_client__compresses_large_request_bodies(
+    mocker, tweak_settings, compression_enabled, body_size, expect_compressed
+):
+    """
+    Verifies that request bodies are gzip compressed only when compression is enabled and
+    the body is larger than the threshold, and that the payload is preserved either way.
+    """
+    mocker.patch(
+        "cluster_agent.identity.cluster_api.acquire_token", return_value=_make_token(300)
+    )
+    payload = dict(data="x" * body_size)
+
+    with tweak_settings(
+        CLUSTER_API_REQUEST_COMPRESSION=compression_enabled,
+        CLUSTER_API_COMPRESSION_THRESHOLD_BYTES=1024,
+    ):
+        async with respx.mock:
+            route = respx.put(f"{SETTINGS.BASE_API_URL}/dummy")
+            route.mock(return_value=httpx.Response(status_code=200))
+
+            async with AsyncBackendClient() as client:
+                response = await client.put("/dummy", json=payload)
+
+            request = route.calls.last.request
+
+    assert response.status_code == 200
+    assert request.headers["authorization"].startswith("Bearer ")
+    if expect_compressed:
+        assert request.headers["content-encoding"] == "gzip"
+        assert int(request.headers["content-length"]) == len(request.content)
+        assert len(request.content) < body_size
+        assert json.loads(gzip.decompress(request.content)) == payload
+    else:
+        assert "content-encoding" not in request.headers
+        assert json.loads(request.content) == payload
+
+
+@pytest.mark.parametrize("method", ["GET", "DELETE"])
+async def test_async_backend_client__does_not_compress_bodiless_requests(
+    mocker, tweak_settings, method
+):
+    """
+    Verifies that requests without a body are not given a compressed empty body, even
+    when every body is compressed.
+    """
+    mocker.patch(
+        "cluster_agent.identity.cluster_api.acquire_token", return_value=_make_token(300)
+    )
+
+    with tweak_settings(
+        CLUSTER_API_REQUEST_COMPRESSION=True,
+        CLUSTER_API_COMPRESSION_THRESHOLD_BYTES=0,
+    ):
+        async with respx.mock:
+            route = respx.route(method=method, url=f"{SETTINGS.BASE_API_URL}/dummy")
+            route.mock(return_value=httpx.Response(status_code=200))
+
+            async with AsyncBackendClient() as client:
+                response = await client.request(method, "/dummy")
+
+            request = route.calls.last.request
+
+    assert response.status_code == 200
+    assert "content-encoding" not in request.headers
+    assert request.content == b""
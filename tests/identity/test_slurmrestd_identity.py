@@ -1,12 +1,19 @@
+import asyncio
+import json
 from datetime import datetime, timedelta, timezone
 from unittest import mock
 
+import pytest
 from freezegun import freeze_time
 from jose import jwt
 
 from cluster_agent.utils.logging import logger
 from cluster_agent.identity.slurmrestd import (
+    AsyncBackendClient,
+    CachedToken,
+    SigningKeyLoader,
     _load_token_from_cache,
+    _token_cache,
     _write_token_to_cache,
     acquire_token,
     SETTINGS,
@@ -149,7 +156,30 @@ def test__load_token_from_cache__returns_none_if_token_is_malformed(
     assert retrieved_token is None
 
 
-def test_acquire_token__gets_a_token_from_the_cache(mock_slurmrestd_api_cache_dir):
+def test__load_token_from_cache__returns_none_if_token_was_signed_with_another_key(
+    mock_slurmrestd_api_cache_dir,
+    slurmrestd_jwt_key_path,
+):
+    """
+    Verifies that None is returned if the token was signed with another key (e.g. a key
+    that was rotated while the agent was not running).
+    """
+    mock_slurmrestd_api_cache_dir.mkdir(parents=True)
+    token_path = mock_slurmrestd_api_cache_dir / "dummy-user.token"
+    one_minute_from_now = int(datetime.now(tz=timezone.utc).timestamp()) + 60
+    old_token = jwt.encode(dict(exp=one_minute_from_now), key="OLD-JWT-SECRET", algorithm="HS256")
+    token_path.write_text(old_token)
+
+    with mock.patch.object(SETTINGS, "SLURMRESTD_USE_KEY_PATH", new=True):
+        with mock.patch.object(SETTINGS, "SLURMRESTD_JWT_KEY_PATH", new=slurmrestd_jwt_key_path):
+            retrieved_token = _load_token_from_cache("dummy-user")
+
+    assert retrieved_token is None
+
+
+def test_acquire_token__gets_a_token_from_the_cache(
+    mock_slurmrestd_api_cache_dir, slurmrestd_jwt_key_string
+):
     """
     Verifies that the token is retrieved from the cache if it is found there.
     """
@@ -158,7 +188,7 @@ def test_acquire_token__gets_a_token_from_the_cache(mock_slurmrestd_api_cache_di
     one_minute_from_now = int(datetime.now(tz=timezone.utc).timestamp()) + 60
     created_token = jwt.encode(
         dict(exp=one_minute_from_now),
-        key="dummy-key",
+        key=slurmrestd_jwt_key_string,
         algorithm="HS256",
     )
     token_path.write_text(created_token)
@@ -235,3 +265,111 @@ def test_acquire_token__uses_key_path_if_supplied(
         with mock.patch.object(SETTINGS, "SLURMRESTD_JWT_KEY_PATH", new=slurmrestd_jwt_key_path):
             retrieved_token = acquire_token(username)
     assert retrieved_token == expected_token
+
+
+def test_acquire_token__serves_valid_tokens_from_memory(mock_slurmrestd_api_cache_dir):
+    """
+    Verifies that once a token is acquired, it is served from memory without touching
+    the cache files.
+    """
+    username = "dummy-user"
+    first_token = acquire_token(username)
+
+    with mock.patch("cluster_agent.identity.slurmrestd._load_token_from_cache") as mock_load:
+        with mock.patch("cluster_agent.identity.slurmrestd.jwt.encode") as mock_encode:
+            second_token = acquire_token(username)
+
+    assert second_token == first_token
+    mock_load.assert_not_called()
+    mock_encode.assert_not_called()
+    assert _token_cache[username].token == first_token
+
+
+def test_acquire_token__replaces_expired_tokens_in_memory(mock_slurmrestd_api_cache_dir):
+    """
+    Verifies that a token about to expire is not served from memory.
+    """
+    username = "dummy-user"
+    soon = int(datetime.now(tz=timezone.utc).timestamp()) + 5
+    _token_cache[username] = CachedToken(token="expiring-token", expires_at=soon)
+
+    retrieved_token = acquire_token(username)
+
+    assert retrieved_token != "expiring-token"
+    assert _token_cache[username].token == retrieved_token
+    assert _token_cache[username].expires_at > soon
+
+
+def test_signing_key__is_loaded_once_from_the_key_file(
+    slurmrestd_jwt_key_path, slurmrestd_jwt_key_string
+):
+    """
+    Verifies that the key file is read only once while it doesn't change.
+    """
+    loader = SigningKeyLoader()
+    with mock.patch.object(SETTINGS, "SLURMRESTD_USE_KEY_PATH", new=True):
+        with mock.patch("cluster_agent.identity.slurmrestd.Path.read_text") as mock_read:
+            mock_read.return_value = slurmrestd_jwt_key_string
+            assert loader.get_key() == slurmrestd_jwt_key_string
+            assert loader.get_key() == slurmrestd_jwt_key_string
+
+    mock_read.assert_called_once_with()
+
+
+def test_acquire_token__invalidates_tokens_when_the_key_is_rotated(
+    mock_slurmrestd_api_cache_dir, slurmrestd_jwt_key_path, tweak_settings
+):
+    """
+    Verifies that rotating the key file invalidates the tokens signed with the old key,
+    both in memory and in the cache files.
+    """
+    username = "dummy-user"
+    with tweak_settings(
+        SLURMRESTD_USE_KEY_PATH=True, SLURMRESTD_JWT_KEY_CHECK_INTERVAL_SECONDS=0
+    ):
+        old_token = acquire_token(username)
+        assert acquire_token(username) == old_token
+
+        slurmrestd_jwt_key_path.unlink()
+        slurmrestd_jwt_key_path.write_text("ROTATED-JWT-SECRET")
+
+        new_token = acquire_token(username)
+
+    assert new_token != old_token
+    jwt.decode(new_token, "ROTATED-JWT-SECRET", algorithms=["HS256"])
+    assert (mock_slurmrestd_api_cache_dir / f"{username}.token").read_text() == new_token
+
+
+@pytest.mark.asyncio
+async def test_async_backend_client__connects_through_a_unix_socket(tmp_path, tweak_settings):
+    """
+    Verifies that requests are sent through the unix socket when one is configured, using
+    a local socket server as a stand-in for slurmrestd.
+    """
+    socket_path = tmp_path / "slurmrestd.socket"
+    request_lines = []
+
+    async def _handle_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        head = await reader.readuntil(b"\r\n\r\n")
+        request_lines.append(head.split(b"\r\n")[0].decode())
+        body = json.dumps(dict(statistics=dict(jobs_running=1))).encode()
+        writer.write(
+            b"HTTP/1.1 200 OK\r\ncontent-type: application/json\r\n"
+            + f"content-length: {len(body)}\r\n\r\n".encode()
+            + body
+        )
+        await writer.drain()
+        writer.close()
+
+    server = await asyncio.start_unix_server(_handle_connection, path=str(socket_path))
+    try:
+        with tweak_settings(SLURMRESTD_UNIX_SOCKET=str(socket_path)):
+            async with AsyncBackendClient() as client:
+                response = await client.get("/diag/")
+    finally:
+        server.close()
+        await server.wait_closed()
+
+    assert response.status_code == 200
+    assert response.json() == dict(statistics=dict(jobs_running=1))
+    assert request_lines == ["GET /slurm/v0.0.36/diag/ HTTP/1.1"]
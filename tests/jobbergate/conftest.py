@@ -2,9 +2,12 @@
 Define fixtures for the ``jobbergate`` section.
 """
 from textwrap import dedent
+from unittest import mock
 
 import pytest
 
+from cluster_agent.jobbergate.finish import BulkStatusTracker
+
 
 @pytest.fixture(scope="module")
 def dummy_template_source():
@@ -47,3 +50,13 @@ def dummy_pending_job_submission_data(dummy_job_script_files):
         application_name="app1",
         slurm_job_id=13,
     )
+
+
+@pytest.fixture(autouse=True)
+def bulk_status_tracker():
+    """
+    Provide a fresh tracker for the bulk job status lookups on each test.
+    """
+    tracker = BulkStatusTracker()
+    with mock.patch("cluster_agent.jobbergate.finish.bulk_status_tracker", new=tracker):
+        yield tracker
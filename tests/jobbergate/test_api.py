@@ -2,6 +2,7 @@
 Define tests for the Jobbergate API interface functions.
 """
 
+import gzip
 import json
 from buzz import DoExceptParams
 
@@ -84,6 +85,43 @@ async def test_fetch_pending_submissions__success(dummy_job_script_files):
             assert i + 1 == pending_job_submission.id
 
 
+@pytest.mark.asyncio
+async def test_fetch_pending_submissions__accepts_compressed_responses(dummy_job_script_files):
+    """
+    Test that the ``fetch_pending_submissions()`` function accepts and decodes gzip
+    compressed responses, since the inline job-script files compress well.
+    """
+    pending_job_submissions_data = [
+        dict(
+            id=1,
+            job_submission_name="sub1",
+            job_submission_owner_email="email1@dummy.com",
+            job_script_id=11,
+            job_script_name="script1",
+            job_script_files=dummy_job_script_files,
+            application_name="app1",
+            slurm_job_id=111,
+        ),
+    ]
+    async with respx.mock:
+        pending_route = respx.get(
+            f"{SETTINGS.BASE_API_URL}/jobbergate/job-submissions/agent/pending"
+        )
+        pending_route.mock(
+            return_value=httpx.Response(
+                status_code=200,
+                headers={"content-encoding": "gzip"},
+                content=gzip.compress(json.dumps(pending_job_submissions_data).encode()),
+            )
+        )
+
+        pending_job_submissions = await fetch_pending_submissions()
+        request = pending_route.calls.last.request
+
+    assert "gzip" in request.headers["accept-encoding"]
+    assert [p.id for p in pending_job_submissions] == [1]
+
+
 @pytest.mark.asyncio
 async def test_fetch_pending_submissions__raises_JobbergateApiError_if_response_is_not_200():  # noqa
     """
@@ -1,12 +1,19 @@
+import asyncio
 import json
 
 import httpx
 import pytest
 import respx
 
-from cluster_agent.jobbergate.finish import fetch_job_status, finish_active_jobs
+from cluster_agent.jobbergate.finish import (
+    fetch_job_status,
+    fetch_job_statuses,
+    finish_active_jobs,
+)
 from cluster_agent.jobbergate.constants import JobSubmissionStatus
+from cluster_agent.jobbergate.schemas import ActiveJobSubmission, SlurmSubmittedJobStatus
 from cluster_agent.utils.exception import SlurmrestdError
+from cluster_agent.utils.http import list_timeout
 from cluster_agent.settings import SETTINGS
 
 
@@ -84,7 +91,7 @@ async def test_fetch_pending_submissions__raises_SlurmrestdError_if_response_is_
 
 
 @pytest.mark.asyncio
-async def test_finish_active_jobs():
+async def test_finish_active_jobs(tweak_settings):
     """
     Test that the ``finish_active_jobs()`` function can fetch active job submissions,
     retrieve the job state from slurm, map it to a ``JobSubmissionStatus``, and update
@@ -150,13 +157,14 @@ async def test_finish_active_jobs():
         )
         update_route.mock(side_effect=_map_update_request)
 
-        await finish_active_jobs()
+        with tweak_settings(JOB_STATUS_BULK_LOOKUP=False):
+            await finish_active_jobs()
 
         def _map_slurm_call(request: httpx.Request):
             return int(request.url.path.split("/")[-1])
 
         assert slurm_route.call_count == 5
-        assert [_map_slurm_call(c.request) for c in slurm_route.calls] == [
+        assert sorted(_map_slurm_call(c.request) for c in slurm_route.calls) == [
             11,
             22,
             33,
@@ -173,7 +181,158 @@ async def test_finish_active_jobs():
             )
 
         assert update_route.call_count == 2
-        assert [_map_update_call(c.request) for c in update_route.calls] == [
+        assert sorted(_map_update_call(c.request) for c in update_route.calls) == [
             (1, JobSubmissionStatus.COMPLETED),
             (2, JobSubmissionStatus.FAILED),
         ]
+
+
+@pytest.mark.asyncio
+async def test_fetch_job_statuses__success():
+    """
+    Test that the ``fetch_job_statuses()`` function retrieves the status of all jobs with
+    a single request, mapping them by slurm job id.
+    """
+    async with respx.mock:
+        jobs_route = respx.get(f"{SETTINGS.SLURM_RESTD_VERSIONED_URL}/jobs")
+        jobs_route.mock(
+            return_value=httpx.Response(
+                status_code=200,
+                json=dict(
+                    jobs=[
+                        dict(job_id=11, job_state="COMPLETED"),
+                        dict(job_id=22, job_state="RUNNING"),
+                    ],
+                ),
+            )
+        )
+
+        result = await fetch_job_statuses(update_time=1000)
+
+    assert jobs_route.calls.last.request.url.params["update_time"] == "1000"
+    assert jobs_route.calls.last.request.extensions["timeout"] == list_timeout().as_dict()
+    assert {job_id: status.job_state for (job_id, status) in result.items()} == {
+        11: "COMPLETED",
+        22: "RUNNING",
+    }
+
+
+@pytest.mark.asyncio
+async def test_fetch_job_statuses__raises_SlurmrestdError_if_response_is_not_200():
+    """
+    Test that the ``fetch_job_statuses()`` will raise a ``SlurmrestdError`` if the
+    response is not a 200.
+    """
+    async with respx.mock:
+        respx.get(f"{SETTINGS.SLURM_RESTD_VERSIONED_URL}/jobs").mock(
+            return_value=httpx.Response(status_code=500)
+        )
+        with pytest.raises(
+            SlurmrestdError, match="Failed to fetch job statuses from slurm"
+        ):
+            await fetch_job_statuses()
+
+
+@pytest.mark.asyncio
+async def test_finish_active_jobs__uses_bulk_lookup(bulk_status_tracker):
+    """
+    Test that ``finish_active_jobs()`` fetches job statuses in bulk, falls back to
+    per-job lookups only for jobs missing from the bulk response, and on the next cycle
+    only asks for jobs updated since the previous lookup.
+    """
+    active_job_submissions_data = [
+        dict(id=1, slurm_job_id=11),  # Completed, found in bulk
+        dict(id=2, slurm_job_id=22),  # Running, found in bulk
+        dict(id=3, slurm_job_id=33),  # Missing from bulk, failed
+    ]
+
+    async with respx.mock:
+        respx.get(f"{SETTINGS.BASE_API_URL}/jobbergate/job-submissions/agent/active").mock(
+            return_value=httpx.Response(status_code=200, json=active_job_submissions_data)
+        )
+        jobs_route = respx.get(f"{SETTINGS.SLURM_RESTD_VERSIONED_URL}/jobs")
+        jobs_route.mock(
+            return_value=httpx.Response(
+                status_code=200,
+                json=dict(
+                    jobs=[
+                        dict(job_id=11, job_state="COMPLETED"),
+                        dict(job_id=22, job_state="RUNNING"),
+                        dict(job_id=99, job_state="RUNNING"),
+                    ],
+                ),
+            )
+        )
+        job_route = respx.get(f"{SETTINGS.SLURM_RESTD_VERSIONED_URL}/job/33")
+        job_route.mock(
+            return_value=httpx.Response(
+                status_code=200, json=dict(jobs=[dict(job_id=33, job_state="FAILED")])
+            )
+        )
+        update_route = respx.put(
+            url__regex=rf"{SETTINGS.BASE_API_URL}/jobbergate/job-submissions/agent/\d+"
+        )
+        update_route.mock(return_value=httpx.Response(status_code=200))
+
+        await finish_active_jobs()
+
+        assert jobs_route.call_count == 1
+        assert "update_time" not in jobs_route.calls.last.request.url.params
+        assert job_route.call_count == 1
+        assert sorted(
+            (
+                int(c.request.url.path.split("/")[-1]),
+                json.loads(c.request.content)["new_status"],
+            )
+            for c in update_route.calls
+        ) == [(1, JobSubmissionStatus.COMPLETED), (3, JobSubmissionStatus.FAILED)]
+        assert bulk_status_tracker.unfinished_job_ids == {22}
+
+        # Next cycle: job 22 is unchanged, so it's neither in the response nor looked up
+        jobs_route.mock(return_value=httpx.Response(status_code=200, json=dict(jobs=[])))
+        last_sync = bulk_status_tracker.last_sync
+
+        await finish_active_jobs()
+
+        assert jobs_route.call_count == 2
+        assert jobs_route.calls.last.request.url.params["update_time"] == str(last_sync)
+        assert job_route.call_count == 2  # jobs 11 and 33 are still active in the API
+        assert bulk_status_tracker.unfinished_job_ids == {22}
+
+
+@pytest.mark.asyncio
+async def test_finish_active_jobs__checks_jobs_concurrently_within_the_limit(
+    tweak_settings, mocker
+):
+    """
+    Test that ``finish_active_jobs()`` looks up job statuses concurrently, never having
+    more than ``JOB_STATUS_CONCURRENCY`` lookups in flight, and updates each job as
+    soon as its own status arrives.
+    """
+    mocker.patch(
+        "cluster_agent.jobbergate.finish.fetch_active_submissions",
+        return_value=[ActiveJobSubmission(id=i, slurm_job_id=i * 11) for i in range(1, 7)],
+    )
+    mock_update = mocker.patch("cluster_agent.jobbergate.finish.update_status")
+
+    in_flight = 0
+    max_in_flight = 0
+
+    async def _fetch(slurm_job_id):
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        # The first job is the slowest, but must not delay updating the other ones
+        await asyncio.sleep(0.05 if slurm_job_id == 11 else 0.01)
+        in_flight -= 1
+        return SlurmSubmittedJobStatus(job_id=slurm_job_id, job_state="COMPLETED")
+
+    mocker.patch("cluster_agent.jobbergate.finish.fetch_job_status", side_effect=_fetch)
+
+    with tweak_settings(JOB_STATUS_BULK_LOOKUP=False, JOB_STATUS_CONCURRENCY=3):
+        await finish_active_jobs()
+
+    assert max_in_flight == 3
+    updated_ids = [c.args[0] for c in mock_update.await_args_list]
+    assert sorted(updated_ids) == [1, 2, 3, 4, 5, 6]
+    assert updated_ids[0] != 1
@@ -2,6 +2,7 @@
 Define tests for the submission functions of the jobbergate section.
 """
 
+import asyncio
 import json
 
 import httpx
@@ -409,6 +410,134 @@ async def test_submit_pending_jobs(dummy_job_script_files, tweak_settings):
         assert update_3_route.call_count == 1  # called to notify the job was rejected
 
 
+@pytest.mark.asyncio
+async def test_submit_pending_jobs__submits_concurrently_within_the_limit(
+    dummy_pending_job_submission_data, tweak_settings, mocker
+):
+    """
+    Test that ``submit_pending_jobs()`` submits jobs concurrently, never running more than
+    ``SUBMISSION_CONCURRENCY`` submissions at once, and that one failing submission does
+    not prevent the others from being marked as submitted.
+    """
+    pending_job_submissions = [
+        PendingJobSubmission(**{**dummy_pending_job_submission_data, "id": i})
+        for i in range(1, 6)
+    ]
+    mocker.patch(
+        "cluster_agent.jobbergate.submit.fetch_pending_submissions",
+        return_value=pending_job_submissions,
+    )
+    mock_mark = mocker.patch("cluster_agent.jobbergate.submit.mark_as_submitted")
+
+    in_flight = 0
+    max_in_flight = 0
+
+    async def _submit(pending_job_submission, *_):
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        if pending_job_submission.id == 3:
+            raise JobSubmissionError("BOOM!")
+        return pending_job_submission.id * 11
+
+    mocker.patch("cluster_agent.jobbergate.submit.submit_job_script", side_effect=_submit)
+
+    with tweak_settings(SUBMISSION_CONCURRENCY=2, SINGLE_USER_SUBMITTER="dummy-user"):
+        await submit_pending_jobs()
+
+    assert max_in_flight == 2
+    assert sorted(c.args for c in mock_mark.await_args_list) == [
+        (1, 11),
+        (2, 22),
+        (4, 44),
+        (5, 55),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_submit_pending_jobs__does_not_build_the_mapper_without_pending_jobs(mocker):
+    """
+    Test that ``submit_pending_jobs()`` doesn't retrieve the user mapper (and connect to
+    LDAP) when there are no pending jobs.
+    """
+    mocker.patch("cluster_agent.jobbergate.submit.fetch_pending_submissions", return_value=[])
+    mock_get_mapper = mocker.patch("cluster_agent.jobbergate.submit.get_mapper")
+
+    await submit_pending_jobs()
+
+    mock_get_mapper.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_submit_pending_jobs__looks_up_the_owners_at_once(
+    dummy_pending_job_submission_data, mocker
+):
+    """
+    Test that ``submit_pending_jobs()`` looks up the usernames of all the owners with a
+    single ``find_usernames()`` call and hands them to each submission.
+    """
+    pending_job_submissions = [
+        PendingJobSubmission(
+            **{
+                **dummy_pending_job_submission_data,
+                "id": i,
+                "job_submission_owner_email": f"email{i % 2}@dummy.com",
+            }
+        )
+        for i in range(1, 5)
+    ]
+    mocker.patch(
+        "cluster_agent.jobbergate.submit.fetch_pending_submissions",
+        return_value=pending_job_submissions,
+    )
+    user_mapper = mocker.AsyncMock(SlurmUserMapper)
+    user_mapper.find_usernames.return_value = {"email0@dummy.com": "user0"}
+    mocker.patch("cluster_agent.jobbergate.submit.get_mapper", return_value=user_mapper)
+    mocker.patch("cluster_agent.jobbergate.submit.mark_as_submitted")
+    mock_submit = mocker.patch(
+        "cluster_agent.jobbergate.submit.submit_job_script", return_value=1
+    )
+
+    await submit_pending_jobs()
+
+    user_mapper.find_usernames.assert_awaited_once()
+    assert sorted(user_mapper.find_usernames.await_args.args[0]) == [
+        "email0@dummy.com",
+        "email0@dummy.com",
+        "email1@dummy.com",
+        "email1@dummy.com",
+    ]
+    assert mock_submit.await_count == 4
+    for call in mock_submit.await_args_list:
+        assert call.args[1:] == (user_mapper, {"email0@dummy.com": "user0"})
+
+
+@pytest.mark.asyncio
+async def test_submit_job_script__uses_the_usernames_found_in_advance(
+    dummy_pending_job_submission_data, mocker
+):
+    """
+    Test that ``submit_job_script()`` doesn't look up owners whose username was supplied.
+    """
+    user_mapper = mocker.AsyncMock(SlurmUserMapper)
+    pending_job_submission = PendingJobSubmission(**dummy_pending_job_submission_data)
+    usernames = {pending_job_submission.job_submission_owner_email: "dummy-user"}
+
+    async with respx.mock:
+        submit_route = respx.post(f"{SETTINGS.SLURM_RESTD_VERSIONED_URL}/job/submit")
+        submit_route.mock(return_value=httpx.Response(status_code=200, json=dict(job_id=13)))
+
+        slurm_job_id = await submit_job_script(pending_job_submission, user_mapper, usernames)
+
+        assert slurm_job_id == 13
+        last_request = submit_route.calls.last.request
+        assert last_request.headers["x-slurm-user-name"] == "dummy-user"
+
+    user_mapper.find_username.assert_not_called()
+
+
 class TestGetJobParameters:
     """
     Test the ``get_job_parameters()`` function.
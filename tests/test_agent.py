@@ -1,20 +1,61 @@
 """
 placeholder for future tests
 """
+import asyncio
+import json
+from datetime import datetime, timezone
 from unittest import mock
 
 import asynctest
+import httpx
 import pytest
+import respx
+from freezegun import freeze_time
 from hostlist import expand_hostlist
 
 from cluster_agent.agent import (
+    UpsertSummary,
+    batch_items,
     update_diagnostics,
+    upsert_items,
     upsert_partitions,
     upsert_nodes,
     upsert_jobs,
 )
 from cluster_agent.settings import SETTINGS
+from cluster_agent.utils.concurrency import iterate_async
 from cluster_agent.utils.exception import SlurmrestdError
+from cluster_agent.utils.http import list_timeout
+from cluster_agent.utils.snapshot import SyncSnapshot
+
+
+@pytest.fixture(autouse=True)
+def node_snapshot(tmp_path):
+    """
+    Provide an empty node snapshot stored in a temporary directory.
+    """
+    snapshot = SyncSnapshot(tmp_path / "agent" / "nodes.json")
+    with mock.patch("cluster_agent.agent.node_snapshot", new=snapshot):
+        yield snapshot
+
+
+@pytest.fixture(autouse=True)
+def job_snapshot(tmp_path):
+    """
+    Provide an empty job snapshot stored in a temporary directory.
+    """
+    snapshot = SyncSnapshot(tmp_path / "agent" / "jobs.json")
+    with mock.patch("cluster_agent.agent.job_snapshot", new=snapshot):
+        yield snapshot
+
+
+@pytest.fixture
+def buffered_responses(tweak_settings):
+    """
+    Make the collectors read the whole slurmrestd responses before processing them.
+    """
+    with tweak_settings(SLURMRESTD_STREAM_RESPONSES=False):
+        yield
 
 
 @pytest.mark.parametrize(
@@ -26,14 +67,12 @@ from cluster_agent.utils.exception import SlurmrestdError
         (""),
     ],
 )
-@mock.patch("cluster_agent.agent.asyncio")
 @mock.patch("cluster_agent.agent.cluster_api_client")
 @mock.patch("cluster_agent.agent.slurmrestd_client")
 @pytest.mark.asyncio
 async def test_upsert_partitions(
     mock_slurmrestd_client,
     mock_cluster_api_client,
-    mock_asyncio,
     random_word,
     nodes_names_string,
 ):
@@ -59,11 +98,9 @@ async def test_upsert_partitions(
 
     mock_response_status = mock.Mock()
     mock_response_status.status_code = 200
+    mock_response_status.is_success = True
 
-    mock_asyncio.gather = asynctest.CoroutineMock()
-    mock_asyncio.gather.return_value = [mock_response_status]
-
-    mock_cluster_api_client.put = asynctest.CoroutineMock()
+    mock_cluster_api_client.put = asynctest.CoroutineMock(return_value=mock_response_status)
 
     test_response = await upsert_partitions()
 
@@ -80,17 +117,15 @@ async def test_upsert_partitions(
         )
     ]
     mock_slurmrestd_client.get.assert_awaited_with("/partitions")
-    mock_asyncio.gather.assert_awaited_once()
-    assert test_response == [200]
+    assert test_response == UpsertSummary(collector="partitions", succeeded=1, failed=0)
 
 
-@mock.patch("cluster_agent.agent.asyncio")
 @mock.patch("cluster_agent.agent.cluster_api_client")
 @mock.patch("cluster_agent.agent.slurmrestd_client")
 @pytest.mark.parametrize("response_status_code", [400, 500])
 @pytest.mark.asyncio
 async def test_upsert_partitions__raise_error_in_case_slurmrestd_returns_4xx_or_5xx(
-    mock_slurmrestd_client, mock_cluster_api_client, mock_asyncio, response_status_code
+    mock_slurmrestd_client, mock_cluster_api_client, response_status_code
 ):
     """
     Verify if an error is raised in case the slurmrestd request fails
@@ -107,9 +142,6 @@ async def test_upsert_partitions__raise_error_in_case_slurmrestd_returns_4xx_or_
     mock_response_status = mock.Mock()
     mock_response_status.status_code = 200
 
-    mock_asyncio.gather = asynctest.CoroutineMock()
-    mock_asyncio.gather.return_value = [mock_response_status]
-
     mock_cluster_api_client.put = asynctest.CoroutineMock()
 
     with pytest.raises(SlurmrestdError) as e:
@@ -121,14 +153,13 @@ async def test_upsert_partitions__raise_error_in_case_slurmrestd_returns_4xx_or_
     )
 
 
-@mock.patch("cluster_agent.agent.asyncio")
+@pytest.mark.usefixtures("buffered_responses")
 @mock.patch("cluster_agent.agent.cluster_api_client")
 @mock.patch("cluster_agent.agent.slurmrestd_client")
 @pytest.mark.asyncio
 async def test_upsert_nodes(
     mock_slurmrestd_client,
     mock_cluster_api_client,
-    mock_asyncio,
     random_word,
 ):
     """
@@ -153,11 +184,9 @@ async def test_upsert_nodes(
 
     mock_response_status = mock.Mock()
     mock_response_status.status_code = 200
+    mock_response_status.is_success = True
 
-    mock_asyncio.gather = asynctest.CoroutineMock()
-    mock_asyncio.gather.return_value = [mock_response_status]
-
-    mock_cluster_api_client.put = asynctest.CoroutineMock()
+    mock_cluster_api_client.put = asynctest.CoroutineMock(return_value=mock_response_status)
 
     test_response = await upsert_nodes()
 
@@ -171,18 +200,17 @@ async def test_upsert_nodes(
             ),
         )
     ]
-    mock_slurmrestd_client.get.assert_awaited_with("/nodes")
-    mock_asyncio.gather.assert_awaited_once()
-    assert test_response == [200]
+    mock_slurmrestd_client.get.assert_awaited_with("/nodes", timeout=list_timeout())
+    assert test_response == UpsertSummary(collector="nodes", succeeded=1, failed=0)
 
 
-@mock.patch("cluster_agent.agent.asyncio")
+@pytest.mark.usefixtures("buffered_responses")
 @mock.patch("cluster_agent.agent.cluster_api_client")
 @mock.patch("cluster_agent.agent.slurmrestd_client")
 @pytest.mark.parametrize("response_status_code", [400, 500])
 @pytest.mark.asyncio
 async def test_upsert_nodes__raise_error_in_case_slurmrestd_returns_4xx_or_5xx(
-    mock_slurmrestd_client, mock_cluster_api_client, mock_asyncio, response_status_code
+    mock_slurmrestd_client, mock_cluster_api_client, response_status_code
 ):
     """
     Verify if an error is raised in case the slurmrestd request fails
@@ -199,9 +227,6 @@ async def test_upsert_nodes__raise_error_in_case_slurmrestd_returns_4xx_or_5xx(
     mock_response_status = mock.Mock()
     mock_response_status.status_code = 200
 
-    mock_asyncio.gather = asynctest.CoroutineMock()
-    mock_asyncio.gather.return_value = [mock_response_status]
-
     mock_cluster_api_client.put = asynctest.CoroutineMock()
 
     with pytest.raises(SlurmrestdError) as e:
@@ -252,13 +277,12 @@ async def test_update_diagnostics(
     assert test_response == 200
 
 
-@mock.patch("cluster_agent.agent.asyncio")
 @mock.patch("cluster_agent.agent.cluster_api_client")
 @mock.patch("cluster_agent.agent.slurmrestd_client")
 @pytest.mark.parametrize("response_status_code", [400, 500])
 @pytest.mark.asyncio
 async def test_update_diagnostics__raise_error_in_case_slurmrestd_returns_4xx_or_5xx(
-    mock_slurmrestd_client, mock_cluster_api_client, mock_asyncio, response_status_code
+    mock_slurmrestd_client, mock_cluster_api_client, response_status_code
 ):
     """
     Verify if an error is raised in case the slurmrestd request fails
@@ -275,9 +299,6 @@ async def test_update_diagnostics__raise_error_in_case_slurmrestd_returns_4xx_or
     mock_response_status = mock.Mock()
     mock_response_status.status_code = 200
 
-    mock_asyncio.gather = asynctest.CoroutineMock()
-    mock_asyncio.gather.return_value = [mock_response_status]
-
     mock_cluster_api_client.put = asynctest.CoroutineMock()
 
     with pytest.raises(SlurmrestdError) as e:
@@ -289,12 +310,12 @@ async def test_update_diagnostics__raise_error_in_case_slurmrestd_returns_4xx_or
     )
 
 
-@mock.patch("cluster_agent.agent.asyncio")
+@pytest.mark.usefixtures("buffered_responses")
 @mock.patch("cluster_agent.agent.cluster_api_client")
 @mock.patch("cluster_agent.agent.slurmrestd_client")
 @pytest.mark.asyncio
 async def test_upsert_jobs(
-    mock_slurmrestd_client, mock_cluster_api_client, mock_asyncio
+    mock_slurmrestd_client, mock_cluster_api_client
 ):
     """
     Verify whether nodes are upserted correctly. Also, check is the
@@ -318,11 +339,9 @@ async def test_upsert_jobs(
 
     mock_response_status = mock.Mock()
     mock_response_status.status_code = 200
+    mock_response_status.is_success = True
 
-    mock_asyncio.gather = asynctest.CoroutineMock()
-    mock_asyncio.gather.return_value = [mock_response_status]
-
-    mock_cluster_api_client.put = asynctest.CoroutineMock()
+    mock_cluster_api_client.put = asynctest.CoroutineMock(return_value=mock_response_status)
 
     test_response = await upsert_jobs()
 
@@ -336,18 +355,17 @@ async def test_upsert_jobs(
             ),
         )
     ]
-    mock_slurmrestd_client.get.assert_awaited_with("/jobs")
-    mock_asyncio.gather.assert_awaited_once()
-    assert test_response == [200]
+    mock_slurmrestd_client.get.assert_awaited_with("/jobs", timeout=list_timeout())
+    assert test_response == UpsertSummary(collector="jobs", succeeded=1, failed=0)
 
 
-@mock.patch("cluster_agent.agent.asyncio")
+@pytest.mark.usefixtures("buffered_responses")
 @mock.patch("cluster_agent.agent.cluster_api_client")
 @mock.patch("cluster_agent.agent.slurmrestd_client")
 @pytest.mark.parametrize("response_status_code", [400, 500])
 @pytest.mark.asyncio
 async def test_upsert_jobs__raise_error_in_case_slurmrestd_returns_4xx_or_5xx(
-    mock_slurmrestd_client, mock_cluster_api_client, mock_asyncio, response_status_code
+    mock_slurmrestd_client, mock_cluster_api_client, response_status_code
 ):
     """
     Verify if an error is raised in case the slurmrestd request fails
@@ -364,9 +382,6 @@ async def test_upsert_jobs__raise_error_in_case_slurmrestd_returns_4xx_or_5xx(
     mock_response_status = mock.Mock()
     mock_response_status.status_code = 200
 
-    mock_asyncio.gather = asynctest.CoroutineMock()
-    mock_asyncio.gather.return_value = [mock_response_status]
-
     mock_cluster_api_client.put = asynctest.CoroutineMock()
 
     with pytest.raises(SlurmrestdError) as e:
@@ -376,3 +391,355 @@ async def test_upsert_jobs__raise_error_in_case_slurmrestd_returns_4xx_or_5xx(
         str(e.value)
         == f"Slurmrestd returned {response_status_code} when calling {url}: {error_message}"
     )
+
+
+@pytest.mark.asyncio
+async def test_upsert_items__bounds_concurrency_and_summarizes_results(tweak_settings):
+    """
+    Verify that upsert requests are issued with bounded concurrency, that failed
+    requests don't affect the other ones and that a summary of the results is returned.
+    """
+    in_flight = 0
+    max_in_flight = 0
+
+    async def _request(status_code):
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        if status_code is None:
+            raise httpx.ConnectTimeout("BOOM!")
+        return httpx.Response(
+            status_code=status_code, request=httpx.Request("PUT", "http://dummy")
+        )
+
+    status_codes = [200, 200, 500, None, 200, 404, 200]
+
+    with tweak_settings(CLUSTER_API_UPSERT_CONCURRENCY=2):
+        summary = await upsert_items("nodes", (_request(code) for code in status_codes))
+
+    assert max_in_flight == 2
+    assert summary == UpsertSummary(collector="nodes", succeeded=4, failed=3)
+    assert str(summary) == "nodes: 4 succeeded, 3 failed"
+
+
+@pytest.mark.asyncio
+async def test_upsert_nodes__only_syncs_changes_since_the_last_sync(
+    node_snapshot, tweak_settings
+):
+    """
+    Verify that, after a first full sync, only added or changed nodes are upserted and
+    vanished nodes are removed. Also check that the snapshot is persisted.
+    """
+    nodes = [{"name": "node-1", "state": "idle"}, {"name": "node-2", "state": "idle"}]
+
+    with tweak_settings(CLUSTER_API_REMOVE_VANISHED_ITEMS=True), respx.mock:
+        respx.get(f"{SETTINGS.SLURM_RESTD_VERSIONED_URL}/nodes").mock(
+            side_effect=lambda _: httpx.Response(
+                status_code=200, json=dict(meta=dict(), errors=list(), nodes=nodes)
+            )
+        )
+        put_route = respx.put(url__regex=rf"{SETTINGS.BASE_API_URL}/cluster/agent/nodes/.+")
+        put_route.mock(return_value=httpx.Response(status_code=200))
+        delete_route = respx.delete(
+            url__regex=rf"{SETTINGS.BASE_API_URL}/cluster/agent/nodes/.+"
+        )
+        delete_route.mock(return_value=httpx.Response(status_code=200))
+
+        summary = await upsert_nodes()
+        assert summary == UpsertSummary(collector="nodes", succeeded=2, failed=0)
+        assert put_route.call_count == 2
+
+        nodes = [{"name": "node-1", "state": "allocated"}, {"name": "node-3", "state": "idle"}]
+        summary = await upsert_nodes()
+
+    assert summary == UpsertSummary(collector="nodes", succeeded=3, failed=0)
+    assert sorted(c.request.url.path for c in put_route.calls[2:]) == [
+        "/cluster/agent/nodes/node-1",
+        "/cluster/agent/nodes/node-3",
+    ]
+    assert [c.request.url.path for c in delete_route.calls] == ["/cluster/agent/nodes/node-2"]
+
+    persisted = SyncSnapshot(node_snapshot.path)
+    assert sorted(persisted.hashes) == ["node-1", "node-3"]
+    assert not persisted.full_sync_due(SETTINGS.NODES_FULL_RESYNC_SECONDS)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("remove_status_code", [None, 405])
+async def test_upsert_nodes__forgets_vanished_nodes_that_are_not_removed(
+    node_snapshot, tweak_settings, remove_status_code
+):
+    """
+    Verify that vanished nodes are forgotten without being removed when the removal is
+    disabled, and also when it's enabled but the cluster API doesn't support it, so they
+    are not deleted again in every cycle.
+    """
+    nodes = [{"name": "node-1", "state": "idle"}, {"name": "node-2", "state": "idle"}]
+
+    with tweak_settings(CLUSTER_API_REMOVE_VANISHED_ITEMS=remove_status_code is not None):
+        async with respx.mock:
+            respx.get(f"{SETTINGS.SLURM_RESTD_VERSIONED_URL}/nodes").mock(
+                side_effect=lambda _: httpx.Response(
+                    status_code=200, json=dict(meta=dict(), errors=list(), nodes=nodes)
+                )
+            )
+            respx.put(url__regex=rf"{SETTINGS.BASE_API_URL}/cluster/agent/nodes/.+").mock(
+                return_value=httpx.Response(status_code=200)
+            )
+            delete_route = respx.delete(
+                url__regex=rf"{SETTINGS.BASE_API_URL}/cluster/agent/nodes/.+"
+            )
+            delete_route.mock(return_value=httpx.Response(status_code=remove_status_code or 200))
+
+            await upsert_nodes()
+            nodes = nodes[:1]
+            await upsert_nodes()
+            await upsert_nodes()
+
+    assert delete_route.call_count == (0 if remove_status_code is None else 1)
+    assert sorted(SyncSnapshot(node_snapshot.path).hashes) == ["node-1"]
+
+
+@pytest.mark.asyncio
+async def test_upsert_nodes__resends_all_nodes_when_a_full_sync_is_due(
+    node_snapshot, tweak_settings
+):
+    """
+    Verify that unchanged nodes are sent again when a full resync is due.
+    """
+    nodes = [{"name": "node-1", "state": "idle"}]
+
+    async with respx.mock:
+        respx.get(f"{SETTINGS.SLURM_RESTD_VERSIONED_URL}/nodes").mock(
+            return_value=httpx.Response(
+                status_code=200, json=dict(meta=dict(), errors=list(), nodes=nodes)
+            )
+        )
+        put_route = respx.put(f"{SETTINGS.BASE_API_URL}/cluster/agent/nodes/node-1")
+        put_route.mock(return_value=httpx.Response(status_code=200))
+
+        await upsert_nodes()
+        await upsert_nodes()
+        assert put_route.call_count == 1
+
+        with tweak_settings(NODES_FULL_RESYNC_SECONDS=0):
+            await upsert_nodes()
+        assert put_route.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_upsert_jobs__only_requests_jobs_updated_since_the_last_sync(
+    job_snapshot, tweak_settings
+):
+    """
+    Verify that, after a first full sync, slurmrestd is only asked for the jobs updated
+    since the last sync and that only changed jobs are upserted. Also check that vanished
+    jobs are removed in the next full pass.
+    """
+    def _jobs_response(*jobs):
+        return httpx.Response(
+            status_code=200, json=dict(meta=dict(), errors=list(), jobs=list(jobs))
+        )
+
+    with tweak_settings(CLUSTER_API_REMOVE_VANISHED_ITEMS=True), respx.mock:
+        jobs_route = respx.get(f"{SETTINGS.SLURM_RESTD_VERSIONED_URL}/jobs")
+        put_route = respx.put(url__regex=rf"{SETTINGS.BASE_API_URL}/cluster/agent/jobs/.+")
+        delete_route = respx.delete(
+            url__regex=rf"{SETTINGS.BASE_API_URL}/cluster/agent/jobs/.+"
+        )
+        put_route.mock(return_value=httpx.Response(status_code=200))
+        delete_route.mock(return_value=httpx.Response(status_code=200))
+
+        with freeze_time("2023-03-01 12:00:00"):
+            jobs_route.mock(
+                return_value=_jobs_response(
+                    dict(job_id=1, job_state="PENDING"), dict(job_id=2, job_state="PENDING")
+                )
+            )
+            summary = await upsert_jobs()
+        assert summary == UpsertSummary(collector="jobs", succeeded=2, failed=0)
+        assert "update_time" not in jobs_route.calls.last.request.url.params
+        sync_time = job_snapshot.last_sync
+        assert sync_time is not None
+
+        with freeze_time("2023-03-01 12:00:15"):
+            jobs_route.mock(
+                return_value=_jobs_response(
+                    dict(job_id=1, job_state="RUNNING"), dict(job_id=2, job_state="PENDING")
+                )
+            )
+            summary = await upsert_jobs()
+        assert summary == UpsertSummary(collector="jobs", succeeded=1, failed=0)
+        assert jobs_route.calls.last.request.url.params["update_time"] == str(sync_time)
+        assert put_route.calls.last.request.url.path == "/cluster/agent/jobs/1"
+        assert delete_route.call_count == 0
+
+        with freeze_time("2023-03-01 13:00:00"):
+            jobs_route.mock(return_value=_jobs_response(dict(job_id=1, job_state="RUNNING")))
+            summary = await upsert_jobs()
+        assert summary == UpsertSummary(collector="jobs", succeeded=2, failed=0)
+        assert "update_time" not in jobs_route.calls.last.request.url.params
+        assert [c.request.url.path for c in delete_route.calls] == ["/cluster/agent/jobs/2"]
+
+    assert sorted(SyncSnapshot(job_snapshot.path).hashes) == ["1"]
+
+
+@pytest.mark.asyncio
+async def test_upsert_jobs__moves_the_last_sync_time_forward_even_if_an_upsert_fails(
+    job_snapshot, tweak_settings
+):
+    """
+    Verify that the last sync time is moved forward after every pass, even if a job (or
+    a removal) failed to sync, and that the failed job is sent again in the next full pass.
+    """
+    job_snapshot.last_sync = 1000
+    job_snapshot.hashes["3"] = "vanished-job-hash"
+    with freeze_time("2023-03-01 11:59:00"):
+        job_snapshot.mark_full_sync()
+
+    with tweak_settings(CLUSTER_API_REMOVE_VANISHED_ITEMS=True), respx.mock:
+        jobs_route = respx.get(f"{SETTINGS.SLURM_RESTD_VERSIONED_URL}/jobs")
+        jobs_route.mock(
+            return_value=httpx.Response(
+                status_code=200,
+                json=dict(meta=dict(), errors=list(), jobs=[dict(job_id=1), dict(job_id=2)]),
+            )
+        )
+        respx.put(f"{SETTINGS.BASE_API_URL}/cluster/agent/jobs/1").mock(
+            return_value=httpx.Response(status_code=200)
+        )
+        failing_route = respx.put(f"{SETTINGS.BASE_API_URL}/cluster/agent/jobs/2")
+        failing_route.mock(return_value=httpx.Response(status_code=500))
+        respx.delete(f"{SETTINGS.BASE_API_URL}/cluster/agent/jobs/3").mock(
+            return_value=httpx.Response(status_code=500)
+        )
+
+        with freeze_time("2023-03-01 12:00:00"):
+            summary = await upsert_jobs()
+        assert jobs_route.calls.last.request.url.params["update_time"] == "1000"
+        assert summary == UpsertSummary(collector="jobs", succeeded=1, failed=1)
+        assert job_snapshot.last_sync == datetime(2023, 3, 1, 12, tzinfo=timezone.utc).timestamp()
+        assert sorted(job_snapshot.hashes) == ["1", "3"]
+
+        with freeze_time("2023-03-01 13:00:00"):
+            summary = await upsert_jobs()
+        assert "update_time" not in jobs_route.calls.last.request.url.params
+        assert summary == UpsertSummary(collector="jobs", succeeded=1, failed=2)
+        assert job_snapshot.last_sync == datetime(2023, 3, 1, 13, tzinfo=timezone.utc).timestamp()
+        assert failing_route.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_batch_items__splits_by_count_and_byte_size():
+    """
+    Verify that batches are closed when they reach the maximum number of items or when
+    the next item would exceed the maximum size, and that oversized items go alone.
+    """
+    items = [(str(i), dict(name="x" * size)) for (i, size) in enumerate([1, 1, 1, 50, 1])]
+
+    async def _batch_ids(items, max_items, max_bytes):
+        return [
+            [i for (i, _) in batch]
+            async for batch in batch_items(iterate_async(items), max_items, max_bytes)
+        ]
+
+    assert await _batch_ids(items, 2, 1000) == [["0", "1"], ["2", "3"], ["4"]]
+    assert await _batch_ids(items, 10, 40) == [["0", "1", "2"], ["3"], ["4"]]
+    assert await _batch_ids([], 10, 40) == []
+
+
+@pytest.mark.asyncio
+async def test_upsert_nodes__sends_batches_when_enabled(node_snapshot, tweak_settings):
+    """
+    Verify that, in batch mode, the nodes are sent in chunks to a single endpoint with
+    the shared meta sent once per batch, and that unchanged nodes are not sent again.
+    """
+    meta = dict(plugin=dict(name="Slurm"))
+    nodes = [dict(name=f"node-{i}", state="idle") for i in range(5)]
+    received_batches = []
+
+    def _stand_in_endpoint(request: httpx.Request) -> httpx.Response:
+        payload = json.loads(request.content)
+        assert payload["meta"] == meta
+        assert payload["errors"] == []
+        received_batches.append([node["name"] for node in payload["nodes"]])
+        return httpx.Response(status_code=200)
+
+    with tweak_settings(CLUSTER_API_BATCH_UPSERTS=True, CLUSTER_API_BATCH_MAX_ITEMS=2):
+        async with respx.mock:
+            respx.get(f"{SETTINGS.SLURM_RESTD_VERSIONED_URL}/nodes").mock(
+                side_effect=lambda _: httpx.Response(
+                    status_code=200, json=dict(meta=meta, errors=list(), nodes=nodes)
+                )
+            )
+            respx.put(f"{SETTINGS.BASE_API_URL}/cluster/agent/nodes").mock(
+                side_effect=_stand_in_endpoint
+            )
+
+            summary = await upsert_nodes()
+            assert summary == UpsertSummary(collector="nodes", succeeded=3, failed=0)
+            assert sorted(received_batches) == [
+                ["node-0", "node-1"],
+                ["node-2", "node-3"],
+                ["node-4"],
+            ]
+
+            nodes[3] = dict(name="node-3", state="allocated")
+            received_batches.clear()
+            summary = await upsert_nodes()
+
+    assert summary == UpsertSummary(collector="nodes", succeeded=1, failed=0)
+    assert received_batches == [["node-3"]]
+    assert sorted(node_snapshot.hashes) == [f"node-{i}" for i in range(5)]
+
+
+@pytest.mark.asyncio
+async def test_upsert_jobs__streams_the_slurmrestd_response():
+    """
+    Verify that the jobs are upserted while the slurmrestd response is parsed, even when
+    it arrives in chunks that split the values.
+    """
+    body = json.dumps(
+        dict(meta=dict(plugin="slurm"), errors=[], jobs=[dict(job_id=i) for i in range(3)])
+    ).encode("utf-8")
+
+    async def _chunks():
+        for i in range(0, len(body), 7):
+            yield body[i:i + 7]
+
+    async with respx.mock:
+        respx.get(f"{SETTINGS.SLURM_RESTD_VERSIONED_URL}/jobs").mock(
+            return_value=httpx.Response(status_code=200, stream=_chunks())
+        )
+        put_route = respx.put(url__regex=rf"{SETTINGS.BASE_API_URL}/cluster/agent/jobs/.+")
+        put_route.mock(return_value=httpx.Response(status_code=200))
+
+        summary = await upsert_jobs()
+
+        payloads = sorted(
+            (json.loads(c.request.content) for c in put_route.calls),
+            key=lambda payload: payload["job"]["job_id"],
+        )
+
+    assert summary == UpsertSummary(collector="jobs", succeeded=3, failed=0)
+    assert payloads == [
+        dict(meta=dict(plugin="slurm"), errors=[], job=dict(job_id=i)) for i in range(3)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_upsert_nodes__raises_error_if_streamed_response_fails():
+    """
+    Verify that the error message includes the body of a failed streamed response.
+    """
+    url = f"{SETTINGS.SLURM_RESTD_VERSIONED_URL}/nodes"
+
+    async with respx.mock:
+        respx.get(url).mock(return_value=httpx.Response(status_code=500, text="boom"))
+
+        with pytest.raises(SlurmrestdError) as e:
+            await upsert_nodes()
+
+    assert str(e.value) == f"Slurmrestd returned 500 when calling {url}: boom"
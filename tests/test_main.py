@@ -1,3 +1,5 @@
+import asyncio
+
 import pytest
 from unittest import mock
 
@@ -6,8 +8,12 @@ from cluster_agent.main import (
     collect_diagnostics,
     collect_nodes,
     collect_partitions,
+    execute_operation,
     main,
     run_agent,
+    run_daemon,
+    scheduled_operations,
+    submit_jobs,
 )
 
 
@@ -97,3 +103,112 @@ def test_main__checks_if_agent_coroutine_is_run(mock_asyncio):
     main()
 
     mock_asyncio.run.assert_called_once()
+
+
+@mock.patch("cluster_agent.main.run_daemon")
+@mock.patch("cluster_agent.main.run_agent")
+@mock.patch("cluster_agent.main.asyncio")
+def test_main__runs_the_daemon_when_daemon_mode_is_enabled(
+    mock_asyncio, mock_run_agent, mock_run_daemon, tweak_settings
+):
+    """Checks whether the daemon coroutine is run instead of a single cycle in daemon mode"""
+
+    mock_asyncio.run = mock.Mock()
+
+    with tweak_settings(DAEMON_MODE=True):
+        main()
+
+    mock_asyncio.run.assert_called_once()
+    mock_run_daemon.assert_called_once_with()
+    mock_run_agent.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_scheduled_operations__uses_settings_for_each_operation(tweak_settings):
+    """Ensures only enabled operations are scheduled, each with its own interval and jitter"""
+
+    with tweak_settings(
+        SUBMIT_JOBS_ENABLED=True,
+        SUBMIT_JOBS_INTERVAL_SECONDS=5,
+        SUBMIT_JOBS_JITTER_SECONDS=1,
+        FINISH_JOBS_ENABLED=False,
+        COLLECT_DIAGNOSTICS_ENABLED=False,
+        COLLECT_PARTITIONS_ENABLED=False,
+        COLLECT_NODES_ENABLED=True,
+        COLLECT_NODES_INTERVAL_SECONDS=60,
+        COLLECT_NODES_JITTER_SECONDS=0,
+        COLLECT_JOBS_ENABLED=False,
+    ):
+        operations = scheduled_operations()
+
+    assert [(op.operation, op.interval, op.jitter) for op in operations] == [
+        (collect_nodes, 60, 0),
+        (submit_jobs, 5, 1),
+    ]
+
+
+@mock.patch("cluster_agent.main.close_mapper")
+@mock.patch("cluster_agent.main.close_clients")
+@mock.patch("cluster_agent.main.run_scheduler")
+@pytest.mark.asyncio
+async def test_run_daemon__runs_the_scheduler_and_closes_clients(
+    mock_run_scheduler, mock_close_clients, mock_close_mapper
+):
+    """Ensures the daemon runs the enabled operations and closes the clients when stopped"""
+
+    with mock.patch("cluster_agent.main.logger"):
+        await run_daemon()
+
+    mock_run_scheduler.assert_awaited_once()
+    (operations, execute) = mock_run_scheduler.await_args.args
+    assert [op.name for op in operations] == ["submit_jobs", "finish_jobs"]
+    assert execute is execute_operation
+    mock_close_clients.assert_awaited_once()
+    mock_close_mapper.assert_awaited_once()
+
+
+@mock.patch("cluster_agent.main.close_clients")
+@mock.patch("cluster_agent.main.run_scheduler")
+@pytest.mark.asyncio
+async def test_run_daemon__exits_if_no_operation_is_enabled(
+    mock_run_scheduler, mock_close_clients, tweak_settings
+):
+    """Ensures the daemon exits right away when there is nothing to schedule"""
+
+    with tweak_settings(SUBMIT_JOBS_ENABLED=False, FINISH_JOBS_ENABLED=False):
+        with mock.patch("cluster_agent.main.logger"):
+            await run_daemon()
+
+    mock_run_scheduler.assert_not_awaited()
+    mock_close_clients.assert_awaited_once()
+
+
+@mock.patch("cluster_agent.main.submit_jobs")
+@mock.patch("cluster_agent.main.finish_jobs")
+@pytest.mark.asyncio
+async def test_run_agent__runs_operations_concurrently(mock_finish_jobs, mock_submit_jobs):
+    """Ensures operations run at the same time and a failing one doesn't affect the others"""
+
+    submit_started = asyncio.Event()
+
+    async def _finish_jobs():
+        await asyncio.wait_for(submit_started.wait(), timeout=5)
+        raise RuntimeError("BOOM!")
+
+    async def _submit_jobs():
+        submit_started.set()
+
+    mock_finish_jobs.__name__ = "finish_jobs"
+    mock_finish_jobs.__doc__ = "Mark finished jobs."
+    mock_finish_jobs.side_effect = _finish_jobs
+    mock_submit_jobs.__name__ = "submit_jobs"
+    mock_submit_jobs.__doc__ = "Submit pending jobs."
+    mock_submit_jobs.side_effect = _submit_jobs
+
+    with mock.patch("cluster_agent.main.logger") as mock_logger:
+        await run_agent()
+
+    mock_finish_jobs.assert_awaited_once()
+    mock_submit_jobs.assert_awaited_once()
+    mock_logger.info.assert_any_call("!!!! Failed: Mark finished jobs.")
+    mock_logger.info.assert_any_call("<<<< Completed: Submit pending jobs.")
@@ -0,0 +1,104 @@
+import asyncio
+from unittest import mock
+
+import pytest
+
+from cluster_agent.scheduler import ScheduledOperation, run_periodically, run_scheduler
+
+
+@pytest.mark.asyncio
+async def test_run_periodically__does_not_stack_slow_runs():
+    """
+    Verify that an operation slower than its interval is never run concurrently with itself.
+    """
+    running = 0
+    max_running = 0
+    finished = asyncio.Event()
+    runs = []
+
+    async def slow_operation():
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(0.03)
+        running -= 1
+        runs.append(1)
+        if len(runs) == 3:
+            finished.set()
+
+    async def execute(operation):
+        await operation()
+
+    scheduled = ScheduledOperation(operation=slow_operation, interval=0.01)
+    with mock.patch("cluster_agent.scheduler.logger") as mock_logger:
+        task = asyncio.create_task(run_periodically(scheduled, execute))
+        await asyncio.wait_for(finished.wait(), timeout=5)
+        task.cancel()
+
+    assert max_running == 1
+    assert mock_logger.warning.called
+
+
+@pytest.mark.asyncio
+async def test_run_periodically__applies_jitter():
+    """
+    Verify that a random delay bounded by the jitter is added between runs.
+    """
+    called = asyncio.Event()
+
+    async def operation():
+        called.set()
+
+    async def execute(op):
+        await op()
+
+    scheduled = ScheduledOperation(operation=operation, interval=10, jitter=2)
+    with mock.patch("cluster_agent.scheduler.random.uniform", return_value=1.5) as mock_uniform:
+        with mock.patch("cluster_agent.scheduler.asyncio.sleep") as mock_sleep:
+            mock_sleep.side_effect = asyncio.CancelledError
+            with pytest.raises(asyncio.CancelledError):
+                await run_periodically(scheduled, execute)
+
+    assert called.is_set()
+    mock_uniform.assert_called_once_with(0, 2)
+    (delay,) = mock_sleep.call_args.args
+    assert 11 < delay <= 11.5
+
+
+@pytest.mark.asyncio
+async def test_run_scheduler__runs_operations_independently():
+    """
+    Verify that a fast operation keeps its cadence while a slow one is still running.
+    """
+    fast_runs = 0
+    slow_started = asyncio.Event()
+    enough_fast_runs = asyncio.Event()
+
+    async def fast_operation():
+        nonlocal fast_runs
+        fast_runs += 1
+        if fast_runs == 5:
+            enough_fast_runs.set()
+
+    async def slow_operation():
+        slow_started.set()
+        await asyncio.sleep(60)
+
+    async def execute(operation):
+        await operation()
+
+    task = asyncio.create_task(
+        run_scheduler(
+            [
+                ScheduledOperation(operation=slow_operation, interval=0.01),
+                ScheduledOperation(operation=fast_operation, interval=0.01),
+            ],
+            execute,
+        )
+    )
+    await asyncio.wait_for(enough_fast_runs.wait(), timeout=5)
+    assert slow_started.is_set()
+
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
@@ -17,3 +17,24 @@ class TestSettingsSlurmrestdUrl:
         url = "http://localhost:6820/slurm/v0.0.39"
         settings = Settings(SLURM_RESTD_VERSIONED_URL=url)
         assert settings.SLURM_RESTD_VERSIONED_URL == url
+
+    def test_unix_socket_url_is_converted_to_a_path(self):
+        """
+        Test that the slurmrestd unix socket may be supplied as a unix:// URL.
+        """
+        settings = Settings(SLURMRESTD_UNIX_SOCKET="unix:///run/slurmrestd.socket")
+        assert settings.SLURMRESTD_UNIX_SOCKET == "/run/slurmrestd.socket"
+
+        settings = Settings(SLURMRESTD_UNIX_SOCKET="/run/slurmrestd.socket")
+        assert settings.SLURMRESTD_UNIX_SOCKET == "/run/slurmrestd.socket"
+
+
+class TestSettingsOperationIntervals:
+    def test_intervals_default_to_the_daemon_cycle_interval(self):
+        """
+        Test that operations without their own interval run once per daemon cycle.
+        """
+        settings = Settings(DAEMON_CYCLE_INTERVAL_SECONDS=20, COLLECT_NODES_INTERVAL_SECONDS=60)
+        assert settings.SUBMIT_JOBS_INTERVAL_SECONDS == 20
+        assert settings.FINISH_JOBS_INTERVAL_SECONDS == 20
+        assert settings.COLLECT_NODES_INTERVAL_SECONDS == 60
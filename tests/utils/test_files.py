@@ -0,0 +1,109 @@
+import json
+import os
+import shutil
+from pathlib import Path
+from unittest import mock
+
+import pytest
+
+from cluster_agent.utils import files
+from cluster_agent.utils.files import stage_files, write_file_atomically, write_json_atomically
+
+
+@pytest.fixture(autouse=True)
+def reset_created_directories():
+    with mock.patch.object(files, "_created_directories", set()):
+        yield
+
+
+@pytest.mark.asyncio
+async def test_stage_files__writes_the_files_in_their_directories(tmp_path):
+    """
+    Verify that the files are written relative to the directory, creating each parent
+    directory only once, and that no temporary files are left behind.
+    """
+    job_files = {
+        "application.sh": "#!/bin/bash\necho hello",
+        "inputs/a.txt": "a",
+        "inputs/b.txt": "b",
+    }
+
+    with mock.patch.object(Path, "mkdir", autospec=True, side_effect=Path.mkdir) as mock_mkdir:
+        await stage_files(tmp_path, job_files, concurrency=2)
+
+    for (path, content) in job_files.items():
+        assert (tmp_path / path).read_text() == content
+    assert sorted(c.args[0] for c in mock_mkdir.call_args_list) == [
+        tmp_path,
+        tmp_path / "inputs",
+    ]
+    assert sorted(p.name for p in (tmp_path / "inputs").iterdir()) == ["a.txt", "b.txt"]
+
+
+def test_write_file_atomically__skips_files_with_the_same_content(tmp_path):
+    """
+    Verify that a file that already has the same content is not written again, while
+    a file with a different content is replaced.
+    """
+    path = tmp_path / "application.sh"
+
+    assert write_file_atomically(path, "echo hello") is True
+    os.utime(path, ns=(1_000_000_000, 1_000_000_000))
+
+    assert write_file_atomically(path, "echo hello") is False
+    assert path.stat().st_mtime_ns == 1_000_000_000
+
+    assert write_file_atomically(path, "echo HELLO") is True
+    assert path.read_text() == "echo HELLO"
+
+
+@pytest.mark.asyncio
+async def test_stage_files__recreates_directories_removed_after_being_cached(tmp_path):
+    """
+    Verify that a cached directory that was removed is created again.
+    """
+    await stage_files(tmp_path, {"inputs/a.txt": "a"}, concurrency=1)
+    shutil.rmtree(tmp_path / "inputs")
+
+    await stage_files(tmp_path, {"inputs/a.txt": "a"}, concurrency=1)
+
+    assert (tmp_path / "inputs/a.txt").read_text() == "a"
+
+
+def test_write_file_atomically__removes_the_temporary_file_on_failure(tmp_path):
+    """
+    Verify that the temporary file is removed if it cannot be renamed over the file.
+    """
+    (tmp_path / "application.sh").mkdir()
+
+    with pytest.raises(OSError):
+        write_file_atomically(tmp_path / "application.sh", "echo hello")
+
+    assert not any(p.name.endswith(".tmp") for p in tmp_path.iterdir())
+
+
+def test_write_json_atomically__replaces_the_file_in_a_private_directory(tmp_path):
+    """
+    Verify that the data is written as JSON, creating a directory only the agent can
+    access, and that no temporary file is left behind.
+    """
+    path = tmp_path / "agent" / "snapshot.json"
+    write_json_atomically(path, dict(a=1), "snapshot")
+    write_json_atomically(path, dict(a=2), "snapshot")
+
+    assert json.loads(path.read_text()) == dict(a=2)
+    assert (path.parent.stat().st_mode & 0o777) == 0o700
+    assert os.listdir(path.parent) == ["snapshot.json"]
+
+
+def test_write_json_atomically__only_warns_on_failure(tmp_path):
+    """
+    Verify that a failure to write the file is logged instead of raised.
+    """
+    path = tmp_path / "snapshot.json"
+    path.mkdir()
+
+    with mock.patch.object(files.logger, "warning") as mock_warning:
+        write_json_atomically(path, dict(a=1), "sync snapshot")
+
+    mock_warning.assert_called_once_with(f"Couldn't save the sync snapshot to {path}")
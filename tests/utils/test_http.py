@@ -0,0 +1,74 @@
+from unittest import mock
+
+import httpx
+import pytest
+
+from cluster_agent.identity.cluster_api import AsyncBackendClient as ClusterApiClient
+from cluster_agent.identity.slurmrestd import AsyncBackendClient as SlurmrestdClient
+from cluster_agent.utils.http import client_options, list_timeout
+
+
+@pytest.mark.parametrize("prefix", ["SLURMRESTD", "CLUSTER_API"])
+def test_client_options__builds_limits_and_timeouts_from_settings(prefix, tweak_settings):
+    """
+    Verify that the pool limits and timeouts are taken from the settings of the client.
+    """
+    with tweak_settings(
+        **{
+            f"{prefix}_MAX_CONNECTIONS": 8,
+            f"{prefix}_MAX_KEEPALIVE_CONNECTIONS": 4,
+            f"{prefix}_KEEPALIVE_EXPIRY_SECONDS": 30,
+            f"{prefix}_TIMEOUT_SECONDS": 7,
+            f"{prefix}_CONNECT_TIMEOUT_SECONDS": 2,
+            f"{prefix}_READ_TIMEOUT_SECONDS": 20,
+        }
+    ):
+        options = client_options(prefix)
+
+    assert options == dict(
+        http2=False,
+        limits=httpx.Limits(max_connections=8, max_keepalive_connections=4, keepalive_expiry=30),
+        timeout=httpx.Timeout(7, connect=2, read=20),
+    )
+
+
+def test_list_timeout__uses_the_longer_read_timeout_for_lists(tweak_settings):
+    """
+    Verify that the list timeout only differs from the slurmrestd timeouts in its read.
+    """
+    with tweak_settings(
+        SLURMRESTD_TIMEOUT_SECONDS=7,
+        SLURMRESTD_CONNECT_TIMEOUT_SECONDS=2,
+        SLURMRESTD_LIST_READ_TIMEOUT_SECONDS=120,
+    ):
+        timeout = list_timeout()
+
+    assert timeout == httpx.Timeout(7, connect=2, read=120)
+
+
+@pytest.mark.parametrize("h2_installed", [True, False])
+def test_client_options__enables_http2_only_if_h2_is_installed(h2_installed, tweak_settings):
+    """
+    Verify that HTTP/2 is only enabled if the h2 package is available.
+    """
+    with tweak_settings(CLUSTER_API_HTTP2=True):
+        with mock.patch(
+            "cluster_agent.utils.http.http2_available", return_value=h2_installed
+        ):
+            options = client_options("CLUSTER_API")
+
+    assert options["http2"] is h2_installed
+
+
+@pytest.mark.parametrize("client_class", [SlurmrestdClient, ClusterApiClient])
+def test_backend_clients__use_the_client_options(client_class, tweak_settings):
+    """
+    Verify that the backend clients are created with the configured timeouts.
+    """
+    with tweak_settings(
+        SLURMRESTD_READ_TIMEOUT_SECONDS=11,
+        CLUSTER_API_READ_TIMEOUT_SECONDS=11,
+    ):
+        client = client_class()
+
+    assert client.timeout.read == 11
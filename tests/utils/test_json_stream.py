@@ -0,0 +1,129 @@
+import json
+
+import pytest
+
+from cluster_agent.utils.json_stream import JSONItemStream
+
+
+async def _chunked(data: str, size: int):
+    encoded = data.encode("utf-8")
+    for i in range(0, len(encoded), size):
+        yield encoded[i:i + size]
+
+
+async def _parse(data: str, size: int, items_key: str = "items", header_keys=()):
+    stream = JSONItemStream(_chunked(data, size), items_key, header_keys=header_keys)
+    items = [item async for item in stream.items()]
+    return (stream.header, items)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("chunk_size", [1, 3, 16, 1024])
+async def test_items__yields_items_and_collects_header(chunk_size):
+    """
+    Verify that the items and the other values are parsed correctly regardless of how
+    the document is split in chunks (including numbers and multi-byte characters).
+    """
+    document = dict(
+        meta=dict(plugin="slurm", version=[0, 0, 36]),
+        errors=[],
+        items=[12345, -1.5e3, "ção", None, True, dict(nested=[1, dict(a="]}")])],
+        trailer="end",
+    )
+
+    (header, items) = await _parse(json.dumps(document, indent=2), chunk_size)
+
+    assert items == document["items"]
+    assert header == dict(meta=document["meta"], errors=[], trailer="end")
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("number", ["1.5", "-2.25", "1e3", "1E+3", "-2.5e-1", "10.0E10"])
+async def test_items__parses_numbers_split_across_chunks(number):
+    """
+    Verify that a number is parsed correctly when a chunk ends within its fraction or its
+    exponent (e.g. ``[1.`` followed by ``5,2]``).
+    """
+    document = f'{{"meta":1,"items":[{number},2]}}'
+    start = document.index(number)
+
+    for split in range(start + 1, start + len(number)):
+        chunks = [document[:split].encode("utf-8"), document[split:].encode("utf-8")]
+
+        async def _chunks():
+            for chunk in chunks:
+                yield chunk
+
+        stream = JSONItemStream(_chunks(), "items")
+
+        assert [item async for item in stream.items()] == [json.loads(number), 2]
+
+
+@pytest.mark.asyncio
+async def test_items__yields_items_as_they_arrive():
+    """
+    Verify that an item is yielded before the rest of the document is read.
+    """
+    read_chunks = []
+
+    async def _chunks():
+        for chunk in ['{"meta": {}, "items": [1,', " 2,", " 3]}"]:
+            read_chunks.append(chunk)
+            yield chunk.encode("utf-8")
+
+    stream = JSONItemStream(_chunks(), "items", header_keys=["meta"])
+    items = stream.items()
+
+    assert await items.__anext__() == 1
+    assert len(read_chunks) == 1
+    assert [item async for item in items] == [2, 3]
+
+
+@pytest.mark.asyncio
+async def test_items__holds_items_until_the_header_keys_are_parsed():
+    """
+    Verify that items are only yielded once the header keys were parsed, even when the
+    array comes first in the document.
+    """
+    stream = JSONItemStream(
+        _chunked('{"items": [1, 2], "meta": {"a": 1}}', 4), "items", header_keys=["meta"]
+    )
+
+    async for _ in stream.items():
+        assert stream.header == dict(meta=dict(a=1))
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "document",
+    ["{}", '{"items": []}', '{"meta": 1}'],
+)
+async def test_items__handles_documents_without_items(document):
+    """
+    Verify that documents without items are parsed correctly.
+    """
+    (_, items) = await _parse(document, 2)
+
+    assert items == []
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "document",
+    [
+        "",
+        "[1, 2]",
+        '{"items": [1, 2}',
+        '{"items": [1, 2]',
+        '{"items": [1, 2],}',
+        '{"items": [tru]}',
+        '{"items": [1]} {}',
+        '{1: "a"}',
+    ],
+)
+async def test_items__raises_error_on_invalid_documents(document):
+    """
+    Verify that a ValueError is raised if the document is not a valid JSON object.
+    """
+    with pytest.raises(ValueError):
+        await _parse(document, 3)